@@ -0,0 +1,408 @@
+import numpy as np
+import pandas as pd
+
+import datos
+
+
+COL_KWH = 'TOTAL KWh (suma b,i,p)'
+COL_FP = 'Factor de potencia'
+COL_FC = 'Factor de carga'
+
+SIN_DATOS = "<div style='color: var(--text-color);'>No hay suficientes datos históricos para realizar un análisis de tendencias.</div>"
+
+# Nivel de alerta global por sitio (para ordenar y filtrar la flota)
+NIVELES_ALERTA = {0: 'Normal', 1: 'Atención', 2: 'Urgente'}
+
+
+def _envolver(analisis):
+    return "<div style='font-family: Arial, sans-serif; line-height: 1.5;'>" + "\n".join(analisis) + "</div>"
+
+
+def _orden_historial(df_historico, por_sitio=True):
+    # Orden cronológico dentro de cada sitio: año y posición del mes (los meses
+    # que no se reconocen van al final). Con por_sitio=False todo es un solo sitio.
+    if por_sitio:
+        codigos, sitios = pd.factorize(df_historico['Sitio'].astype(str), sort=True)
+    else:
+        codigos, sitios = np.zeros(len(df_historico), dtype=np.int64), ['_']
+    mes = pd.Categorical(df_historico['Mes'], categories=datos.MESES, ordered=True).codes
+    mes = np.where(mes < 0, len(datos.MESES), mes)
+    anio = df_historico['Año'].to_numpy() if 'Año' in df_historico.columns else np.zeros(len(df_historico))
+    orden = np.lexsort((mes, anio, codigos))
+    return df_historico.iloc[orden], codigos[orden], sitios
+
+
+def _promedio_por_sitio(codigos, valores, k):
+    # Promedio por sitio ignorando NaN (como Series.mean)
+    validos = ~np.isnan(valores)
+    suma = np.bincount(codigos[validos], weights=valores[validos], minlength=k)
+    cuenta = np.bincount(codigos[validos], minlength=k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return suma / cuenta
+
+
+def _mes_inicial(h, inicio, fin):
+    # Nombre del primer mes; con historial de varios años se le agrega el año
+    meses = h['Mes'].astype(str).to_numpy()[inicio]
+    if 'Año' not in h.columns:
+        return meses
+    anio = h['Año'].to_numpy()
+    varios = anio[inicio] != anio[fin]
+    return np.where(varios, np.char.add(np.char.add(meses.astype(str), ' '), anio[inicio].astype(str)), meses).astype(object)
+
+
+def _metricas(h, codigos, k):
+    # Estadísticas históricas por sitio en una sola pasada sobre arreglos ({columna: arreglo (k,)})
+    n = np.bincount(codigos, minlength=k)
+    inicio = np.concatenate([[0], np.cumsum(n)[:-1]]).astype(np.int64)
+    fin = inicio + n - 1
+
+    kwh = h[COL_KWH].to_numpy(dtype=float)
+    fp = h[COL_FP].to_numpy(dtype=float)
+    fc = h[COL_FC].to_numpy(dtype=float)
+
+    # Variación mensual; como con np.mean, un 0/0 deja el promedio del sitio en NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        anterior = np.roll(kwh, 1)
+        variaciones = (kwh - anterior) / anterior * 100
+        variaciones[inicio] = 0
+        suma_var = np.bincount(codigos, weights=variaciones, minlength=k)
+        promedio_variacion = np.where(n > 1, suma_var / np.maximum(n - 1, 1), 0.0)
+        variacion_consumo = (kwh[fin] - kwh[inicio]) / kwh[inicio] * 100
+        # Crecimiento del último mes con datos respecto al anterior
+        previo = np.maximum(fin - 1, inicio)
+        crecimiento_mensual = np.where(n > 1, (kwh[fin] - kwh[previo]) / np.where(kwh[previo] > 0, kwh[previo], np.nan) * 100, np.nan)
+
+    return {
+        'meses': n,
+        'consumo_promedio': _promedio_por_sitio(codigos, kwh, k),
+        'promedio_variacion': promedio_variacion,
+        'fp_promedio': _promedio_por_sitio(codigos, fp, k),
+        'meses_bajo_90': np.bincount(codigos, weights=fp < 90, minlength=k).astype(np.int64),
+        'fc_promedio': _promedio_por_sitio(codigos, fc, k),
+        'meses_bajo_20': np.bincount(codigos, weights=fc < 20, minlength=k).astype(np.int64),
+        'mes_inicial': _mes_inicial(h, inicio, fin),
+        'variacion_consumo': variacion_consumo,
+        'variacion_fp': fp[fin] - fp[inicio],
+        'variacion_fc': fc[fin] - fc[inicio],
+        'crecimiento_mensual': crecimiento_mensual,
+        'mes_anterior': h['Mes'].astype(str).to_numpy()[previo],
+        'mes_final': h['Mes'].astype(str).to_numpy()[fin],
+    }
+
+
+def metricas_historial(df_historico):
+    h, codigos, sitios = _orden_historial(df_historico)
+    return pd.DataFrame(_metricas(h, codigos, len(sitios)), index=pd.Index(np.asarray(sitios), name='Sitio'))
+
+
+def analizar_flota(df_historico, df_actual):
+    # Tabla de resultados por sitio (índice = Sitio) con los mismos criterios que
+    # los análisis individuales, calculada con operaciones vectorizadas
+    actual = df_actual.drop_duplicates('Sitio', keep='first')
+    sitios = pd.Index(actual['Sitio'].astype(str).to_numpy(), name='Sitio')
+    m = metricas_historial(df_historico).reindex(sitios)
+    r = {col: m[col].to_numpy() for col in m.columns}
+    for col in ('meses', 'meses_bajo_90', 'meses_bajo_20'):
+        r[col] = np.nan_to_num(r[col].astype(float)).astype(np.int64)
+
+    consumo = (actual['Consumo base'] + actual['Consumo inter'] + actual['Consumo punta']).to_numpy(dtype=float)
+    fp = actual[COL_FP].to_numpy(dtype=float)
+    fc = actual[COL_FC].to_numpy(dtype=float)
+    return pd.DataFrame(_clasificar(r, consumo, fp, fc), index=sitios)
+
+
+def _clasificar(r, consumo, fp, fc):
+    # Niveles, tendencias y alerta a partir de las métricas históricas y los valores actuales
+    r['consumo_actual'], r['fp_actual'], r['fc_actual'] = consumo, fp, fc
+
+    prom = r['consumo_promedio'].astype(float)
+    r['nivel_consumo'] = np.select([consumo > prom * 1.1, consumo < prom * 0.9], ['alto', 'bajo'], 'estable')
+    r['tendencia_consumo'] = np.select([r['promedio_variacion'] > 5, r['promedio_variacion'] < -5], ['alcista', 'bajista'], 'estable')
+
+    fp_prom = r['fp_promedio'].astype(float)
+    r['nivel_fp'] = np.select([fp < 90, fp < 95], ['bajo', 'limite'], 'bueno')
+    r['cambio_fp'] = np.select([fp < fp_prom * 0.98, fp > fp_prom * 1.02], ['deterioro', 'mejora'], '')
+
+    fc_prom = r['fc_promedio'].astype(float)
+    r['nivel_fc'] = np.select([fc < 20, fc < 30, fc > 70], ['muy_bajo', 'bajo', 'bueno'], 'moderado')
+    r['cambio_fc'] = np.select([fc < fc_prom * 0.9, fc > fc_prom * 1.1], ['deterioro', 'mejora'], '')
+
+    var_c = r['variacion_consumo'].astype(float)
+    var_fp = r['variacion_fp'].astype(float)
+    var_fc = r['variacion_fc'].astype(float)
+    r['tendencia_periodo_consumo'] = np.select([var_c > 10, var_c < -10], ['aumento', 'disminucion'], 'estable')
+    r['tendencia_periodo_fp'] = np.select([var_fp < -3, var_fp > 3], ['deterioro', 'mejora'], 'estable')
+    r['tendencia_periodo_fc'] = np.select([var_fc < -3, var_fc > 3], ['deterioro', 'mejora'], 'estable')
+    r['alerta_tendencia'] = np.select([(var_c > 10) & (var_fp < 0), (var_c > 10) & (var_fc < 0)], ['consumo_fp', 'consumo_fc'], '')
+
+    # Los análisis individuales requieren 2 meses (3 para tendencias del periodo)
+    con_historial = r['meses'] >= 2
+    con_periodo = r['meses'] >= 3
+    urgente = con_historial & ((r['nivel_consumo'] == 'alto') | (r['nivel_fp'] == 'bajo') | (r['nivel_fc'] == 'muy_bajo'))
+    urgente |= con_periodo & (r['alerta_tendencia'] != '')
+    atencion = con_historial & ((r['nivel_fp'] == 'limite') | (r['nivel_fc'] == 'bajo') | (r['tendencia_consumo'] == 'alcista'))
+    r['nivel_alerta'] = np.select([urgente, atencion], [2, 1], 0)
+    return r
+
+
+def analizar_sitio(df_historico, consumo_actual, fp_actual, fc_actual):
+    # Resultado del motor para un solo sitio (la misma fila que daría analizar_flota), sin
+    # factorizar sitios ni armar la tabla de la flota
+    if df_historico.empty:
+        historial = df_historico.assign(Sitio='_')
+        actual = pd.DataFrame({'Sitio': ['_'], 'Consumo base': [consumo_actual], 'Consumo inter': [0.0],
+                               'Consumo punta': [0.0], COL_FP: [fp_actual], COL_FC: [fc_actual]})
+        return analizar_flota(historial, actual).iloc[0]
+    h, codigos, _ = _orden_historial(df_historico, por_sitio=False)
+    r = _clasificar(_metricas(h, codigos, 1), np.array([consumo_actual], dtype=float),
+                    np.array([fp_actual], dtype=float), np.array([fc_actual], dtype=float))
+    return pd.Series({col: valores[0] for col, valores in r.items()}, name='_', dtype=object)
+
+
+# Funciones de análisis (mejoradas para modo claro/oscuro)
+def formatear_consumo(fila):
+    if fila['meses'] < 2:
+        return SIN_DATOS
+
+    consumo_actual = fila['consumo_actual']
+    consumo_promedio = fila['consumo_promedio']
+
+    # Generar análisis con estilos adaptables
+    analisis = []
+
+    # Comparación con promedio histórico
+    if fila['nivel_consumo'] == 'alto':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>⚠️ ALTO CONSUMO:</strong> El consumo actual ({consumo_actual:,.0f} KWh) es un {((consumo_actual/consumo_promedio)-1)*100:.1f}% mayor que el promedio histórico ({consumo_promedio:,.0f} KWh).</div>")
+    elif fila['nivel_consumo'] == 'bajo':
+        analisis.append(f"<div style='color: var(--success-color);'><strong>✅ BUEN DESEMPEÑO:</strong> El consumo actual ({consumo_actual:,.0f} KWh) es un {((1-consumo_actual/consumo_promedio))*100:.1f}% menor que el promedio histórico ({consumo_promedio:,.0f} KWh).</div>")
+    else:
+        analisis.append(f"<div style='color: var(--text-color);'><strong>📊 CONSUMO ESTABLE:</strong> El consumo actual ({consumo_actual:,.0f} KWh) está cerca del promedio histórico ({consumo_promedio:,.0f} KWh).</div>")
+
+    # Tendencia
+    if fila['tendencia_consumo'] == 'alcista':
+        analisis.append("<div style='color: var(--alert-color);'><strong>📈 TENDENCIA ALCISTA:</strong> En los últimos meses se observa una tendencia al alza en el consumo.</div>")
+    elif fila['tendencia_consumo'] == 'bajista':
+        analisis.append("<div style='color: var(--success-color);'><strong>📉 TENDENCIA BAJISTA:</strong> En los últimos meses se observa una tendencia a la baja en el consumo.</div>")
+    else:
+        analisis.append("<div style='color: var(--text-color);'><strong>🔄 TENDENCIA ESTABLE:</strong> El consumo ha mantenido una tendencia estable.</div>")
+
+    # Recomendaciones
+    if fila['nivel_consumo'] == 'alto':
+        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES:</strong></div>")
+        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
+        analisis.append("<li>Revisar horarios de operación para identificar posibles ineficiencias.</li>")
+        analisis.append("<li>Verificar el estado de los equipos (bombas, motores) que puedan estar consumiendo más energía.</li>")
+        analisis.append("<li>Considerar un mantenimiento preventivo para optimizar el consumo.</li>")
+        analisis.append("</ul>")
+
+    return _envolver(analisis)
+
+
+def formatear_factor_potencia(fila):
+    if fila['meses'] < 2:
+        return SIN_DATOS
+
+    fp_actual = fila['fp_actual']
+    fp_promedio = fila['fp_promedio']
+    meses_bajo_90 = fila['meses_bajo_90']
+
+    analisis = []
+
+    if fila['nivel_fp'] == 'bajo':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>⚠️ FACTOR DE POTENCIA BAJO:</strong> El valor actual ({fp_actual:.1f}%) está por debajo del límite recomendado (90%).</div>")
+        if meses_bajo_90 > 1:
+            analisis.append(f"<div style='color: var(--alert-color);'>Este es el {meses_bajo_90}° mes con factor de potencia bajo. <strong>¡Acción urgente requerida!</strong></div>")
+        else:
+            analisis.append("<div style='color: var(--alert-color);'>Primer mes con factor de potencia bajo. <strong>Se recomienda atención inmediata.</strong></div>")
+    elif fila['nivel_fp'] == 'limite':
+        analisis.append(f"<div style='color: var(--warning-color);'><strong>⚠️ FACTOR DE POTENCIA EN LÍMITE:</strong> El valor actual ({fp_actual:.1f}%) está cerca del límite recomendado (90%).</div>")
+    else:
+        analisis.append(f"<div style='color: var(--success-color);'><strong>✅ BUEN FACTOR DE POTENCIA:</strong> El valor actual ({fp_actual:.1f}%) está por encima del límite recomendado.</div>")
+
+    if fila['cambio_fp'] == 'deterioro':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 DETERIORO:</strong> El factor de potencia ha empeorado respecto al promedio histórico ({fp_promedio:.1f}%).</div>")
+    elif fila['cambio_fp'] == 'mejora':
+        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 MEJORA:</strong> El factor de potencia ha mejorado respecto al promedio histórico ({fp_promedio:.1f}%).</div>")
+
+    if fila['nivel_fp'] == 'bajo':
+        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES PARA MEJORAR FACTOR DE POTENCIA:</strong></div>")
+        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
+        analisis.append("<li>Instalar capacitores para corregir el factor de potencia.</li>")
+        analisis.append("<li>Revisar motores y equipos que puedan estar causando baja eficiencia.</li>")
+        analisis.append("<li>Considerar un estudio de calidad de energía.</li>")
+        analisis.append("<li>Verificar si hay equipos operando en vacío o con carga parcial.</li>")
+        analisis.append("</ul>")
+
+    return _envolver(analisis)
+
+
+def formatear_factor_carga(fila):
+    if fila['meses'] < 2:
+        return SIN_DATOS
+
+    fc_actual = fila['fc_actual']
+    fc_promedio = fila['fc_promedio']
+    meses_bajo_20 = fila['meses_bajo_20']
+
+    analisis = []
+
+    if fila['nivel_fc'] == 'muy_bajo':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>⚠️ FACTOR DE CARGA MUY BAJO:</strong> El valor actual ({fc_actual:.1f}%) está por debajo del mínimo recomendado (20%).</div>")
+        if meses_bajo_20 > 1:
+            analisis.append(f"<div style='color: var(--alert-color);'>Este es el {meses_bajo_20}° mes con factor de carga bajo. <strong>¡Acción urgente requerida!</strong></div>")
+    elif fila['nivel_fc'] == 'bajo':
+        analisis.append(f"<div style='color: var(--warning-color);'><strong>⚠️ FACTOR DE CARGA BAJO:</strong> El valor actual ({fc_actual:.1f}%) está por debajo del óptimo.</div>")
+    elif fila['nivel_fc'] == 'bueno':
+        analisis.append(f"<div style='color: var(--success-color);'><strong>✅ BUEN FACTOR DE CARGA:</strong> El valor actual ({fc_actual:.1f}%) indica una buena utilización de la capacidad instalada.</div>")
+    else:
+        analisis.append(f"<div style='color: var(--text-color);'><strong>📊 FACTOR DE CARGA MODERADO:</strong> El valor actual ({fc_actual:.1f}%) está en un rango aceptable.</div>")
+
+    if fila['cambio_fc'] == 'deterioro':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 DETERIORO:</strong> El factor de carga ha empeorado respecto al promedio histórico ({fc_promedio:.1f}%).</div>")
+    elif fila['cambio_fc'] == 'mejora':
+        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 MEJORA:</strong> El factor de carga ha mejorado respecto al promedio histórico ({fc_promedio:.1f}%).</div>")
+
+    if fila['nivel_fc'] in ('muy_bajo', 'bajo'):
+        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES PARA MEJORAR FACTOR DE CARGA:</strong></div>")
+        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
+        analisis.append("<li>Revisar la distribución de la carga a lo largo del día.</li>")
+        analisis.append("<li>Considerar la implementación de un sistema de almacenamiento de energía.</li>")
+        analisis.append("<li>Evaluar la posibilidad de agregar cargas en horarios de baja demanda.</li>")
+        analisis.append("<li>Verificar si hay equipos que puedan operar en horarios de menor demanda.</li>")
+        analisis.append("</ul>")
+
+    return _envolver(analisis)
+
+
+def formatear_tendencias(fila):
+    if fila['meses'] < 3:
+        return SIN_DATOS
+
+    mes_inicial = fila['mes_inicial']
+    variacion_consumo = fila['variacion_consumo']
+    variacion_fp = fila['variacion_fp']
+    variacion_fc = fila['variacion_fc']
+
+    analisis = []
+
+    # Analizar consumo
+    if fila['tendencia_periodo_consumo'] == 'aumento':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>📈 TENDENCIA DE CONSUMO:</strong> Aumento significativo del {variacion_consumo:.1f}% desde {mes_inicial}.</div>")
+    elif fila['tendencia_periodo_consumo'] == 'disminucion':
+        analisis.append(f"<div style='color: var(--success-color);'><strong>📉 TENDENCIA DE CONSUMO:</strong> Disminución significativa del {abs(variacion_consumo):.1f}% desde {mes_inicial}.</div>")
+    else:
+        analisis.append(f"<div style='color: var(--text-color);'><strong>🔄 TENDENCIA DE CONSUMO:</strong> Estable con variación del {variacion_consumo:.1f}% desde {mes_inicial}.</div>")
+
+    # Analizar factor de potencia
+    if fila['tendencia_periodo_fp'] == 'deterioro':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 TENDENCIA FACTOR DE POTENCIA:</strong> Deterioro de {abs(variacion_fp):.1f} puntos desde {mes_inicial}.</div>")
+    elif fila['tendencia_periodo_fp'] == 'mejora':
+        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 TENDENCIA FACTOR DE POTENCIA:</strong> Mejora de {variacion_fp:.1f} puntos desde {mes_inicial}.</div>")
+    else:
+        analisis.append(f"<div style='color: var(--text-color);'><strong>🔄 TENDENCIA FACTOR DE POTENCIA:</strong> Estable con variación de {variacion_fp:.1f} puntos desde {mes_inicial}.</div>")
+
+    # Analizar factor de carga
+    if fila['tendencia_periodo_fc'] == 'deterioro':
+        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 TENDENCIA FACTOR DE CARGA:</strong> Deterioro de {abs(variacion_fc):.1f} puntos desde {mes_inicial}.</div>")
+    elif fila['tendencia_periodo_fc'] == 'mejora':
+        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 TENDENCIA FACTOR DE CARGA:</strong> Mejora de {variacion_fc:.1f} puntos desde {mes_inicial}.</div>")
+    else:
+        analisis.append(f"<div style='color: var(--text-color);'><strong>🔄 TENDENCIA FACTOR DE CARGA:</strong> Estable con variación de {variacion_fc:.1f} puntos desde {mes_inicial}.</div>")
+
+    # Recomendaciones generales basadas en tendencias
+    if fila['alerta_tendencia'] == 'consumo_fp':
+        analisis.append("<div style='color: var(--alert-color); margin-top: 10px;'><strong>⚠️ ALERTA:</strong> Aumento en consumo con deterioro en factor de potencia. <strong>Revisión urgente recomendada.</strong></div>")
+    elif fila['alerta_tendencia'] == 'consumo_fc':
+        analisis.append("<div style='color: var(--alert-color); margin-top: 10px;'><strong>⚠️ ALERTA:</strong> Aumento en consumo con deterioro en factor de carga. <strong>Revisión urgente recomendada.</strong></div>")
+
+    return _envolver(analisis)
+
+
+# Versiones por sitio con la firma original, como formateadores sobre el motor
+def analizar_consumo(df_historico, consumo_actual):
+    return formatear_consumo(analizar_sitio(df_historico, consumo_actual, np.nan, np.nan))
+
+
+def analizar_factor_potencia(df_historico, fp_actual):
+    return formatear_factor_potencia(analizar_sitio(df_historico, np.nan, fp_actual, np.nan))
+
+
+def analizar_factor_carga(df_historico, fc_actual):
+    return formatear_factor_carga(analizar_sitio(df_historico, np.nan, np.nan, fc_actual))
+
+
+def analizar_tendencias(df_historico):
+    return formatear_tendencias(analizar_sitio(df_historico, np.nan, np.nan, np.nan))
+
+
+def analizar_distribucion_consumo(consumo_base, consumo_inter, consumo_punta):
+    total = consumo_base + consumo_inter + consumo_punta
+    if total == 0:
+        return "<div style='color: var(--text-color);'>No hay datos suficientes para analizar la distribución del consumo.</div>"
+
+    porc_base = (consumo_base / total) * 100
+    porc_inter = (consumo_inter / total) * 100
+    porc_punta = (consumo_punta / total) * 100
+
+    analisis = []
+
+    analisis.append(f"<div style='color: var(--text-color);'><strong>📊 DISTRIBUCIÓN DEL CONSUMO:</strong></div>")
+    analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
+    analisis.append(f"<li>Base: {porc_base:.1f}% ({consumo_base:,.0f} KWh)</li>")
+    analisis.append(f"<li>Intermedio: {porc_inter:.1f}% ({consumo_inter:,.0f} KWh)</li>")
+    analisis.append(f"<li>Punta: {porc_punta:.1f}% ({consumo_punta:,.0f} KWh)</li>")
+    analisis.append("</ul>")
+
+    if porc_punta > 40:
+        analisis.append("<div style='color: var(--alert-color); margin-top: 10px;'><strong>⚠️ ALTO CONSUMO EN HORARIO PUNTA:</strong> Más del 40% del consumo ocurre en horario punta.</div>")
+        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES:</strong></div>")
+        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
+        analisis.append("<li>Revisar si hay equipos que puedan operar en horarios de menor demanda.</li>")
+        analisis.append("<li>Considerar la implementación de un sistema de almacenamiento de energía para reducir el consumo en horario punta.</li>")
+        analisis.append("<li>Evaluar la posibilidad de cambiar tarifas o contratos de suministro.</li>")
+        analisis.append("</ul>")
+
+    if porc_base < 30:
+        analisis.append("<div style='color: var(--warning-color); margin-top: 10px;'><strong>⚠️ BAJO CONSUMO EN HORARIO BASE:</strong> Menos del 30% del consumo ocurre en horario base.</div>")
+        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES:</strong></div>")
+        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
+        analisis.append("<li>Intentar redistribuir cargas al horario base cuando sea posible.</li>")
+        analisis.append("<li>Revisar si hay oportunidades para operar equipos en horarios de menor costo.</li>")
+        analisis.append("</ul>")
+
+    return "<div style='font-family: Arial, sans-serif; line-height: 1.5;'>" + "\n".join(analisis) + "</div>"
+
+
+# Resumen del mes actual de todos los sitios, calculado sobre el DataFrame
+# combinado de pozo_*.csv con operaciones por columna (sin recorrer sitios)
+def resumen_flota(df_actual):
+    actual = df_actual.drop_duplicates('Sitio', keep='first')
+
+    consumo_total = actual['Consumo base'] + actual['Consumo inter'] + actual['Consumo punta']
+    total_recibo = (actual['SUBTOTAL'] + actual['IVA 8%'] + actual['DAP'] +
+                    actual['Cargos y depósitos'] + actual['Créditos y redondeos'])
+    costo_kwh = total_recibo.div(consumo_total.where(consumo_total > 0))
+
+    return pd.DataFrame({
+        'Sitio': actual['Sitio'].to_numpy(),
+        'Consumo Total (KWh)': consumo_total.to_numpy(),
+        'Factor de Potencia (%)': actual['Factor de potencia'].to_numpy(),
+        'Factor de Carga (%)': actual['Factor de carga'].to_numpy(),
+        'Total Recibo ($)': total_recibo.to_numpy(),
+        'Costo por kWh ($)': costo_kwh.to_numpy(),
+    })
+
+
+def totales_flota(resumen):
+    consumo = resumen['Consumo Total (KWh)'].sum()
+    costo = resumen['Total Recibo ($)'].sum()
+    return {
+        'sitios': len(resumen),
+        'consumo_total': consumo,
+        'total_recibo': costo,
+        'costo_kwh': costo / consumo if consumo > 0 else np.nan,
+        # Factor de potencia ponderado por consumo para que los sitios pequeños no sesguen el promedio
+        'factor_potencia': np.average(resumen['Factor de Potencia (%)'], weights=resumen['Consumo Total (KWh)']) if consumo > 0 else np.nan,
+        'factor_carga': resumen['Factor de Carga (%)'].mean(),
+    }
@@ -0,0 +1,177 @@
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import catalogo
+import datos
+import ingesta
+import periodos
+
+
+# Detección de anomalías en las series mensuales de todos los sitios a la vez.
+# Cada mes se compara con la mediana de los meses anteriores del mismo sitio
+# (ventana móvil) usando el z-score robusto de Iglewicz-Hoaglin:
+# z = 0.6745 * (x - mediana) / MAD. Los resultados se guardan en una tabla y
+# solo se recalculan los sitios cuyos archivos cambiaron.
+SERIES = {
+    'KWh': 'TOTAL KWh (suma b,i,p)',
+    'KVARH': 'KVARH',
+    'Demanda': 'Demanda máxima (KW)',
+    'Recibo': 'TOTAL RECIBO',
+}
+
+VENTANA = 12
+MIN_PERIODOS = 3
+UMBRAL_Z = 3.5
+# Escala mínima como fracción de la mediana, para que variaciones pequeñas en series planas no den z enormes
+ESCALA_MINIMA = 0.05
+
+
+def _series(df_historial):
+    df = df_historial
+    if 'Demanda máxima (KW)' not in df.columns:
+        demandas = [c for c in ('Demanda Base', 'Demanda intermedia', 'Demanda punta') if c in df.columns]
+        df = df.assign(**{'Demanda máxima (KW)': df[demandas].max(axis=1) if demandas else 0.0})
+    return df
+
+
+def _matriz(codigos_sitio, meses, valores, n_sitios, n_meses):
+    matriz = np.full((n_sitios, n_meses), np.nan)
+    matriz[codigos_sitio, meses] = valores
+    return matriz
+
+
+def _referencia_movil(matriz, ventana=VENTANA, min_periodos=MIN_PERIODOS):
+    # Mediana y escala (MAD) de los `ventana` meses de calendario previos de cada celda, para
+    # todos los sitios a la vez; escala NaN donde la ventana no tiene min_periodos lecturas
+    n_sitios, n_meses = matriz.shape
+    relleno = np.concatenate([np.full((n_sitios, ventana), np.nan), matriz], axis=1)
+    ventanas = np.lib.stride_tricks.sliding_window_view(relleno, ventana, axis=1)[:, :n_meses]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        mediana = np.nanmedian(ventanas, axis=2)
+        mad = np.nanmedian(np.abs(ventanas - mediana[..., None]), axis=2)
+    suficientes = np.sum(~np.isnan(ventanas), axis=2) >= min_periodos
+    # Con series casi constantes la MAD es 0 o casi: usar al menos una fracción de la mediana
+    escala = np.maximum(mad, np.abs(mediana) * ESCALA_MINIMA)
+    return mediana, np.where(suficientes & (escala > 0), escala, np.nan)
+
+
+def detectar(df_historial):
+    # Una fila por sitio y mes con el valor, la mediana de referencia y el z de cada serie.
+    # df_historial puede traer muchos sitios; se indexa por la clave de archivo si existe.
+    df = _series(df_historial)
+    if 'archivo' in (df.index.names or []):
+        claves = df.index.get_level_values('archivo').astype(str).to_numpy()
+    else:
+        claves = np.array([datos.nombre_archivo(str(s)) for s in df['Sitio'].astype(str)])
+    codigo = periodos.codigo_periodo(df)
+    validos = ~np.isnan(codigo)
+    df, claves, codigo = df[validos], claves[validos], codigo[validos]
+
+    codigos_sitio, sitios = pd.factorize(claves, sort=True)
+    orden = np.lexsort((codigo, codigos_sitio))
+    codigos_sitio, codigo = codigos_sitio[orden], codigo[orden]
+    df = df.iloc[orden]
+    n = np.bincount(codigos_sitio, minlength=len(sitios))
+    inicio = np.concatenate([[0], np.cumsum(n)[:-1]])
+    posiciones = np.arange(len(df)) - inicio[codigos_sitio]
+    # Columnas por mes de calendario, contadas desde el primer recibo de cada sitio: con meses
+    # sin recibo la ventana sigue siendo de 12 meses. Un hueco de más de VENTANA meses deja la
+    # ventana vacía igual que uno de VENTANA + 1, así que se acorta a eso; el ancho de la
+    # matriz depende del número de recibos y no del rango de años (un Año mal capturado no
+    # la agranda).
+    salto = np.diff(codigo.astype(np.int64), prepend=0)
+    salto[posiciones == 0] = 0
+    acumulado = np.cumsum(np.minimum(salto, VENTANA + 1))
+    meses = acumulado - acumulado[inicio][codigos_sitio]
+    n_meses = int(meses.max()) + 1 if len(meses) else 0
+
+    resultado = {
+        'archivo': np.asarray(sitios)[codigos_sitio],
+        'Sitio': df['Sitio'].astype(str).to_numpy(),
+        'codigo_periodo': codigo.astype(np.int64),
+    }
+    anomalo = np.zeros(len(df), dtype=bool)
+    for nombre, columna in SERIES.items():
+        valores = df[columna].to_numpy(dtype=float) if columna in df.columns else np.full(len(df), np.nan)
+        mediana, escala = _referencia_movil(_matriz(codigos_sitio, meses, valores, len(sitios), n_meses))
+        mediana, escala = mediana[codigos_sitio, meses], escala[codigos_sitio, meses]
+        # z de cada fila con su propio valor (un mes repetido en un archivo tiene una sola celda)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = 0.6745 * (valores - mediana) / escala
+        resultado[nombre] = valores
+        resultado[f"mediana_{nombre}"] = mediana
+        resultado[f"z_{nombre}"] = z
+        anomalo |= np.abs(np.nan_to_num(z)) > UMBRAL_Z
+    resultado['anomalo'] = anomalo
+    resultado['ultimo_mes'] = posiciones == (n[codigos_sitio] - 1)
+    return pd.DataFrame(resultado)
+
+
+def describir(fila):
+    # Texto corto con las series anómalas de una fila de la tabla
+    partes = []
+    for nombre in SERIES:
+        z = fila[f"z_{nombre}"]
+        if not np.isnan(z) and abs(z) > UMBRAL_Z:
+            partes.append(f"{nombre} {'↑' if z > 0 else '↓'} (z={z:+.1f})")
+    return ", ".join(partes)
+
+
+class MotorAnomalias:
+    # Tabla precalculada de anomalías de la flota. Se suscribe a la ingesta y, cuando
+    # cambian archivos de historial, recalcula solo esos sitios.
+
+    def __init__(self, ingesta_flota=None):
+        self.ingesta = ingesta_flota or ingesta.ingesta_compartida()
+        self.tabla = None
+        self._pendientes = set()
+        self._lock = threading.Lock()
+        self.ingesta.suscribir(self._al_cambiar)
+
+    def _al_cambiar(self, cambios):
+        with self._lock:
+            self._pendientes.update(cambios.sitios('historial'))
+
+    def obtener(self):
+        self.ingesta.actualizar()
+        historial = self.ingesta.tabla('historial')
+        with self._lock:
+            if self.tabla is None:
+                self.tabla = detectar(historial)
+                self._pendientes.clear()
+            elif self._pendientes:
+                claves = sorted(self._pendientes)
+                self._pendientes.clear()
+                conservar = self.tabla[~self.tabla['archivo'].isin(claves)]
+                presentes = [c for c in claves if c in historial.index]
+                nuevas = detectar(historial.loc[presentes]) if presentes else conservar.iloc[:0]
+                self.tabla = pd.concat([conservar, nuevas], ignore_index=True)
+            return self.tabla
+
+    def sitio(self, sitio):
+        tabla = self.obtener()
+        return tabla[tabla['archivo'] == catalogo.archivo_de(sitio)]
+
+    def anomalias(self, solo_ultimo_mes=False):
+        # Meses anómalos de toda la flota, primero los del último mes y por |z| máximo
+        tabla = self.obtener()
+        filas = tabla[tabla['anomalo'] & (tabla['ultimo_mes'] if solo_ultimo_mes else True)]
+        z_max = np.nanmax(np.abs(filas[[f"z_{n}" for n in SERIES]].to_numpy(dtype=float)), axis=1) if len(filas) else []
+        return (filas.assign(z_max=z_max)
+                .sort_values(['ultimo_mes', 'z_max'], ascending=False))
+
+
+_motor = None
+_lock_motor = threading.Lock()
+
+
+def motor_compartido():
+    global _motor
+    with _lock_motor:
+        if _motor is None:
+            _motor = MotorAnomalias()
+        return _motor
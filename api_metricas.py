@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import analisis
+import datos
+import ingesta
+
+
+# API HTTP de solo lectura con las métricas del dashboard en JSON (consumo, factores,
+# costo por kWh y los veredictos del motor de análisis) para SCADA y finanzas. Lee
+# la misma ingesta compartida que el dashboard; ETag y Last-Modified salen de los
+# hashes y fechas de los CSV de cada sitio, así que una revalidación sin cambios
+# responde 304 sin cuerpo.
+HOST_API = os.environ.get('DASHBOARD_API_HOST', '127.0.0.1')
+PUERTO_API = os.environ.get('DASHBOARD_API_PUERTO')
+
+# Segundos mínimos entre revisiones de la carpeta de datos (varias peticiones seguidas no vuelven a listar output/)
+INTERVALO_ACTUALIZACION = float(os.environ.get('DASHBOARD_API_INTERVALO', 2))
+
+# Cambia el ETag de todas las respuestas si cambia el formato del JSON
+VERSION_FORMATO = '1'
+
+# Nombre en el JSON -> columna de la tabla de métricas
+CAMPOS = {
+    'sitio': 'Sitio',
+    'consumo_total': 'Consumo Total (KWh)',
+    'factor_potencia': 'Factor de Potencia (%)',
+    'factor_carga': 'Factor de Carga (%)',
+    'total_recibo': 'Total Recibo ($)',
+    'costo_kwh': 'Costo por kWh ($)',
+    'meses': 'meses',
+    'consumo_promedio': 'consumo_promedio',
+    'promedio_variacion': 'promedio_variacion',
+    'fp_promedio': 'fp_promedio',
+    'meses_fp_bajo_90': 'meses_bajo_90',
+    'fc_promedio': 'fc_promedio',
+    'meses_fc_bajo_20': 'meses_bajo_20',
+    'nivel_consumo': 'nivel_consumo',
+    'tendencia_consumo': 'tendencia_consumo',
+    'nivel_fp': 'nivel_fp',
+    'cambio_fp': 'cambio_fp',
+    'nivel_fc': 'nivel_fc',
+    'cambio_fc': 'cambio_fc',
+    'tendencia_periodo_consumo': 'tendencia_periodo_consumo',
+    'tendencia_periodo_fp': 'tendencia_periodo_fp',
+    'tendencia_periodo_fc': 'tendencia_periodo_fc',
+    'alerta_tendencia': 'alerta_tendencia',
+    'nivel_alerta': 'nivel_alerta',
+}
+
+
+def _valor(v):
+    # Tipos de NumPy a tipos de JSON; NaN como null
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and np.isnan(v):
+        return None
+    return v
+
+
+class MetricasFlota:
+    # Tabla de métricas por sitio (índice = clave de archivo), recalculada solo cuando la
+    # ingesta trae cambios, y las respuestas JSON de cada sitio ya convertidas
+
+    def __init__(self, ingesta_flota=None):
+        self.ingesta = ingesta_flota or ingesta.ingesta_compartida()
+        self._version = None
+        self._metricas = {}
+        self._nombres = {}
+        self._totales = None
+        self._revisado = 0.0
+        self._lock = threading.Lock()
+
+    def _actualizar(self):
+        ahora = time.monotonic()
+        if ahora - self._revisado >= INTERVALO_ACTUALIZACION:
+            self._revisado = ahora
+            self.ingesta.actualizar()
+        with self._lock:
+            if self._version == self.ingesta.version:
+                return
+        historial = self.ingesta.tabla('historial')
+        actual = self.ingesta.tabla('pozo')
+        resultados = analisis.analizar_flota(historial, actual)
+        resumen = analisis.resumen_flota(actual)
+        archivos = actual.index[~actual['Sitio'].duplicated(keep='first')].astype(str)
+        tabla = resumen.set_index(archivos).join(resultados.reset_index(drop=True).set_index(archivos))
+
+        metricas = {}
+        for archivo, fila in zip(tabla.index, tabla.to_dict('records')):
+            metricas[archivo] = {'archivo': archivo, **{campo: _valor(fila[col]) for campo, col in CAMPOS.items()}}
+            metricas[archivo]['alerta'] = analisis.NIVELES_ALERTA.get(metricas[archivo]['nivel_alerta'])
+        totales = {clave: _valor(v) for clave, v in analisis.totales_flota(resumen).items()}
+        with self._lock:
+            self._metricas = metricas
+            self._nombres = {str(m['sitio']).strip().casefold(): a for a, m in metricas.items()}
+            self._totales = totales
+            self._version = self.ingesta.version
+
+    def resolver(self, texto):
+        # Clave de archivo a partir del nombre del sitio, la clave de archivo o el RPU
+        texto = str(texto).strip()
+        if texto in self._metricas:
+            return texto
+        archivo = self._nombres.get(texto.casefold())
+        if archivo is None and datos.nombre_archivo(texto) in self._metricas:
+            archivo = datos.nombre_archivo(texto)
+        if archivo is None:
+            import catalogo
+
+            entrada = catalogo.obtener_catalogo().entrada(texto)
+            archivo = entrada['archivo'] if entrada is not None and entrada['archivo'] in self._metricas else None
+        return archivo
+
+    def validadores(self, archivos):
+        # (ETag, Last-Modified en segundos epoch) de los CSV de esos sitios según el manifiesto de la ingesta
+        h = hashlib.sha1(VERSION_FORMATO.encode())
+        ultimo = 0
+        for archivo in sorted(archivos):
+            for prefijo in ('historial_', 'pozo_'):
+                entrada = self.ingesta.manifiesto.get(f"{prefijo}{archivo}.csv")
+                if entrada is not None:
+                    h.update(f"{prefijo}{archivo}:{entrada['hash']};".encode('utf-8'))
+                    ultimo = max(ultimo, entrada['mtime_ns'])
+        return f'"{h.hexdigest()}"', ultimo // 1_000_000_000
+
+    def sitio(self, texto):
+        self._actualizar()
+        archivo = self.resolver(texto)
+        return (archivo, self._metricas[archivo]) if archivo is not None else (None, None)
+
+    def varios(self, textos=None):
+        # ({archivo: métricas}, no encontrados); sin lista, todos los sitios
+        self._actualizar()
+        if textos is None:
+            return dict(self._metricas), []
+        encontrados, faltantes = {}, []
+        for texto in textos:
+            archivo = self.resolver(texto)
+            if archivo is None:
+                faltantes.append(texto)
+            else:
+                encontrados[archivo] = self._metricas[archivo]
+        return encontrados, faltantes
+
+    def flota(self):
+        self._actualizar()
+        return list(self._metricas), dict(self._totales)
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MetricasPozos/1'
+
+    def _enviar(self, estado, cuerpo=None, etag=None, modificado=None):
+        datos_json = json.dumps(cuerpo, ensure_ascii=False).encode('utf-8') if cuerpo is not None else b''
+        self.send_response(estado)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if modificado:
+            self.send_header('Last-Modified', formatdate(modificado, usegmt=True))
+        if estado != 304:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(datos_json)))
+        self.end_headers()
+        if datos_json:
+            self.wfile.write(datos_json)
+
+    def _sin_cambios(self, etag, modificado):
+        # If-None-Match tiene prioridad; If-Modified-Since solo se usa si no viene
+        etiquetas = self.headers.get('If-None-Match')
+        if etiquetas is not None:
+            return etiquetas.strip() == '*' or etag in [e.strip() for e in etiquetas.split(',')]
+        desde = self.headers.get('If-Modified-Since')
+        if desde and modificado:
+            try:
+                return modificado <= parsedate_to_datetime(desde).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _responder(self, archivos, construir):
+        etag, modificado = self.server.metricas.validadores(archivos)
+        if self._sin_cambios(etag, modificado):
+            return self._enviar(304, etag=etag, modificado=modificado)
+        self._enviar(200, construir(), etag, modificado)
+
+    def _metricas_varios(self, textos):
+        encontrados, faltantes = self.server.metricas.varios(textos)
+        self._responder(list(encontrados), lambda: {'sitios': list(encontrados.values()), 'no_encontrados': faltantes})
+
+    def do_GET(self):
+        partes = urllib.parse.urlsplit(self.path)
+        ruta = urllib.parse.unquote(partes.path).rstrip('/')
+        consulta = urllib.parse.parse_qs(partes.query)
+        metricas = self.server.metricas
+        try:
+            if ruta == '/api/flota':
+                archivos, totales = metricas.flota()
+                return self._responder(archivos, lambda: {'totales': totales})
+            if ruta == '/api/sitios':
+                encontrados, _ = metricas.varios()
+                return self._responder(list(encontrados), lambda: [
+                    {'sitio': m['sitio'], 'archivo': a} for a, m in encontrados.items()])
+            if ruta.startswith('/api/sitios/'):
+                archivo, fila = metricas.sitio(ruta[len('/api/sitios/'):])
+                if archivo is None:
+                    return self._enviar(404, {'error': f"Sitio no encontrado: {ruta[len('/api/sitios/'):]}"})
+                return self._responder([archivo], lambda: fila)
+            if ruta == '/api/metricas':
+                # ?sitios=12,1 ACM,8-ZARA (se puede repetir); sin parámetro, toda la flota
+                textos = [s for valor in consulta.get('sitios', []) for s in valor.split(',') if s.strip()]
+                return self._metricas_varios(textos if 'sitios' in consulta else None)
+        except Exception as e:
+            return self._enviar(500, {'error': str(e)})
+        self._enviar(404, {'error': 'Ruta no encontrada'})
+
+    def do_POST(self):
+        # Lista larga de sitios en el cuerpo: {"sitios": ["12", "1 ACM", ...]}
+        if urllib.parse.urlsplit(self.path).path.rstrip('/') != '/api/metricas':
+            return self._enviar(404, {'error': 'Ruta no encontrada'})
+        try:
+            cuerpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if not isinstance(cuerpo, dict):
+                raise ValueError("se esperaba un objeto JSON")
+            textos = cuerpo.get('sitios')
+            if textos is not None and not isinstance(textos, list):
+                raise ValueError("'sitios' debe ser una lista")
+        except ValueError as e:
+            return self._enviar(400, {'error': f"Cuerpo inválido: {e}"})
+        try:
+            self._metricas_varios([str(t) for t in textos] if textos is not None else None)
+        except Exception as e:
+            self._enviar(500, {'error': str(e)})
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def crear_servidor(puerto, host=HOST_API, metricas=None):
+    servidor = ThreadingHTTPServer((host, int(puerto)), _Manejador)
+    servidor.daemon_threads = True
+    servidor.metricas = metricas or MetricasFlota()
+    return servidor
+
+
+_servidor = None
+_lock_servidor = threading.Lock()
+
+
+def servidor_compartido():
+    # API en un hilo de fondo del proceso del dashboard (solo con DASHBOARD_API_PUERTO);
+    # comparte la ingesta y sus cachés con las sesiones de Streamlit
+    global _servidor
+    if not PUERTO_API:
+        return None
+    with _lock_servidor:
+        if _servidor is None:
+            _servidor = crear_servidor(PUERTO_API)
+            threading.Thread(target=_servidor.serve_forever, daemon=True).start()
+        return _servidor
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API JSON de solo lectura con las métricas de los sitios.")
+    parser.add_argument('--puerto', type=int, default=int(PUERTO_API or 8502))
+    parser.add_argument('--host', default=HOST_API)
+    args = parser.parse_args()
+
+    servidor = crear_servidor(args.puerto, args.host)
+    print(f"API de métricas en http://{args.host}:{servidor.server_address[1]}/api/")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import catalogo
+import datos
+import esquema
+import periodos
+
+
+# Respaldo opcional en SQLite de los recibos de output/: una tabla por tipo de
+# archivo (historial, pozo) con índices por sitio y periodo y por RPU, para
+# responder consultas que cruzan sitios (p. ej. "pozos ACM con FP < 90 en 2025")
+# sin abrir los CSV uno por uno. Se activa con DASHBOARD_BACKEND=sqlite; la
+# base es un archivo local y se sincroniza solo con los CSV que cambiaron.
+BACKEND = os.environ.get('DASHBOARD_BACKEND', 'csv')
+NOMBRE_BD = 'recibos.sqlite'
+RUTA_BD = os.environ.get('DASHBOARD_BD') or os.path.join(datos.DIRECTORIO_SALIDA, NOMBRE_BD)
+
+TABLAS = {'historial': 'historial_', 'pozo': 'pozo_'}
+
+# Columnas agregadas a las del esquema: clave de archivo, número de mes y periodo (Año * 12 + mes - 1)
+COLUMNAS_EXTRA = ['archivo', 'mes_numero', 'periodo']
+
+OPERADORES = {'<', '<=', '>', '>=', '=', '!='}
+
+
+def activo():
+    return BACKEND == 'sqlite'
+
+
+def _q(nombre):
+    # Identificador entre comillas (las columnas llevan espacios, acentos y %)
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def _tipo_sql(col):
+    if col in esquema.COLUMNAS_TEXTO:
+        return 'TEXT'
+    return 'INTEGER' if col == 'Año' else 'REAL'
+
+
+def _crear(conexion):
+    with conexion:
+        for tabla in TABLAS:
+            columnas = ', '.join(f"{_q(c)} {_tipo_sql(c)}" for c in esquema.COLUMNAS)
+            conexion.execute(f"CREATE TABLE IF NOT EXISTS {tabla} (archivo TEXT NOT NULL, mes_numero INTEGER, "
+                             f"periodo INTEGER, {columnas})")
+            conexion.execute(f"CREATE INDEX IF NOT EXISTS ix_{tabla}_sitio_periodo ON {tabla} (Sitio, {_q('Año')}, mes_numero)")
+            conexion.execute(f"CREATE INDEX IF NOT EXISTS ix_{tabla}_rpu ON {tabla} (RPU)")
+            conexion.execute(f"CREATE INDEX IF NOT EXISTS ix_{tabla}_archivo ON {tabla} (archivo, periodo)")
+            conexion.execute(f"CREATE INDEX IF NOT EXISTS ix_{tabla}_periodo ON {tabla} (periodo)")
+        # Estado de cada CSV cargado (para sincronizar solo los que cambian) y su reporte de validación
+        conexion.execute("CREATE TABLE IF NOT EXISTS archivos (nombre TEXT PRIMARY KEY, tabla TEXT, archivo TEXT, "
+                         "tamano INTEGER, mtime_ns INTEGER, validacion TEXT)")
+
+
+def _condiciones(sitios, patron_sitio, desde, hasta):
+    # Cláusulas WHERE (con sus parámetros) comunes a las consultas por sitio y periodo
+    condiciones, parametros = [], []
+    if sitios is not None:
+        catalogo_sitios = catalogo.obtener_catalogo()
+        claves = [catalogo_sitios.archivo(s) for s in sitios]
+        condiciones.append(f"archivo IN ({', '.join('?' * len(claves))})" if claves else "0")
+        parametros += claves
+    if patron_sitio is not None:
+        condiciones.append("Sitio LIKE ?")
+        parametros.append(patron_sitio)
+    if desde is not None:
+        condiciones.append("periodo >= ?")
+        parametros.append(codigo(desde))
+    if hasta is not None:
+        condiciones.append("periodo <= ?")
+        parametros.append(codigo(hasta))
+    return condiciones, parametros
+
+
+def _marco(cursor):
+    # DataFrame desde un cursor cuya primera columna es la clave de archivo, con los
+    # tipos del esquema (armado por columnas: más rápido que pd.read_sql_query)
+    nombres = [d[0] for d in cursor.description]
+    filas = cursor.fetchall()
+    columnas = list(zip(*filas)) if filas else [()] * len(nombres)
+    arreglos = {}
+    for nombre, valores in zip(nombres[1:], columnas[1:]):
+        if nombre in esquema.COLUMNAS_NUMERICAS:
+            arreglos[nombre] = np.nan_to_num(np.array(valores, dtype=float)).astype(esquema.ESQUEMA[nombre])
+        elif nombre in esquema.COLUMNAS_TEXTO:
+            arreglos[nombre] = np.array(valores, dtype=object)
+        else:
+            arreglos[nombre] = np.array(valores, dtype=float)
+    return pd.DataFrame(arreglos, index=pd.Index(np.array(columnas[0], dtype=object), name='archivo'))
+
+
+class BaseRecibos:
+    # Conexión por hilo (las sesiones de Streamlit corren en hilos distintos) en modo WAL,
+    # para que las consultas no se bloqueen mientras se sincroniza
+
+    def __init__(self, ruta=RUTA_BD, directorio=None):
+        self.ruta = ruta
+        self.directorio = directorio or os.path.dirname(os.path.abspath(ruta))
+        self._local = threading.local()
+        self._lock_sincronizar = threading.Lock()
+        _crear(self.conexion())
+
+    def conexion(self):
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30)
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute('PRAGMA synchronous=NORMAL')
+            self._local.conexion = conexion
+        return conexion
+
+    def _filas(self, df, archivo):
+        periodo = periodos.codigo_periodo(df)
+        valores = [np.repeat(archivo, len(df)).tolist(),
+                   [None if np.isnan(p) else int(p) % 12 + 1 for p in periodo],
+                   [None if np.isnan(p) else int(p) for p in periodo]]
+        for col in esquema.COLUMNAS:
+            if col not in df.columns:
+                valores.append([None] * len(df))
+            elif col in esquema.COLUMNAS_TEXTO:
+                valores.append(df[col].astype(str).tolist())
+            else:
+                valores.append(df[col].astype(float if col != 'Año' else np.int64).tolist())
+        return list(zip(*valores))
+
+    def sincronizar(self):
+        # Carga los CSV nuevos o modificados y quita los eliminados. Regresa {tabla: (cargados, eliminados)}.
+        import flota
+
+        conexion = self.conexion()
+        resumen = {}
+        with self._lock_sincronizar:
+            conocidos = {nombre: (tamano, mtime_ns) for nombre, tamano, mtime_ns
+                         in conexion.execute("SELECT nombre, tamano, mtime_ns FROM archivos")}
+            columnas = COLUMNAS_EXTRA + esquema.COLUMNAS
+            insertar = ', '.join('?' * len(columnas))
+            for tabla in TABLAS:
+                rutas = flota.archivos_tabla(tabla, self.directorio)
+                presentes = {os.path.basename(r) for r in rutas}
+                cargados = 0
+                with conexion:
+                    for ruta in rutas:
+                        nombre = os.path.basename(ruta)
+                        estado = os.stat(ruta)
+                        if conocidos.get(nombre) == (estado.st_size, estado.st_mtime_ns):
+                            continue
+                        archivo = flota.clave_archivo(ruta)
+                        df, reporte = esquema.leer_csv(ruta)
+                        conexion.execute(f"DELETE FROM {tabla} WHERE archivo = ?", (archivo,))
+                        conexion.executemany(f"INSERT INTO {tabla} ({', '.join(_q(c) for c in columnas)}) "
+                                             f"VALUES ({insertar})", self._filas(df, archivo))
+                        conexion.execute("INSERT OR REPLACE INTO archivos VALUES (?, ?, ?, ?, ?, ?)",
+                                         (nombre, tabla, archivo, estado.st_size, estado.st_mtime_ns,
+                                          json.dumps(reporte.celdas, ensure_ascii=False)))
+                        cargados += 1
+                    eliminados = [n for n in conocidos if n.startswith(TABLAS[tabla]) and n not in presentes]
+                    for nombre in eliminados:
+                        conexion.execute(f"DELETE FROM {tabla} WHERE archivo = ?", (flota.clave_archivo(nombre),))
+                        conexion.execute("DELETE FROM archivos WHERE nombre = ?", (nombre,))
+                resumen[tabla] = (cargados, len(eliminados))
+        return resumen
+
+    def al_dia(self, ruta):
+        # True si el CSV ya está cargado con su tamaño y fecha actuales
+        estado = os.stat(ruta)
+        fila = self.conexion().execute("SELECT tamano, mtime_ns FROM archivos WHERE nombre = ?",
+                                       (os.path.basename(ruta),)).fetchone()
+        return fila is not None and tuple(fila) == (estado.st_size, estado.st_mtime_ns)
+
+    def validacion(self, ruta):
+        fila = self.conexion().execute("SELECT validacion FROM archivos WHERE nombre = ?",
+                                       (os.path.basename(ruta),)).fetchone()
+        return esquema.ReporteValidacion(ruta, json.loads(fila[0]) if fila and fila[0] else [])
+
+    def consultar(self, tabla, sitios=None, desde=None, hasta=None, columnas=None, filtros=None,
+                  patron_sitio=None, rpu=None):
+        # Filas que cumplen todas las condiciones, filtradas dentro de SQLite:
+        #   sitios: nombres de sitio (se buscan por clave de archivo); patron_sitio: LIKE sobre Sitio ('% ACM')
+        #   desde/hasta: periodos (pd.Period, (año, mes) o código Año * 12 + mes - 1), inclusivos
+        #   filtros: [(columna, operador, valor)], p. ej. [('Factor de potencia', '<', 90)]
+        # Regresa un DataFrame con los tipos del esquema indexado por la clave de archivo.
+        if tabla not in TABLAS:
+            raise ValueError(f"Tabla desconocida: {tabla}")
+        columnas = list(columnas) if columnas is not None else esquema.COLUMNAS
+        for col in columnas + [f[0] for f in filtros or []]:
+            if col not in esquema.ESQUEMA and col not in COLUMNAS_EXTRA:
+                raise ValueError(f"Columna desconocida: {col}")
+
+        condiciones, parametros = _condiciones(sitios, patron_sitio, desde, hasta)
+        if rpu is not None:
+            condiciones.append("RPU = ?")
+            parametros.append(str(rpu))
+        for col, operador, valor in filtros or []:
+            if operador not in OPERADORES:
+                raise ValueError(f"Operador no permitido: {operador}")
+            condiciones.append(f"{_q(col)} {operador} ?")
+            parametros.append(valor)
+
+        sql = (f"SELECT archivo, {', '.join(_q(c) for c in columnas if c != 'archivo')} FROM {tabla}"
+               + (f" WHERE {' AND '.join(condiciones)}" if condiciones else "")
+               + " ORDER BY archivo, periodo")
+        return _marco(self.conexion().execute(sql, parametros))
+
+    def resumen_periodo(self, desde=None, hasta=None, sitios=None, patron_sitio=None):
+        # Indicadores por sitio en un rango de periodos, agregados dentro de SQLite
+        condiciones, parametros = _condiciones(sitios, patron_sitio, desde, hasta)
+        kwh, fp = _q('TOTAL KWh (suma b,i,p)'), _q('Factor de potencia')
+        sql = (f"SELECT archivo, MIN(Sitio) AS Sitio, COUNT(*) AS meses, "
+               f"SUM({kwh}) AS {_q('Consumo Total (KWh)')}, SUM({_q('TOTAL RECIBO')}) AS {_q('Total Recibo ($)')}, "
+               f"MAX(MAX({_q('Demanda Base')}, {_q('Demanda intermedia')}, {_q('Demanda punta')})) AS {_q('Demanda Máxima (KW)')}, "
+               f"SUM(CASE WHEN {fp} > 0 THEN {fp} * {kwh} END) / SUM(CASE WHEN {fp} > 0 THEN {kwh} END) "
+               f"AS {_q('Factor de Potencia (%)')}, "
+               f"SUM(CASE WHEN {fp} > 0 AND {fp} < 90 THEN 1 ELSE 0 END) AS {_q('Meses FP < 90')} "
+               f"FROM historial" + (f" WHERE {' AND '.join(condiciones)}" if condiciones else "")
+               + " GROUP BY archivo ORDER BY archivo")
+        resumen = _marco(self.conexion().execute(sql, parametros))
+        return resumen.astype({'meses': np.int64, 'Meses FP < 90': np.int64})
+
+    def periodos(self):
+        # (primer, último) periodo del historial como pd.Period, o (None, None) si está vacío
+        minimo, maximo = self.conexion().execute("SELECT MIN(periodo), MAX(periodo) FROM historial").fetchone()
+        if minimo is None:
+            return None, None
+        return tuple(pd.Period(year=int(c) // 12, month=int(c) % 12 + 1, freq='M') for c in (minimo, maximo))
+
+
+def codigo(periodo):
+    # Código de periodo (Año * 12 + mes - 1) desde pd.Period, (año, mes) o el código mismo
+    if isinstance(periodo, pd.Period):
+        return periodo.year * 12 + periodo.month - 1
+    if isinstance(periodo, tuple):
+        return int(periodo[0]) * 12 + int(periodo[1]) - 1
+    return int(periodo)
+
+
+_base = None
+_lock = threading.Lock()
+
+
+def base_compartida():
+    # Base del proceso, sincronizada al abrirla y después con cada cambio que detecte la ingesta.
+    # None si el respaldo SQLite no está activo.
+    global _base
+    if not activo():
+        return None
+    with _lock:
+        if _base is None:
+            import ingesta
+
+            _base = BaseRecibos(RUTA_BD, datos.DIRECTORIO_SALIDA)
+            _base.sincronizar()
+            ingesta.ingesta_compartida().suscribir(lambda cambios: _base.sincronizar())
+        return _base
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga los CSV de output/ en la base SQLite de recibos.")
+    parser.add_argument('--directorio', default=datos.DIRECTORIO_SALIDA, help="Carpeta con los historial_*.csv y pozo_*.csv")
+    parser.add_argument('--destino', default=None, help=f"Ruta de la base (por defecto <directorio>/{NOMBRE_BD})")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    base = BaseRecibos(args.destino or os.path.join(args.directorio, NOMBRE_BD), args.directorio)
+    for tabla, (cargados, eliminados) in base.sincronizar().items():
+        print(f"{tabla}: {cargados} archivos cargados, {eliminados} eliminados")
+    print(f"Base sincronizada en {time.perf_counter() - inicio:.2f} s")
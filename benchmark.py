@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly
+
+import analisis
+import datos
+import esquema
+import graficas
+import pronosticos
+import sintetico
+
+
+# Mide por etapas el camino del dashboard (lectura de CSV, conversión numérica,
+# análisis, gráficas y una corrida completa con AppTest) sobre una flota
+# sintética de N sitios × M meses, y guarda los tiempos en JSON para comparar
+# entre versiones.
+RUTA_DASHBOARD = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dashboard_pozo.py')
+
+
+def _etapa(nombre, funcion, n=None):
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    etapa = {'etapa': nombre, 'segundos': round(segundos, 4)}
+    if n:
+        etapa['n'] = n
+        etapa['ms_por_elemento'] = round(segundos / n * 1000, 4)
+    print(f"  {nombre:<28} {segundos:9.3f} s" + (f"  ({etapa['ms_por_elemento']:.3f} ms c/u, n={n})" if n else ""), flush=True)
+    return etapa, resultado
+
+
+def _version_repo():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(RUTA_DASHBOARD), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def medir_apptest(directorio, sitios):
+    # Corre el dashboard completo en un proceso aparte que apunta a la flota sintética
+    # (DASHBOARD_DATOS), para que los módulos y cachés arranquen en frío
+    entorno = dict(os.environ, DASHBOARD_DATOS=directorio)
+    proceso = subprocess.run([sys.executable, os.path.abspath(__file__), '--apptest', *sitios],
+                             capture_output=True, text=True, env=entorno)
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "AppTest falló")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def _apptest(sitios):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(RUTA_DASHBOARD, default_timeout=600)
+    inicio = time.perf_counter()
+    at.run()
+    resultado = {'primera_corrida': round(time.perf_counter() - inicio, 4),
+                 'errores': [str(e.value) for e in at.exception], 'cambio_sitio': []}
+    for sitio in sitios:
+        inicio = time.perf_counter()
+        at.selectbox[0].select(sitio).run()
+        resultado['cambio_sitio'].append({'sitio': sitio, 'segundos': round(time.perf_counter() - inicio, 4)})
+        resultado['errores'] += [str(e.value) for e in at.exception]
+    print(json.dumps(resultado))
+
+
+def correr(sitios, meses, directorio, muestra=20, apptest=True, semilla=0):
+    print(f"Flota sintética: {sitios} sitios × {meses} meses en {directorio}", flush=True)
+    etapas = []
+
+    etapa, nombres = _etapa('generacion', lambda: sintetico.generar_flota(directorio, sitios, meses, semilla=semilla), sitios)
+    etapas.append(etapa)
+
+    rutas_historial = [datos.ruta_historial(s, directorio) for s in nombres]
+    rutas_actual = [datos.ruta_actual(s, directorio) for s in nombres]
+
+    # Lectura y conversión sin esquema (como antes), como referencia
+    etapa, crudos = _etapa('lectura_csv', lambda: [pd.read_csv(r) for r in rutas_historial], sitios)
+    etapas.append(etapa)
+    etapa, crudos_actual = _etapa('lectura_csv_actual', lambda: [pd.read_csv(r) for r in rutas_actual], sitios)
+    etapas.append(etapa)
+
+    etapa, historiales = _etapa('conversion_numerica', lambda: [
+        datos.convertir_numericos(df, datos.COLUMNAS_NUMERICAS) for df in crudos], sitios)
+    etapas.append(etapa)
+    etapa, actuales = _etapa('conversion_numerica_actual', lambda: [
+        datos.convertir_numericos(df, datos.COLUMNAS_NUMERICAS_ACTUAL) for df in crudos_actual], sitios)
+    etapas.append(etapa)
+
+    # Lectura con el esquema declarado (tipos compactos y reporte de validación en un solo paso)
+    etapa, _ = _etapa('lectura_esquema', lambda: [esquema.leer_csv(r, esquema.VISTAS['historial']) for r in rutas_historial], sitios)
+    etapas.append(etapa)
+    etapa, _ = _etapa('lectura_esquema_actual', lambda: [esquema.leer_csv(r) for r in rutas_actual], sitios)
+    etapas.append(etapa)
+
+    etapa, historiales = _etapa('indice_periodos', lambda: [datos.preparar_historial(df) for df in historiales], sitios)
+    etapas.append(etapa)
+
+    def analizar_todos():
+        for h, a in zip(historiales, actuales):
+            fila = a.iloc[0]
+            consumo = float(fila['Consumo base'] + fila['Consumo inter'] + fila['Consumo punta'])
+            analisis.analizar_consumo(h, consumo)
+            analisis.analizar_factor_potencia(h, float(fila['Factor de potencia']))
+            analisis.analizar_factor_carga(h, float(fila['Factor de carga']))
+            analisis.analizar_tendencias(h)
+
+    etapa, _ = _etapa('analizar_por_sitio', analizar_todos, sitios)
+    etapas.append(etapa)
+
+    flota_historial = pd.concat(historiales, ignore_index=True)
+    flota_actual = pd.concat(actuales, ignore_index=True)
+    etapa, _ = _etapa('analizar_flota', lambda: analisis.analizar_flota(flota_historial, flota_actual), sitios)
+    etapas.append(etapa)
+    etapa, _ = _etapa('resumen_flota', lambda: analisis.totales_flota(analisis.resumen_flota(flota_actual)), sitios)
+    etapas.append(etapa)
+    etapa, _ = _etapa('pronosticos_flota', lambda: pronosticos.pronosticar(flota_historial), sitios)
+    etapas.append(etapa)
+
+    # Las gráficas se miden sin caché sobre una muestra de sitios (construcción + serialización)
+    indices = np.linspace(0, sitios - 1, min(muestra, sitios)).astype(int)
+    for nombre, constructor in graficas.FIGURAS_SITIO.items():
+        def construir(constructor=constructor):
+            for i in indices:
+                fig = constructor(historiales[i], actuales[i])
+                if fig is not None:
+                    fig.to_json()
+        etapa, _ = _etapa(f"figura_{nombre}", construir, len(indices))
+        etapas.append(etapa)
+
+    resultado = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'version': _version_repo(),
+        'entorno': {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                    'plotly': plotly.__version__, 'cpus': os.cpu_count()},
+        'parametros': {'sitios': sitios, 'meses': meses, 'muestra': int(len(indices)), 'semilla': semilla},
+        'etapas': etapas,
+    }
+
+    if apptest:
+        sitios_apptest = [nombres[i] for i in indices[:3]]
+        inicio = time.perf_counter()
+        resultado['apptest'] = medir_apptest(directorio, sitios_apptest)
+        print(f"  {'apptest':<28} {time.perf_counter() - inicio:9.3f} s  (primera corrida "
+              f"{resultado['apptest']['primera_corrida']:.3f} s)", flush=True)
+    return resultado
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--apptest':
+        _apptest(sys.argv[2:])
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description="Benchmark por etapas del dashboard sobre una flota sintética.")
+    parser.add_argument('--sitios', type=int, default=1000)
+    parser.add_argument('--meses', type=int, default=120)
+    parser.add_argument('--muestra', type=int, default=20, help="Sitios con los que se miden las gráficas")
+    parser.add_argument('--directorio', default=None, help="Carpeta para la flota sintética (por defecto, una temporal)")
+    parser.add_argument('--salida', default='benchmark.json', help="Archivo JSON con los resultados")
+    parser.add_argument('--sin-apptest', action='store_true', help="Omite la corrida completa con AppTest")
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.directorio:
+        resultado = correr(args.sitios, args.meses, args.directorio, args.muestra, not args.sin_apptest, args.semilla)
+    else:
+        with tempfile.TemporaryDirectory(prefix='flota_sintetica_') as directorio:
+            resultado = correr(args.sitios, args.meses, directorio, args.muestra, not args.sin_apptest, args.semilla)
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=1)
+    print(f"Resultados -> {args.salida}")
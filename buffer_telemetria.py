@@ -0,0 +1,219 @@
+import os
+import threading
+
+import numpy as np
+
+import telemetria
+
+
+# Historial reciente de la telemetría en memoria: un buffer circular de tamaño fijo
+# por sitio (tiempo + un renglón por canal), así que la memoria no crece con el
+# tiempo que lleve corriendo el proceso. Para graficar, las series se reducen a unos
+# miles de puntos con LTTB o mínimo/máximo por cubeta.
+
+# Muestras por sitio: como máximo una semana al intervalo de sondeo del cliente. Sin
+# DASHBOARD_TELEMETRIA_MUESTRAS, salen de repartir LIMITE_MB entre los sitios sondeados.
+MAXIMO_MUESTRAS = int(7 * 86400 / telemetria.INTERVALO)
+CAPACIDAD = int(os.environ.get('DASHBOARD_TELEMETRIA_MUESTRAS') or 0) or None
+
+# Memoria total de los buffers de todos los sitios (MB)
+LIMITE_MB = float(os.environ.get('DASHBOARD_TELEMETRIA_MB', 160))
+
+# Puntos por serie al graficar
+PUNTOS_GRAFICA = 2000
+
+
+class BufferCircular:
+    # Últimas `capacidad` muestras de varios canales con el mismo tiempo. Cada muestra se
+    # escribe dos veces (en i y en i + capacidad) para que cualquier ventana sea un bloque
+    # contiguo del arreglo: agregar es O(1) y ventana() devuelve vistas, sin copiar.
+    # Memoria: 2 * capacidad * (8 + 4 * canales) bytes, fija desde la creación.
+
+    def __init__(self, capacidad, canales):
+        self.capacidad = int(capacidad)
+        self.canales = list(canales)
+        # Sin inicializar: solo se leen las n muestras escritas, y las páginas que aún no se
+        # escriben no ocupan memoria residente
+        self._tiempos = np.empty(2 * self.capacidad)
+        self._valores = np.empty((len(self.canales), 2 * self.capacidad), dtype=np.float32)
+        self._siguiente = 0
+        self.n = 0
+        self._lock = threading.Lock()
+
+    def agregar(self, tiempo, valores):
+        # valores en el orden de self.canales; los tiempos deben llegar en orden creciente
+        with self._lock:
+            i = self._siguiente
+            self._tiempos[i] = self._tiempos[i + self.capacidad] = tiempo
+            self._valores[:, i] = self._valores[:, i + self.capacidad] = valores
+            self._siguiente = (i + 1) % self.capacidad
+            self.n = min(self.n + 1, self.capacidad)
+
+    def agregar_lote(self, tiempos, valores):
+        # Muchas muestras a la vez: tiempos (k,), valores (canales, k); si k excede la
+        # capacidad solo se conservan las últimas
+        tiempos = np.asarray(tiempos, dtype=float)[-self.capacidad:]
+        valores = np.asarray(valores, dtype=np.float32)[:, -self.capacidad:]
+        k = len(tiempos)
+        with self._lock:
+            posiciones = (self._siguiente + np.arange(k)) % self.capacidad
+            for p in (posiciones, posiciones + self.capacidad):
+                self._tiempos[p] = tiempos
+                self._valores[:, p] = valores
+            self._siguiente = int((self._siguiente + k) % self.capacidad)
+            self.n = min(self.n + k, self.capacidad)
+
+    def _bloque(self):
+        # [inicio, fin) del bloque contiguo con las n muestras, de la más antigua a la más reciente
+        if self.n < self.capacidad:
+            return 0, self.n
+        return self._siguiente, self._siguiente + self.capacidad
+
+    def ventana(self, desde=None, hasta=None):
+        # (tiempos, valores[canales, k]) entre desde y hasta (segundos epoch), como vistas.
+        # Las vistas apuntan al buffer: una muestra nueva puede sobrescribir la más antigua.
+        with self._lock:
+            inicio, fin = self._bloque()
+            tiempos = self._tiempos[inicio:fin]
+            i0 = np.searchsorted(tiempos, desde, 'left') if desde is not None else 0
+            i1 = np.searchsorted(tiempos, hasta, 'right') if hasta is not None else len(tiempos)
+            return tiempos[i0:i1], self._valores[:, inicio + i0:inicio + i1]
+
+    @property
+    def nbytes(self):
+        return self._tiempos.nbytes + self._valores.nbytes
+
+
+def reducir_minmax(tiempos, valores, puntos=PUNTOS_GRAFICA):
+    # Mínimo y máximo de cada cubeta (puntos / 2 cubetas de igual número de muestras):
+    # conserva los picos, que es lo que importa en gasto y presión
+    n = len(valores)
+    if n <= puntos:
+        return tiempos, valores
+    cubetas = max(puntos // 2, 1)
+    tamano = n // cubetas
+    bloques = valores[:tamano * cubetas].reshape(cubetas, tamano)
+    base = np.arange(cubetas) * tamano
+    indices = [base + bloques.argmin(axis=1), base + bloques.argmax(axis=1)]
+    if tamano * cubetas < n:
+        resto = valores[tamano * cubetas:]
+        indices.append(tamano * cubetas + np.array([resto.argmin(), resto.argmax()]))
+    indices = np.unique(np.concatenate(indices))
+    return tiempos[indices], valores[indices]
+
+
+def reducir_lttb(tiempos, valores, puntos=PUNTOS_GRAFICA):
+    # Largest-Triangle-Three-Buckets: en cada cubeta elige el punto que forma el triángulo
+    # de mayor área con el punto elegido antes y el promedio de la cubeta siguiente
+    n = len(valores)
+    if n <= puntos or puntos < 3:
+        return tiempos, valores
+    t = tiempos - tiempos[0]
+    v = valores.astype(float)
+    limites = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+    elegidos = np.empty(puntos, dtype=np.int64)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    a = 0
+    for i in range(puntos - 2):
+        inicio, fin = limites[i], limites[i + 1]
+        siguiente_inicio, siguiente_fin = (limites[i + 1], limites[i + 2]) if i + 2 < len(limites) else (n - 1, n)
+        tc, vc = t[siguiente_inicio:siguiente_fin].mean(), v[siguiente_inicio:siguiente_fin].mean()
+        area = np.abs((t[a] - tc) * (v[inicio:fin] - v[a]) - (t[a] - t[inicio:fin]) * (vc - v[a]))
+        a = inicio + int(np.argmax(area))
+        elegidos[i + 1] = a
+    return tiempos[elegidos], valores[elegidos]
+
+
+METODOS = {'lttb': reducir_lttb, 'minmax': reducir_minmax}
+
+
+def bytes_por_muestra(canales=len(telemetria.CAMPOS)):
+    return 2 * (8 + 4 * canales)
+
+
+def capacidad_presupuesto(sitios, canales=len(telemetria.CAMPOS), limite_mb=LIMITE_MB):
+    # Muestras por sitio para que los buffers de `sitios` sitios quepan en limite_mb
+    muestras = int(limite_mb * 1024 * 1024 // (max(sitios, 1) * bytes_por_muestra(canales)))
+    return max(1, min(muestras, MAXIMO_MUESTRAS))
+
+
+class AlmacenTelemetria:
+    # Un buffer por sitio, creado con la primera lectura. agregar() tiene la forma de los
+    # suscriptores de telemetria.ClienteTelemetria ({sitio: {campo: valor, 'recibido': t}}).
+    # Con limite_mb no se crean más buffers de los que caben en ese presupuesto; los
+    # sitios que ya no caben quedan en `omitidos`.
+
+    def __init__(self, capacidad=MAXIMO_MUESTRAS, canales=telemetria.CAMPOS, limite_mb=None):
+        self.capacidad = capacidad
+        self.canales = list(canales)
+        self.maximo_buffers = (max(1, int(limite_mb * 1024 * 1024 // self.memoria_por_sitio()))
+                               if limite_mb is not None else None)
+        self.omitidos = set()
+        self._buffers = {}
+        self._lock = threading.Lock()
+
+    def buffer(self, sitio, crear=False):
+        with self._lock:
+            buffer = self._buffers.get(sitio)
+            if buffer is None and crear:
+                if self.maximo_buffers is not None and len(self._buffers) >= self.maximo_buffers:
+                    self.omitidos.add(sitio)
+                    return None
+                buffer = self._buffers[sitio] = BufferCircular(self.capacidad, self.canales)
+            return buffer
+
+    def agregar(self, lecturas):
+        for sitio, lectura in lecturas.items():
+            buffer = self.buffer(sitio, crear=True)
+            if buffer is not None:
+                buffer.agregar(lectura['recibido'], [lectura.get(c, np.nan) for c in self.canales])
+
+    def serie(self, sitio, desde=None, hasta=None, puntos=PUNTOS_GRAFICA, metodo='lttb'):
+        # {canal: (tiempos, valores)} reducidos para graficar; None si el sitio no tiene lecturas
+        buffer = self.buffer(sitio)
+        if buffer is None:
+            return None
+        tiempos, valores = buffer.ventana(desde, hasta)
+        series = {}
+        for canal, fila in zip(self.canales, valores):
+            validos = ~np.isnan(fila)
+            series[canal] = METODOS[metodo](tiempos[validos], fila[validos], puntos)
+        return series
+
+    def memoria_por_sitio(self):
+        return self.capacidad * bytes_por_muestra(len(self.canales))
+
+    def memoria(self):
+        with self._lock:
+            return sum(b.nbytes for b in self._buffers.values())
+
+    def __len__(self):
+        return len(self._buffers)
+
+
+_almacen = None
+_lock_almacen = threading.Lock()
+
+
+def almacen_compartido():
+    # Almacén del proceso, alimentado por el cliente de telemetría; None sin telemetría.
+    # Si el cliente aún no tiene la lista de sitios se estima con el catálogo, y el
+    # presupuesto limita el número de buffers por si /sitios trae más.
+    global _almacen
+    cliente = telemetria.cliente_compartido()
+    if cliente is None:
+        return None
+    with _lock_almacen:
+        if _almacen is None:
+            if cliente.sitios:
+                sitios = len(cliente.sitios)
+            else:
+                import catalogo
+
+                sitios = len(catalogo.obtener_catalogo())
+            if CAPACIDAD:
+                _almacen = AlmacenTelemetria(CAPACIDAD)
+            else:
+                _almacen = AlmacenTelemetria(capacidad_presupuesto(sitios), limite_mb=LIMITE_MB)
+            cliente.suscribir(_almacen.agregar)
+        return _almacen
@@ -0,0 +1,139 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+import catalogo
+import datos
+import ingesta
+import periodos
+import tarifas
+
+
+# Dimensionamiento de bancos de capacitores para toda la flota: con el FP (o KWH y
+# KVARH) y la demanda de cada recibo, los kVAR que habrían llevado el mes al FP objetivo y el
+# recargo (o la bonificación perdida) que se habría evitado. Los arreglos por recibo
+# se preparan una vez por versión de los datos; cambiar el FP objetivo solo repite
+# unas operaciones vectoriales sobre ellos.
+OBJETIVOS_FP = [90.0, 95.0, 98.0]
+
+# Meses más recientes de cada sitio que se consideran para el tamaño del banco
+MESES_RECIENTES = int(os.environ.get('DASHBOARD_CAPACITORES_MESES', 12))
+
+# Los bancos comerciales se venden en pasos de kVAR
+PASO_KVAR = 5.0
+
+
+def preparar(df_historico):
+    # Arreglos por recibo (un renglón por sitio y mes, ordenados por sitio y periodo) y el
+    # inicio de cada sitio; solo los MESES_RECIENTES últimos meses de cada uno. Un mes
+    # repetido (recibo complementario) se une con el principal
+    codigo = periodos.codigo_periodo(df_historico)
+    validos = ~np.isnan(codigo)
+    h = periodos.unir_repetidos(df_historico[validos], [df_historico.index[validos].astype(str), codigo[validos]])
+    archivos = h.index.astype(str).to_numpy()
+    codigo = periodos.codigo_periodo(h).astype(np.int64)
+    orden = np.lexsort((codigo, archivos))
+    archivos, codigo = archivos[orden], codigo[orden]
+
+    kwh = h['KWH'].to_numpy(dtype=float)[orden]
+    kvarh = h['KVARH'].to_numpy(dtype=float)[orden]
+    fp = h['Factor de potencia'].to_numpy(dtype=float)[orden]
+    # tan φ del mes con el FP facturado (es el que define el recargo); sin FP, con la energía
+    # activa y reactiva. Algunos recibos traen KWH de otro mes y el cociente no sirve.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tangente = np.where((fp > 0) & (fp <= 100), np.tan(np.arccos(np.clip(fp / 100, 0, 1))),
+                            np.where(kwh > 0, kvarh / kwh, np.nan))
+    demanda = h[['Demanda Base', 'Demanda intermedia', 'Demanda punta']].max(axis=1).to_numpy(dtype=float)[orden]
+    # Cargos de energía y demanda sin el ajuste por FP que ya trae el subtotal del recibo
+    cargos = h['SUBTOTAL'].to_numpy(dtype=float)[orden] / (1 + tarifas.ajuste_factor_potencia(fp))
+
+    nuevo = np.r_[True, archivos[1:] != archivos[:-1]]
+    inicio = np.flatnonzero(nuevo)
+    fin = np.r_[inicio[1:], len(archivos)]
+    desde_final = np.repeat(fin, fin - inicio) - np.arange(len(archivos))
+    recientes = desde_final <= MESES_RECIENTES
+
+    sitio = h['Sitio'].astype(str).to_numpy()[orden]
+    arreglos = {'archivo': archivos, 'codigo': codigo, 'fp': fp, 'tangente': tangente, 'demanda': demanda,
+                'cargos': cargos}
+    arreglos = {nombre: valores[recientes] for nombre, valores in arreglos.items()}
+    arreglos['inicio'] = np.flatnonzero(np.r_[True, arreglos['archivo'][1:] != arreglos['archivo'][:-1]])
+    arreglos['sitio'] = sitio[recientes][arreglos['inicio']]
+    return arreglos
+
+
+def dimensionar(arreglos, fp_objetivo):
+    # Por recibo: kVAR para llegar a fp_objetivo y ahorro del mes ($); meses sin lectura
+    # de reactivos (FP en 0) o ya por encima del objetivo no necesitan banco
+    tangente_objetivo = np.tan(np.arccos(fp_objetivo / 100))
+    kvar = arreglos['demanda'] * np.maximum(arreglos['tangente'] - tangente_objetivo, 0.0)
+    kvar = np.where(np.isfinite(kvar) & (arreglos['fp'] > 0), kvar, 0.0)
+    corregido = np.where(kvar > 0, fp_objetivo, arreglos['fp'])
+    ahorro = arreglos['cargos'] * (tarifas.ajuste_factor_potencia(arreglos['fp'])
+                                   - tarifas.ajuste_factor_potencia(corregido))
+    return kvar, np.where(np.isfinite(ahorro), ahorro, 0.0)
+
+
+def tabla_flota(arreglos, fp_objetivo):
+    # Una fila por sitio ordenada por ahorro anual: el banco se dimensiona para el peor mes
+    inicio = arreglos['inicio']
+    if not len(inicio):
+        return pd.DataFrame(columns=['Sitio', 'archivo', 'Meses bajo objetivo', 'FP último', 'FP mínimo',
+                                     'kVAR necesarios', 'Banco sugerido (kVAR)', 'Ahorro mensual ($)',
+                                     'Ahorro anual ($)'])
+    kvar, ahorro = dimensionar(arreglos, fp_objetivo)
+    meses = np.diff(np.r_[inicio, len(kvar)])
+    fp = np.where(arreglos['fp'] > 0, arreglos['fp'], np.nan)
+    with np.errstate(invalid='ignore'):
+        fp_minimo = np.fmin.reduceat(fp, inicio)
+    kvar_sitio = np.maximum.reduceat(kvar, inicio)
+    ahorro_mensual = np.add.reduceat(ahorro, inicio) / meses
+    tabla = pd.DataFrame({
+        'Sitio': arreglos['sitio'],
+        'archivo': arreglos['archivo'][inicio],
+        'Meses bajo objetivo': np.add.reduceat((kvar > 0).astype(np.int64), inicio),
+        'FP último': arreglos['fp'][np.r_[inicio[1:], len(kvar)] - 1],
+        'FP mínimo': fp_minimo,
+        'kVAR necesarios': kvar_sitio,
+        'Banco sugerido (kVAR)': np.ceil(kvar_sitio / PASO_KVAR) * PASO_KVAR,
+        'Ahorro mensual ($)': ahorro_mensual,
+        'Ahorro anual ($)': ahorro_mensual * 12,
+    })
+    tabla = tabla[tabla['kVAR necesarios'] > 0]
+    return tabla.sort_values(['Ahorro anual ($)', 'kVAR necesarios'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+def detalle_sitio(arreglos, sitio, fp_objetivo):
+    # Meses del sitio con su FP, kVAR y ahorro
+    archivo = catalogo.archivo_de(sitio)
+    filas = arreglos['archivo'] == archivo
+    kvar, ahorro = dimensionar({n: v[filas] if n not in ('inicio', 'sitio') else v for n, v in arreglos.items()},
+                               fp_objetivo)
+    return pd.DataFrame({
+        'Periodo': [periodos.etiqueta_codigo(c) for c in arreglos['codigo'][filas]],
+        'FP': arreglos['fp'][filas],
+        'Demanda Máxima (KW)': arreglos['demanda'][filas],
+        'kVAR necesarios': kvar,
+        'Ahorro ($)': ahorro,
+    })
+
+
+_arreglos = (None, None)
+_lock = threading.Lock()
+
+
+def arreglos_compartidos():
+    # Arreglos de la flota, recalculados solo cuando la ingesta trae cambios
+    global _arreglos
+
+    historial = datos.cargar_flota('historial')
+    version = ingesta.ingesta_compartida().version
+    with _lock:
+        if _arreglos[0] == version:
+            return _arreglos[1]
+    arreglos = preparar(historial)
+    with _lock:
+        _arreglos = (version, arreglos)
+    return arreglos
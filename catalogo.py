@@ -0,0 +1,209 @@
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+import datos
+import esquema
+import flota
+
+
+# Catálogo de sitios descubierto a partir de los archivos de output/ y de sus
+# columnas Sitio/RPU. Se guarda en JSON junto con una firma de los nombres de
+# archivo, así que al arrancar basta listar la carpeta (sin abrir ningún CSV)
+# para saber si sigue vigente.
+NOMBRE_CATALOGO = 'catalogo_sitios.json'
+
+# Agregar, quitar o renombrar archivos cambia la fecha de modificación de la carpeta,
+# así que la firma se recalcula solo cuando esa fecha cambia. Una fecha más reciente que
+# este margen no se da por buena (sistemas de archivos con fechas de poca resolución).
+MARGEN_FECHA_NS = 2_000_000_000
+
+
+def _normalizar(texto):
+    return str(texto).strip().casefold()
+
+
+_firmas = {}
+
+
+def firma_directorio(directorio=None):
+    # Cambia cuando se agregan, quitan o renombran CSV de sitios en la carpeta
+    directorio = directorio or datos.DIRECTORIO_SALIDA
+    fecha = os.stat(directorio).st_mtime_ns
+    anterior = _firmas.get(directorio)
+    if anterior is not None and anterior[0] == fecha and time.time_ns() - fecha > MARGEN_FECHA_NS:
+        return anterior[1]
+    nombres = sorted(n for n in os.listdir(directorio)
+                     if n.endswith('.csv') and n.startswith(tuple(flota.TABLAS.values())))
+    firma = hashlib.sha1('\n'.join(nombres).encode('utf-8')).hexdigest()
+    _firmas[directorio] = (fecha, firma)
+    return firma
+
+
+class Catalogo:
+
+    def __init__(self, entradas, firma=None):
+        self.entradas = entradas
+        self.firma = firma
+        self._por_archivo = {e['archivo']: e for e in entradas}
+        self._por_nombre = {_normalizar(e['sitio']): e for e in entradas}
+        self._por_rpu = {rpu: e for e in entradas for rpu in e['rpus']}
+
+        # Claves ordenadas (nombre, RPU y archivo) para búsqueda por prefijo con bisect
+        claves = set()
+        for e in entradas:
+            claves.add((_normalizar(e['sitio']), e['archivo']))
+            claves.add((_normalizar(e['archivo']), e['archivo']))
+            for rpu in e['rpus']:
+                claves.add((rpu, e['archivo']))
+        self._claves = sorted(claves)
+
+    def sitios(self, con_datos=True):
+        return [e['sitio'] for e in self.entradas if not con_datos or (e['historial'] and e['pozo'])]
+
+    def entrada(self, texto):
+        # Búsqueda exacta por nombre, RPU o archivo (acepta 'historial_12.csv', '12', '1_RR', '1-RR')
+        texto = str(texto).strip()
+        base = os.path.basename(texto)
+        for prefijo in flota.TABLAS.values():
+            if base.startswith(prefijo) and base.endswith('.csv'):
+                return self._por_archivo.get(flota.clave_archivo(base))
+        return (self._por_nombre.get(_normalizar(texto))
+                or self._por_rpu.get(texto)
+                or self._por_archivo.get(texto)
+                or self._por_archivo.get(datos.nombre_archivo(texto)))
+
+    def archivo(self, texto):
+        # Clave de archivo del sitio: la del CSV descubierto, que en los huérfanos no sale
+        # de su nombre ('historial_nuevo.csv' con Sitio 'Pozo Nuevo')
+        e = self.entrada(texto)
+        return e['archivo'] if e is not None else datos.nombre_archivo(str(texto))
+
+    def buscar(self, texto, con_datos=True):
+        # Primero las coincidencias por prefijo y después las que contienen el texto
+        texto = _normalizar(texto)
+        if not texto:
+            return self.sitios(con_datos)
+
+        por_prefijo = set()
+        i = bisect.bisect_left(self._claves, (texto, ''))
+        while i < len(self._claves) and self._claves[i][0].startswith(texto):
+            por_prefijo.add(self._claves[i][1])
+            i += 1
+        por_contenido = {archivo for clave, archivo in self._claves if texto in clave} - por_prefijo
+
+        resultado = []
+        for grupo in (por_prefijo, por_contenido):
+            for e in self.entradas:
+                if e['archivo'] in grupo and (not con_datos or (e['historial'] and e['pozo'])):
+                    resultado.append(e['sitio'])
+        return resultado
+
+    def faltantes(self):
+        # Sitios de la lista de interés sin alguno de sus archivos
+        return [e for e in self.entradas if e['en_lista'] and not (e['historial'] and e['pozo'])]
+
+    def huerfanos(self):
+        # Archivos en output/ que no corresponden a ningún sitio de la lista de interés
+        return [e for e in self.entradas if not e['en_lista']]
+
+    def guardar(self, ruta):
+        temporal = ruta + '.tmp'
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'firma': self.firma, 'entradas': self.entradas}, f, ensure_ascii=False, indent=1)
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta):
+        with open(ruta, encoding='utf-8') as f:
+            contenido = json.load(f)
+        return cls(contenido['entradas'], contenido.get('firma'))
+
+    def __len__(self):
+        return len(self.entradas)
+
+
+def construir_catalogo(directorio=None):
+    firma = firma_directorio(directorio)
+    descubiertos = {}
+    for tabla in flota.TABLAS:
+        for ruta in flota.archivos_tabla(tabla, directorio):
+            archivo = flota.clave_archivo(ruta)
+            e = descubiertos.setdefault(archivo, {'sitio': None, 'archivo': archivo, 'rpus': [],
+                                                  'historial': False, 'pozo': False, 'en_lista': False})
+            e[tabla] = True
+            try:
+                columnas, _ = esquema.leer_csv(ruta, esquema.VISTAS['catalogo'])
+            except (ValueError, pd.errors.EmptyDataError):
+                continue
+            if e['sitio'] is None and len(columnas):
+                e['sitio'] = str(columnas['Sitio'].iloc[0])
+            e['rpus'] = sorted(set(e['rpus']) | set(columnas['RPU'].dropna()))
+
+    # Primero los sitios de la lista de interés en su orden, luego los descubiertos que no están en ella
+    entradas = []
+    for sitio in datos.SITIOS_INTERES:
+        archivo = datos.nombre_archivo(sitio)
+        e = descubiertos.pop(archivo, None) or {'sitio': sitio, 'archivo': archivo, 'rpus': [],
+                                                'historial': False, 'pozo': False}
+        e['sitio'] = sitio
+        e['en_lista'] = True
+        entradas.append(e)
+    for archivo in sorted(descubiertos):
+        e = descubiertos[archivo]
+        e['sitio'] = e['sitio'] or archivo
+        entradas.append(e)
+    return Catalogo(entradas, firma)
+
+
+_catalogo = None
+_lock = threading.Lock()
+
+
+def obtener_catalogo(directorio=None):
+    # Catálogo compartido: se lee del JSON si la carpeta no ha cambiado y solo si no, se reconstruye
+    global _catalogo
+    directorio = directorio or datos.DIRECTORIO_SALIDA
+    ruta = os.path.join(directorio, NOMBRE_CATALOGO)
+    firma = firma_directorio(directorio)
+    with _lock:
+        if _catalogo is not None and _catalogo.firma == firma:
+            return _catalogo
+        try:
+            catalogo = Catalogo.cargar(ruta)
+        except (FileNotFoundError, ValueError, KeyError):
+            catalogo = None
+        if catalogo is None or catalogo.firma != firma:
+            catalogo = construir_catalogo(directorio)
+            try:
+                catalogo.guardar(ruta)
+            except OSError:
+                pass
+        _catalogo = catalogo
+        return catalogo
+
+
+def archivo_de(sitio):
+    # Clave de archivo de un sitio según el catálogo compartido (para rutas y tablas de la flota)
+    return obtener_catalogo().archivo(sitio)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye el catálogo de sitios y muestra archivos faltantes o huérfanos.")
+    parser.add_argument('--directorio', default=datos.DIRECTORIO_SALIDA, help="Carpeta con los historial_*.csv y pozo_*.csv")
+    args = parser.parse_args()
+
+    catalogo = construir_catalogo(args.directorio)
+    catalogo.guardar(os.path.join(args.directorio, NOMBRE_CATALOGO))
+    print(f"{len(catalogo)} sitios en el catálogo, {len(catalogo.sitios())} con datos completos")
+    for e in catalogo.faltantes():
+        faltan = [t for t in flota.TABLAS if not e[t]]
+        print(f"  Faltan archivos ({', '.join(faltan)}): {e['sitio']}")
+    for e in catalogo.huerfanos():
+        print(f"  Archivo sin sitio en la lista de interés: {e['archivo']} (Sitio={e['sitio']})")
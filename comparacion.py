@@ -0,0 +1,75 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+import catalogo
+import datos
+import ingesta
+import periodos
+
+
+# Comparación de varios sitios: el historial de KWh, FP y FC de toda la flota en
+# matrices periodo × sitio, armadas en una sola pasada sobre el historial combinado.
+# Las matrices se calculan una vez por versión de los datos; elegir otros sitios
+# solo selecciona columnas.
+
+# clave -> (etiqueta, columna del historial)
+METRICAS = {
+    'kwh': ("Consumo Total (KWh)", 'TOTAL KWh (suma b,i,p)'),
+    'fp': ("Factor de Potencia (%)", 'Factor de potencia'),
+    'fc': ("Factor de Carga (%)", 'Factor de carga'),
+}
+
+
+def matrices_flota(df_historico):
+    # {clave: DataFrame (código de periodo × clave de archivo)} y los nombres de los sitios;
+    # un mes repetido en un archivo (recibo complementario) se une con el principal
+    codigo = periodos.codigo_periodo(df_historico)
+    validos = ~np.isnan(codigo)
+    h = periodos.unir_repetidos(df_historico[validos], [df_historico.index[validos].astype(str), codigo[validos]])
+    codigo = periodos.codigo_periodo(h)
+    codigos, filas = np.unique(codigo.astype(np.int64), return_inverse=True)
+    archivos, columnas = np.unique(h.index.astype(str).to_numpy(), return_inverse=True)
+
+    matrices = {}
+    for clave, (_, columna) in METRICAS.items():
+        matriz = np.full((len(codigos), len(archivos)), np.nan)
+        matriz[filas, columnas] = h[columna].to_numpy(dtype=float)
+        matrices[clave] = pd.DataFrame(matriz, index=pd.Index(codigos, name='codigo'), columns=archivos)
+
+    sitios = df_historico['Sitio'].astype(str).groupby(df_historico.index.astype(str)).first()
+    return matrices, sitios.reindex(archivos).fillna(pd.Series(archivos, index=archivos))
+
+
+_matrices = (None, None)
+_lock = threading.Lock()
+
+
+def matrices_compartidas():
+    # Matrices de la flota, recalculadas solo cuando la ingesta trae cambios
+    global _matrices
+
+    historial = datos.cargar_flota('historial')
+    version = ingesta.ingesta_compartida().version
+    with _lock:
+        if _matrices[0] == version:
+            return _matrices[1]
+    resultado = matrices_flota(historial)
+    with _lock:
+        _matrices = (version, resultado)
+    return resultado
+
+
+def comparar(sitios, clave, desde=None, hasta=None):
+    # Series de los sitios pedidos (columnas con el nombre del sitio, filas con la
+    # etiqueta del periodo), sin los periodos en que ninguno tiene datos
+    matrices, nombres = matrices_compartidas()
+    matriz = matrices[clave]
+    catalogo_sitios = catalogo.obtener_catalogo()
+    archivos = [a for a in dict.fromkeys(catalogo_sitios.archivo(s) for s in sitios) if a in matriz.columns]
+    tabla = matriz.loc[desde:hasta, archivos].dropna(how='all')
+    tabla.columns = nombres[archivos].to_numpy()
+    tabla.index = [periodos.etiqueta_codigo(c) for c in tabla.index]
+    tabla.index.name = 'Periodo'
+    return tabla
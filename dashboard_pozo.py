@@ -1,315 +1,40 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from PIL import Image
+import functools
 import os
+import time
+import uuid
 import numpy as np
-import requests
-import json
 
-
-
-# Funciones de análisis (mejoradas para modo claro/oscuro)
-def analizar_consumo(df_historico, consumo_actual):
-    if len(df_historico) < 2:
-        return "<div style='color: var(--text-color);'>No hay suficientes datos históricos para realizar un análisis de tendencias.</div>"
-
-    # Calcular promedio histórico
-    consumo_promedio = df_historico['TOTAL KWh (suma b,i,p)'].mean()
-
-    # Calcular variación mensual
-    variaciones = []
-    for i in range(1, len(df_historico)):
-        variaciones.append((df_historico.iloc[i]['TOTAL KWh (suma b,i,p)'] -
-                           df_historico.iloc[i-1]['TOTAL KWh (suma b,i,p)']) /
-                          df_historico.iloc[i-1]['TOTAL KWh (suma b,i,p)'] * 100)
-
-    promedio_variacion = np.mean(variaciones) if variaciones else 0
-
-    # Generar análisis con estilos adaptables
-    analisis = []
-
-    # Comparación con promedio histórico
-    if consumo_actual > consumo_promedio * 1.1:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>⚠️ ALTO CONSUMO:</strong> El consumo actual ({consumo_actual:,.0f} KWh) es un {((consumo_actual/consumo_promedio)-1)*100:.1f}% mayor que el promedio histórico ({consumo_promedio:,.0f} KWh).</div>")
-    elif consumo_actual < consumo_promedio * 0.9:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>✅ BUEN DESEMPEÑO:</strong> El consumo actual ({consumo_actual:,.0f} KWh) es un {((1-consumo_actual/consumo_promedio))*100:.1f}% menor que el promedio histórico ({consumo_promedio:,.0f} KWh).</div>")
-    else:
-        analisis.append(f"<div style='color: var(--text-color);'><strong>📊 CONSUMO ESTABLE:</strong> El consumo actual ({consumo_actual:,.0f} KWh) está cerca del promedio histórico ({consumo_promedio:,.0f} KWh).</div>")
-
-    # Tendencia
-    if promedio_variacion > 5:
-        analisis.append("<div style='color: var(--alert-color);'><strong>📈 TENDENCIA ALCISTA:</strong> En los últimos meses se observa una tendencia al alza en el consumo.</div>")
-    elif promedio_variacion < -5:
-        analisis.append("<div style='color: var(--success-color);'><strong>📉 TENDENCIA BAJISTA:</strong> En los últimos meses se observa una tendencia a la baja en el consumo.</div>")
-    else:
-        analisis.append("<div style='color: var(--text-color);'><strong>🔄 TENDENCIA ESTABLE:</strong> El consumo ha mantenido una tendencia estable.</div>")
-
-    # Recomendaciones
-    if consumo_actual > consumo_promedio * 1.1:
-        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES:</strong></div>")
-        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
-        analisis.append("<li>Revisar horarios de operación para identificar posibles ineficiencias.</li>")
-        analisis.append("<li>Verificar el estado de los equipos (bombas, motores) que puedan estar consumiendo más energía.</li>")
-        analisis.append("<li>Considerar un mantenimiento preventivo para optimizar el consumo.</li>")
-        analisis.append("</ul>")
-
-    return "<div style='font-family: Arial, sans-serif; line-height: 1.5;'>" + "\n".join(analisis) + "</div>"
-
-def analizar_factor_potencia(df_historico, fp_actual):
-    if len(df_historico) < 2:
-        return "<div style='color: var(--text-color);'>No hay suficientes datos históricos para realizar un análisis de tendencias.</div>"
-
-    fp_promedio = df_historico['Factor de potencia'].mean()
-    meses_bajo_90 = sum(df_historico['Factor de potencia'] < 90)
-
-    analisis = []
-
-    if fp_actual < 90:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>⚠️ FACTOR DE POTENCIA BAJO:</strong> El valor actual ({fp_actual:.1f}%) está por debajo del límite recomendado (90%).</div>")
-        if meses_bajo_90 > 1:
-            analisis.append(f"<div style='color: var(--alert-color);'>Este es el {meses_bajo_90}° mes con factor de potencia bajo. <strong>¡Acción urgente requerida!</strong></div>")
-        else:
-            analisis.append("<div style='color: var(--alert-color);'>Primer mes con factor de potencia bajo. <strong>Se recomienda atención inmediata.</strong></div>")
-    elif fp_actual < 95:
-        analisis.append(f"<div style='color: var(--warning-color);'><strong>⚠️ FACTOR DE POTENCIA EN LÍMITE:</strong> El valor actual ({fp_actual:.1f}%) está cerca del límite recomendado (90%).</div>")
-    else:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>✅ BUEN FACTOR DE POTENCIA:</strong> El valor actual ({fp_actual:.1f}%) está por encima del límite recomendado.</div>")
-
-    if fp_actual < fp_promedio * 0.98:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 DETERIORO:</strong> El factor de potencia ha empeorado respecto al promedio histórico ({fp_promedio:.1f}%).</div>")
-    elif fp_actual > fp_promedio * 1.02:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 MEJORA:</strong> El factor de potencia ha mejorado respecto al promedio histórico ({fp_promedio:.1f}%).</div>")
-
-    if fp_actual < 90:
-        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES PARA MEJORAR FACTOR DE POTENCIA:</strong></div>")
-        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
-        analisis.append("<li>Instalar capacitores para corregir el factor de potencia.</li>")
-        analisis.append("<li>Revisar motores y equipos que puedan estar causando baja eficiencia.</li>")
-        analisis.append("<li>Considerar un estudio de calidad de energía.</li>")
-        analisis.append("<li>Verificar si hay equipos operando en vacío o con carga parcial.</li>")
-        analisis.append("</ul>")
-
-    return "<div style='font-family: Arial, sans-serif; line-height: 1.5;'>" + "\n".join(analisis) + "</div>"
-
-def analizar_factor_carga(df_historico, fc_actual):
-    if len(df_historico) < 2:
-        return "<div style='color: var(--text-color);'>No hay suficientes datos históricos para realizar un análisis de tendencias.</div>"
-
-    fc_promedio = df_historico['Factor de carga'].mean()
-    meses_bajo_20 = sum(df_historico['Factor de carga'] < 20)
-
-    analisis = []
-
-    if fc_actual < 20:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>⚠️ FACTOR DE CARGA MUY BAJO:</strong> El valor actual ({fc_actual:.1f}%) está por debajo del mínimo recomendado (20%).</div>")
-        if meses_bajo_20 > 1:
-            analisis.append(f"<div style='color: var(--alert-color);'>Este es el {meses_bajo_20}° mes con factor de carga bajo. <strong>¡Acción urgente requerida!</strong></div>")
-    elif fc_actual < 30:
-        analisis.append(f"<div style='color: var(--warning-color);'><strong>⚠️ FACTOR DE CARGA BAJO:</strong> El valor actual ({fc_actual:.1f}%) está por debajo del óptimo.</div>")
-    elif fc_actual > 70:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>✅ BUEN FACTOR DE CARGA:</strong> El valor actual ({fc_actual:.1f}%) indica una buena utilización de la capacidad instalada.</div>")
-    else:
-        analisis.append(f"<div style='color: var(--text-color);'><strong>📊 FACTOR DE CARGA MODERADO:</strong> El valor actual ({fc_actual:.1f}%) está en un rango aceptable.</div>")
-
-    if fc_actual < fc_promedio * 0.9:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 DETERIORO:</strong> El factor de carga ha empeorado respecto al promedio histórico ({fc_promedio:.1f}%).</div>")
-    elif fc_actual > fc_promedio * 1.1:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 MEJORA:</strong> El factor de carga ha mejorado respecto al promedio histórico ({fc_promedio:.1f}%).</div>")
-
-    if fc_actual < 30:
-        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES PARA MEJORAR FACTOR DE CARGA:</strong></div>")
-        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
-        analisis.append("<li>Revisar la distribución de la carga a lo largo del día.</li>")
-        analisis.append("<li>Considerar la implementación de un sistema de almacenamiento de energía.</li>")
-        analisis.append("<li>Evaluar la posibilidad de agregar cargas en horarios de baja demanda.</li>")
-        analisis.append("<li>Verificar si hay equipos que puedan operar en horarios de menor demanda.</li>")
-        analisis.append("</ul>")
-
-    return "<div style='font-family: Arial, sans-serif; line-height: 1.5;'>" + "\n".join(analisis) + "</div>"
-
-def analizar_distribucion_consumo(consumo_base, consumo_inter, consumo_punta):
-    total = consumo_base + consumo_inter + consumo_punta
-    if total == 0:
-        return "<div style='color: var(--text-color);'>No hay datos suficientes para analizar la distribución del consumo.</div>"
-
-    porc_base = (consumo_base / total) * 100
-    porc_inter = (consumo_inter / total) * 100
-    porc_punta = (consumo_punta / total) * 100
-
-    analisis = []
-
-    analisis.append(f"<div style='color: var(--text-color);'><strong>📊 DISTRIBUCIÓN DEL CONSUMO:</strong></div>")
-    analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
-    analisis.append(f"<li>Base: {porc_base:.1f}% ({consumo_base:,.0f} KWh)</li>")
-    analisis.append(f"<li>Intermedio: {porc_inter:.1f}% ({consumo_inter:,.0f} KWh)</li>")
-    analisis.append(f"<li>Punta: {porc_punta:.1f}% ({consumo_punta:,.0f} KWh)</li>")
-    analisis.append("</ul>")
-
-    if porc_punta > 40:
-        analisis.append("<div style='color: var(--alert-color); margin-top: 10px;'><strong>⚠️ ALTO CONSUMO EN HORARIO PUNTA:</strong> Más del 40% del consumo ocurre en horario punta.</div>")
-        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES:</strong></div>")
-        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
-        analisis.append("<li>Revisar si hay equipos que puedan operar en horarios de menor demanda.</li>")
-        analisis.append("<li>Considerar la implementación de un sistema de almacenamiento de energía para reducir el consumo en horario punta.</li>")
-        analisis.append("<li>Evaluar la posibilidad de cambiar tarifas o contratos de suministro.</li>")
-        analisis.append("</ul>")
-
-    if porc_base < 30:
-        analisis.append("<div style='color: var(--warning-color); margin-top: 10px;'><strong>⚠️ BAJO CONSUMO EN HORARIO BASE:</strong> Menos del 30% del consumo ocurre en horario base.</div>")
-        analisis.append("<div style='color: var(--text-color); margin-top: 10px;'><strong>💡 RECOMENDACIONES:</strong></div>")
-        analisis.append("<ul style='color: var(--text-color); margin-left: 20px;'>")
-        analisis.append("<li>Intentar redistribuir cargas al horario base cuando sea posible.</li>")
-        analisis.append("<li>Revisar si hay oportunidades para operar equipos en horarios de menor costo.</li>")
-        analisis.append("</ul>")
-
-    return "<div style='font-family: Arial, sans-serif; line-height: 1.5;'>" + "\n".join(analisis) + "</div>"
-
-def analizar_tendencias(df_historico):
-    if len(df_historico) < 3:
-        return "<div style='color: var(--text-color);'>No hay suficientes datos históricos para realizar un análisis de tendencias.</div>"
-
-    analisis = []
-
-    # Analizar consumo
-    consumo_inicial = df_historico.iloc[0]['TOTAL KWh (suma b,i,p)']
-    consumo_final = df_historico.iloc[-1]['TOTAL KWh (suma b,i,p)']
-    variacion_consumo = ((consumo_final - consumo_inicial) / consumo_inicial) * 100
-
-    if variacion_consumo > 10:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>📈 TENDENCIA DE CONSUMO:</strong> Aumento significativo del {variacion_consumo:.1f}% desde {df_historico.iloc[0]['Mes']}.</div>")
-    elif variacion_consumo < -10:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>📉 TENDENCIA DE CONSUMO:</strong> Disminución significativa del {abs(variacion_consumo):.1f}% desde {df_historico.iloc[0]['Mes']}.</div>")
-    else:
-        analisis.append(f"<div style='color: var(--text-color);'><strong>🔄 TENDENCIA DE CONSUMO:</strong> Estable con variación del {variacion_consumo:.1f}% desde {df_historico.iloc[0]['Mes']}.</div>")
-
-    # Analizar factor de potencia
-    fp_inicial = df_historico.iloc[0]['Factor de potencia']
-    fp_final = df_historico.iloc[-1]['Factor de potencia']
-    variacion_fp = fp_final - fp_inicial
-
-    if variacion_fp < -3:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 TENDENCIA FACTOR DE POTENCIA:</strong> Deterioro de {abs(variacion_fp):.1f} puntos desde {df_historico.iloc[0]['Mes']}.</div>")
-    elif variacion_fp > 3:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 TENDENCIA FACTOR DE POTENCIA:</strong> Mejora de {variacion_fp:.1f} puntos desde {df_historico.iloc[0]['Mes']}.</div>")
-    else:
-        analisis.append(f"<div style='color: var(--text-color);'><strong>🔄 TENDENCIA FACTOR DE POTENCIA:</strong> Estable con variación de {variacion_fp:.1f} puntos desde {df_historico.iloc[0]['Mes']}.</div>")
-
-    # Analizar factor de carga
-    fc_inicial = df_historico.iloc[0]['Factor de carga']
-    fc_final = df_historico.iloc[-1]['Factor de carga']
-    variacion_fc = fc_final - fc_inicial
-
-    if variacion_fc < -3:
-        analisis.append(f"<div style='color: var(--alert-color);'><strong>📉 TENDENCIA FACTOR DE CARGA:</strong> Deterioro de {abs(variacion_fc):.1f} puntos desde {df_historico.iloc[0]['Mes']}.</div>")
-    elif variacion_fc > 3:
-        analisis.append(f"<div style='color: var(--success-color);'><strong>📈 TENDENCIA FACTOR DE CARGA:</strong> Mejora de {variacion_fc:.1f} puntos desde {df_historico.iloc[0]['Mes']}.</div>")
-    else:
-        analisis.append(f"<div style='color: var(--text-color);'><strong>🔄 TENDENCIA FACTOR DE CARGA:</strong> Estable con variación de {variacion_fc:.1f} puntos desde {df_historico.iloc[0]['Mes']}.</div>")
-
-    # Recomendaciones generales basadas en tendencias
-    if variacion_consumo > 10 and variacion_fp < 0:
-        analisis.append("<div style='color: var(--alert-color); margin-top: 10px;'><strong>⚠️ ALERTA:</strong> Aumento en consumo con deterioro en factor de potencia. <strong>Revisión urgente recomendada.</strong></div>")
-    elif variacion_consumo > 10 and variacion_fc < 0:
-        analisis.append("<div style='color: var(--alert-color); margin-top: 10px;'><strong>⚠️ ALERTA:</strong> Aumento en consumo con deterioro en factor de carga. <strong>Revisión urgente recomendada.</strong></div>")
-
-    return "<div style='font-family: Arial, sans-serif; line-height: 1.5;'>" + "\n".join(analisis) + "</div>"
+import analisis
+import anomalias
+import api_metricas
+import basedatos
+import buffer_telemetria
+import capacitores
+import catalogo
+import comparacion
+import datos
+import diferencias
+import estilos
+import graficas
+import grupos
+import instrumentacion
+import periodos
+import pronosticos
+import ranking
+import tarifas
+import telemetria
+
+
+# Tiempos de la corrida (y perfil con cProfile cuando se pide desde el panel de administración)
+admin = instrumentacion.es_admin(st.query_params)
+medicion = instrumentacion.Medicion(perfilar=admin and st.session_state.pop('perfilar_corrida', False))
+sesion = st.session_state.setdefault('sesion', uuid.uuid4().hex[:8])
 
 # CSS para modo claro/oscuro
-st.markdown(
-    """
-    <style>
-        :root {
-            --text-color: #34495E;
-            --success-color: #27AE60;
-            --warning-color: #F39C12;
-            --alert-color: #E74C3C;
-            --background-color: #f8f9fa;
-            --card-background: #f0f2f6;
-        }
-
-        @media (prefers-color-scheme: dark) {
-            :root {
-                --text-color: #ecf0f1;
-                --success-color: #2ecc71;
-                --warning-color: #f1c40f;
-                --alert-color: #e74c3c;
-                --background-color: #2c3e50;
-                --card-background: #34495e;
-            }
-        }
-
-        .title {
-            text-align: center;
-            color: var(--text-color);
-            font-size: 2.5em;
-            margin-bottom: 20px;
-        }
-
-        .subtitle {
-            text-align: center;
-            color: var(--text-color);
-            font-size: 1.2em;
-            margin-bottom: 30px;
-        }
-
-        .metric-card {
-            background-color: var(--card-background);
-            padding: 15px;
-            border-radius: 10px;
-            text-align: center;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-            margin-bottom: 20px;
-            color: var(--text-color);
-        }
-
-        .metric-title {
-            color: #2E86C1;
-            margin-bottom: 5px;
-            font-size: 1.1em;
-        }
-
-        .metric-value {
-            font-size: 1.8em;
-            font-weight: bold;
-            color: var(--text-color);
-        }
-
-        .positive {
-            color: var(--success-color);
-        }
-
-        .negative {
-            color: var(--alert-color);
-        }
-
-        .analysis-box {
-            background-color: var(--card-background);
-            border-left: 4px solid #2E86C1;
-            padding: 15px;
-            border-radius: 5px;
-            margin: 20px 0;
-            color: var(--text-color);
-        }
-
-        .analysis-title {
-            color: #2E86C1;
-            font-weight: bold;
-            margin-bottom: 10px;
-        }
-
-        .select-box {
-            background-color: var(--card-background);
-            padding: 10px;
-            border-radius: 5px;
-            margin-bottom: 20px;
-            color: var(--text-color);
-        }
-    </style>
-    """,
-    unsafe_allow_html=True
-)
+st.markdown(estilos.CSS_DASHBOARD, unsafe_allow_html=True)
 
 # Ruta absoluta a las imágenes
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -338,73 +63,48 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Lista de sitios de interés (pozos y rebombeos)
-sitios_interes = [
-   '1-RR', '4', '5', '5-R_CH', '6', '7-RR', '9-R', '11-R', '12', '14-R', '15-R', '16-R', '17-R', '23-R',
-    '24-R', '28', '33-R', '38', '42-RR', '45', '46-R', '47-R', '48-R', '50-R', '52-R', '54-R', '55-R',
-    '56-R', '58', '60', '61-R', '62-R', '63-R', '64', '66-R', '67-R', '68-R', '69-R', '70-R', '71-R',
-    '72-R', '73-R', '75-R', '76', '78-R', '79-R', '80-B', '80-AR', '81-R', '84-R', '86-R', '87',
-    '88', '89-R', '89-RR', '91-R', '92-R', '93-R', '94-R', '95', '96', '97-R', '98-R', '99-R', '100',
-    '101', '103', '104', '106', '110', '111', '112', '113', '114', '115', '116', '117', '119', '120',
-    '121', '122', '123-R', '124', '129', '130', '132', '133-R', '134', '135-R', '136-R', '138',
-    '141', '142', '143', '144', '145', '146', '147', '148', '149', '150', '152-R', '156-R',
-    '157', '160', '161', '163', '164', '165', '166', '167-R', '168', '169', '170', '171', '172',
-    '173', '174', '176', '177', '178', '179', '180', '182', '183', '184-R', '185', '186', '187',
-    '188', '190', '191', '192', '193', '194', '195', '196', '197', '198', '199', '200', '201',
-    '202', '203', 'REB 60', 'REB 60-A', '204', '205', '206', '207', '208', '209', '210-R', '211',
-    '212', '212-R', '213', '214', '215', '216', '217', '218', '219', '220-R', '221', '222', '223',
-    '226', '229', '230', '231 (CEFERESO 9)', '232 (electrolux 1)', '233 (electrolux 2)', '234 (IVI 9)',
-    '235 (IVI 10)', '236 (IVI 8)', '237', '238', '239 (IVI 12)', '240 (IVI 13)', '244', '245', '246 BODEGA POZO 19',
-    'Pozo Loma Blanca', '1 ACM', '2 ACM', '3 ACM', '5 ACM', '6 ACM', '7 ACM', '9 ACM', '10 ACM', '11 ACM',
-    '12 ACM', '13 ACM', '14 ACM', '15 ACM', '16 ACM', '17 ACM', '18 ACM', '19 ACM', '21 ACM', '22 ACM',
-    '23 ACM', '24 ACM', '25 ACM', '26 ACM', '27 ACM', '247', '250', '251', '252', '253', '255', '259',
-    '262', '263', '269', '6 Anapra', '2 Samalayuca', '3 Samalayuca', '3-ZARA-R', '4-ZARA', '5-ZARA(140)',
-    '6-ZARA(151)', '7-ZARA(158)', '8-ZARA'
-]
-
-# Selector de sitio
+# Catálogo de sitios (pozos y rebombeos) descubierto a partir de output/
+with medicion.tramo('catalogo'):
+    catalogo_sitios = catalogo.obtener_catalogo()
+
+# Precalentar opcionalmente las gráficas de todos los sitios en segundo plano
+if os.environ.get('DASHBOARD_PRECALENTAR_FIGURAS') == '1':
+    graficas.activar_precalentamiento()
+
+# API JSON de métricas en un hilo del mismo proceso (solo con DASHBOARD_API_PUERTO)
+try:
+    api_metricas.servidor_compartido()
+except OSError as e:
+    st.warning(f"No se pudo iniciar la API de métricas: {str(e)}")
+
+# Búsqueda y selector de sitio
+busqueda = st.text_input("Buscar sitio (nombre, RPU o archivo):", "")
+sitios_interes = catalogo_sitios.buscar(busqueda)
+if not sitios_interes:
+    st.warning(f"Ningún sitio coincide con '{busqueda}'.")
+    st.stop()
+
 sitio_seleccionado = st.selectbox(
     "Selecciona un sitio:",
     sitios_interes,
     index=0  # Por defecto selecciona el primer sitio (1-RR)
 )
 
+# Diagnóstico del catálogo: sitios de la lista sin archivos y archivos sin sitio en la lista
+faltantes = catalogo_sitios.faltantes()
+huerfanos = catalogo_sitios.huerfanos()
+if faltantes or huerfanos:
+    with st.sidebar.expander(f"Diagnóstico del catálogo ({len(faltantes)} faltantes, {len(huerfanos)} huérfanos)"):
+        for e in faltantes:
+            st.write(f"Sin archivos en output/: **{e['sitio']}**")
+        for e in huerfanos:
+            st.write(f"Archivo sin sitio en la lista: **{e['archivo']}**")
+
 # Cargar datos para el sitio seleccionado desde la carpeta "output"
+# (el caché de datos.py evita volver a leer y convertir los CSV en cada interacción)
 try:
-    # Formatear nombre de archivo
-    sitio_archivo = sitio_seleccionado.replace(' ', '_').replace('-', '_').replace('/', '_')
-
-    # Cargar datos históricos desde la carpeta output
-    df_historico = pd.read_csv(f"output/historial_{sitio_archivo}.csv")
-
-    # Convertir todos los valores numéricos a float
-    columnas_numericas = ['KWH', 'KVARH', 'Consumo base', 'Consumo inter', 'Consumo punta',
-                        'TOTAL KWh (suma b,i,p)', 'Demanda Base', 'Demanda intermedia',
-                        'Demanda punta', 'Factor de potencia', 'Factor de carga', 'Carga contratada (KW)']
-
-    for col in columnas_numericas:
-        if col in df_historico.columns:
-            df_historico[col] = pd.to_numeric(df_historico[col], errors='coerce').fillna(0)
-
-    # Ordenar por mes
-    df_historico['Mes'] = pd.Categorical(df_historico['Mes'],
-                                       categories=['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto'],
-                                       ordered=True)
-    df_historico = df_historico.sort_values('Mes')
-
-    # Cargar datos actuales desde la carpeta output
-    pozo_actual = pd.read_csv(f"output/pozo_{sitio_archivo}.csv")
-
-    # Convertir valores numéricos
-    columnas_numericas_actual = ['KWH', 'KVARH', 'Consumo base', 'Consumo inter', 'Consumo punta',
-                               'TOTAL KWh (suma b,i,p)', 'Demanda Base', 'Demanda intermedia',
-                               'Demanda punta', 'Factor de potencia', 'Factor de carga', 'Carga contratada (KW)',
-                               'SUBTOTAL', 'IVA 8%', 'DAP', 'Cargos y depósitos', 'Créditos y redondeos', 'TOTAL RECIBO']
-
-    for col in columnas_numericas_actual:
-        if col in pozo_actual.columns:
-            pozo_actual[col] = pd.to_numeric(pozo_actual[col], errors='coerce').fillna(0)
-
+    with medicion.tramo('carga_datos'):
+        df_historico, pozo_actual = datos.cargar_sitio(sitio_seleccionado)
 except FileNotFoundError:
     st.error(f"No se encontraron datos para el sitio {sitio_seleccionado}. Verifica que los archivos históricos estén generados en la carpeta 'output'.")
     st.stop()
@@ -412,24 +112,128 @@ except Exception as e:
     st.error(f"Error al cargar los datos: {str(e)}")
     st.stop()
 
+# Celdas vacías o inválidas (se tomaron como 0), columnas faltantes y meses no reconocidos al leer el sitio
+reporte_historial, reporte_actual = datos.validacion_sitio(sitio_seleccionado)
+reportes_validacion = [r for r in (reporte_historial, reporte_actual) if r]
+if reportes_validacion:
+    with st.expander(f"⚠️ {sum(len(r) for r in reportes_validacion)} observaciones al validar los datos del sitio"):
+        for reporte in reportes_validacion:
+            st.caption(os.path.basename(reporte.archivo or ''))
+            st.dataframe(pd.DataFrame(reporte.celdas), hide_index=True, use_container_width=True)
+
 # Obtener valores actuales
 try:
-    consumo_base = float(pozo_actual["Consumo base"].iloc[0])
-    consumo_inter = float(pozo_actual["Consumo inter"].iloc[0])
-    consumo_punta = float(pozo_actual["Consumo punta"].iloc[0])
-    consumo_total = consumo_base + consumo_inter + consumo_punta
-    factor_potencia = float(pozo_actual["Factor de potencia"].iloc[0])
-    factor_carga = float(pozo_actual["Factor de carga"].iloc[0])
+    with medicion.tramo('conversion_actual'):
+        consumo_base = float(pozo_actual["Consumo base"].iloc[0])
+        consumo_inter = float(pozo_actual["Consumo inter"].iloc[0])
+        consumo_punta = float(pozo_actual["Consumo punta"].iloc[0])
+        consumo_total = consumo_base + consumo_inter + consumo_punta
+        factor_potencia = float(pozo_actual["Factor de potencia"].iloc[0])
+        factor_carga = float(pozo_actual["Factor de carga"].iloc[0])
+
+    # Resultado del motor de análisis para el sitio (se formatea en cada pestaña)
+    with medicion.tramo('analizar_sitio'):
+        resultado_sitio = analisis.analizar_sitio(df_historico, consumo_total, factor_potencia, factor_carga)
 except Exception as e:
     st.error(f"Error al procesar los datos: {str(e)}")
     st.stop()
 
-# Crear pestañas
-tab1, tab2, tab3 = st.tabs([f"Resumen Actual - {sitio_seleccionado}", f"Análisis Histórico - {sitio_seleccionado}", f"Información Económica - {sitio_seleccionado}"])
+# Indicador de anomalías del sitio (desde la tabla precalculada de la flota)
+try:
+    with medicion.tramo('anomalias_sitio'):
+        anomalias_sitio = anomalias.motor_compartido().sitio(sitio_seleccionado)
+    anomalias_recientes = anomalias_sitio[anomalias_sitio['anomalo'] & anomalias_sitio['ultimo_mes']]
+    if len(anomalias_recientes):
+        fila = anomalias_recientes.iloc[0]
+        st.markdown(
+            f"<div style='color: var(--alert-color); font-weight: bold;'>⚠️ Anomalía en {periodos.etiqueta_codigo(fila['codigo_periodo'])}: "
+            f"{anomalias.describir(fila)}</div>",
+            unsafe_allow_html=True
+        )
+    elif anomalias_sitio['anomalo'].any():
+        st.markdown(
+            f"<div style='color: var(--text-color);'>ℹ️ {int(anomalias_sitio['anomalo'].sum())} meses anteriores con valores anómalos en el historial</div>",
+            unsafe_allow_html=True
+        )
+except Exception as e:
+    st.warning(f"No se pudo consultar la detección de anomalías: {str(e)}")
+
+# Vistas del sitio y de la flota. Cada vista es un fragmento: sus controles solo vuelven a
+# ejecutar esa vista (sin recargar los datos del sitio) y, en el modo por defecto, solo se
+# calcula la vista elegida. DASHBOARD_NAVEGACION=pestanas vuelve a st.tabs, que ejecuta todas.
+NAVEGACION = os.environ.get('DASHBOARD_NAVEGACION', 'vistas')
+
+
+def medido(nombre):
+    # Un fragmento que se vuelve a ejecutar solo (sus controles, run_every) corre después de
+    # que la corrida completa ya escribió su medición: lleva la suya propia hasta el log
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            global medicion
+            if not medicion.terminada:
+                return funcion(*args, **kwargs)
+            medicion = instrumentacion.Medicion()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                medicion.terminar(sesion=sesion, sitio=sitio_seleccionado, fragmento=nombre)
+        return envoltura
+    return decorador
+
 
-with tab1:
+@st.fragment
+@medido('vista_resumen')
+def vista_resumen():
     st.markdown(f"<h2 style='color: #2E86C1;'>Resumen del Mes Actual - {sitio_seleccionado}</h2>", unsafe_allow_html=True)
 
+    # Telemetría en vivo (solo con DASHBOARD_TELEMETRIA_URL): las sesiones leen el caché del
+    # cliente compartido, que sondea todos los sitios en segundo plano
+    cliente_telemetria = telemetria.cliente_compartido()
+    almacen_telemetria = buffer_telemetria.almacen_compartido()
+    if cliente_telemetria is not None:
+        @st.fragment(run_every=telemetria.INTERVALO)
+        @medido('mostrar_telemetria')
+        def mostrar_telemetria():
+            lectura = cliente_telemetria.lectura(sitio_seleccionado)
+            if lectura is None:
+                st.caption(f"Sin telemetría en vivo para {sitio_seleccionado}.")
+                return
+            canales = [
+                ('Gasto_Instantaneo', "Gasto", "l/s"),
+                ('Presion_Instantanea', "Presión", "kg/cm²"),
+                ('Nivel_1', "Nivel", "m"),
+            ]
+            columnas = st.columns(len(telemetria.CAMPOS))
+            for columna, (campo, titulo, unidad) in zip(columnas, canales):
+                with columna:
+                    st.markdown(
+                        f"""
+                        <div class="metric-card">
+                            <div class="metric-title">{titulo}</div>
+                            <div class="metric-value">{lectura[campo]:.2f} {unidad}</div>
+                        </div>
+                        """,
+                        unsafe_allow_html=True
+                    )
+            st.caption(f"Telemetría en vivo, actualizada hace {max(0.0, time.time() - lectura['recibido']):.0f} s")
+
+            # Historial reciente desde el buffer circular del sitio, reducido a unos miles de puntos
+            with st.expander("Historial de telemetría"):
+                ventanas = {"1 hora": 3600, "24 horas": 86400, "7 días": 7 * 86400}
+                ventana = st.radio("Ventana:", list(ventanas), horizontal=True)
+                with medicion.tramo('serie_telemetria'):
+                    series = almacen_telemetria.serie(sitio_seleccionado, desde=time.time() - ventanas[ventana])
+                if series and any(len(t) > 1 for t, _ in series.values()):
+                    titulos = {campo: f"{titulo} ({unidad})" for campo, titulo, unidad in canales}
+                    st.plotly_chart(graficas.figura_telemetria(series, titulos), use_container_width=True)
+                elif sitio_seleccionado in almacen_telemetria.omitidos:
+                    st.caption(f"El sitio no cabe en el presupuesto de memoria de telemetría ({buffer_telemetria.LIMITE_MB:.0f} MB).")
+                else:
+                    st.caption("Aún no hay suficientes lecturas para graficar.")
+
+        mostrar_telemetria()
+
     # Métricas principales
     col1, col2, col3 = st.columns(3)
     with col1:
@@ -453,7 +257,7 @@ with tab1:
                     st.markdown(
                         f"""
                         <div style='text-align: center; margin-top: 10px;'>
-                            <span style='font-size: 0.9em;'>vs {df_historico.iloc[-2]['Mes']}</span><br>
+                            <span style='font-size: 0.9em;'>vs {df_historico.iloc[-2]['Etiqueta']}</span><br>
                             <span class='{color}'>{variacion:+.1f}%</span>
                         </div>
                         """,
@@ -482,7 +286,7 @@ with tab1:
                 st.markdown(
                     f"""
                     <div style='text-align: center; margin-top: 10px;'>
-                        <span style='font-size: 0.9em;'>vs {df_historico.iloc[-2]['Mes']}</span><br>
+                        <span style='font-size: 0.9em;'>vs {df_historico.iloc[-2]['Etiqueta']}</span><br>
                         <span class='{color}'>{variacion:+.2f} pts</span>
                     </div>
                     """,
@@ -511,7 +315,7 @@ with tab1:
                 st.markdown(
                     f"""
                     <div style='text-align: center; margin-top: 10px;'>
-                        <span style='font-size: 0.9em;'>vs {df_historico.iloc[-2]['Mes']}</span><br>
+                        <span style='font-size: 0.9em;'>vs {df_historico.iloc[-2]['Etiqueta']}</span><br>
                         <span class='{color}'>{variacion:+.2f} pts</span>
                     </div>
                     """,
@@ -521,10 +325,12 @@ with tab1:
                 st.write(f"Error al calcular variación: {str(e)}")
 
     # Análisis de consumo
+    with medicion.tramo('formatear_consumo'):
+        texto_consumo = analisis.formatear_consumo(resultado_sitio)
     st.markdown(
         f"""
         <div class="analysis-box">
-            {analizar_consumo(df_historico, consumo_total)}
+            {texto_consumo}
         </div>
         """,
         unsafe_allow_html=True
@@ -532,42 +338,18 @@ with tab1:
 
     # Gráfico de consumo por tipo
     st.markdown(f"<h3 style='color: #2E86C1;'>Distribución del Consumo - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
-    consumos = {
-        "Tipo": ["Base", "Intermedio", "Punta"],
-        "KWh": [consumo_base, consumo_inter, consumo_punta],
-        "Porcentaje": [
-            (consumo_base / consumo_total) * 100 if consumo_total > 0 else 0,
-            (consumo_inter / consumo_total) * 100 if consumo_total > 0 else 0,
-            (consumo_punta / consumo_total) * 100 if consumo_total > 0 else 0
-        ]
-    }
-
-    fig_consumo = px.bar(
-        consumos,
-        x="Tipo",
-        y="KWh",
-        text=[f"{p:.1f}%" for p in consumos["Porcentaje"]],
-        title="",
-        labels={"Tipo": "Tipo de Consumo", "KWh": "KWh"},
-        color="Tipo",
-        color_discrete_sequence=["#2E86C1", "#1A5276", "#0A3D62"]
-    )
-    fig_consumo.update_traces(textposition='outside')
-    fig_consumo.update_layout(
-        plot_bgcolor="white",
-        xaxis=dict(showgrid=False),
-        yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-        margin=dict(l=20, r=20, t=30, b=20),
-        uniformtext_minsize=12,
-        uniformtext_mode='hide'
-    )
-    st.plotly_chart(fig_consumo, use_container_width=True)
+    with medicion.tramo('figura_consumo'):
+        fig_consumo = graficas.figura_sitio('consumo', sitio_seleccionado, df_historico, pozo_actual)
+    with medicion.tramo('plotly_chart_consumo'):
+        st.plotly_chart(fig_consumo, use_container_width=True)
 
     # Análisis de distribución de consumo
+    with medicion.tramo('analizar_distribucion_consumo'):
+        texto_distribucion = analisis.analizar_distribucion_consumo(consumo_base, consumo_inter, consumo_punta)
     st.markdown(
         f"""
         <div class="analysis-box">
-            {analizar_distribucion_consumo(consumo_base, consumo_inter, consumo_punta)}
+            {texto_distribucion}
         </div>
         """,
         unsafe_allow_html=True
@@ -576,92 +358,106 @@ with tab1:
     # Gráfico de demanda por tipo
     st.markdown(f"<h3 style='color: #2E86C1;'>Distribución de la Demanda - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
     try:
-        demanda_base = float(pozo_actual["Demanda Base"].iloc[0])
-        demanda_inter = float(pozo_actual["Demanda intermedia"].iloc[0])
-        demanda_punta = float(pozo_actual["Demanda punta"].iloc[0])
-        demanda_total = demanda_base + demanda_inter + demanda_punta
-
-        demandas = {
-            "Tipo": ["Base", "Intermedia", "Punta"],
-            "KW": [demanda_base, demanda_inter, demanda_punta],
-            "Porcentaje": [
-                (demanda_base / demanda_total) * 100 if demanda_total > 0 else 0,
-                (demanda_inter / demanda_total) * 100 if demanda_total > 0 else 0,
-                (demanda_punta / demanda_total) * 100 if demanda_total > 0 else 0
-            ]
-        }
-
-        fig_demanda = px.bar(
-            demandas,
-            x="Tipo",
-            y="KW",
-            text=[f"{p:.1f}%" for p in demandas["Porcentaje"]],
-            title="",
-            labels={"Tipo": "Tipo de Demanda", "KW": "KW"},
-            color="Tipo",
-            color_discrete_sequence=["#2E86C1", "#1A5276", "#0A3D62"]
-        )
-        fig_demanda.update_traces(textposition='outside')
-        fig_demanda.update_layout(
-            plot_bgcolor="white",
-            xaxis=dict(showgrid=False),
-            yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            margin=dict(l=20, r=20, t=30, b=20),
-            uniformtext_minsize=12,
-            uniformtext_mode='hide'
-        )
-        st.plotly_chart(fig_demanda, use_container_width=True)
+        with medicion.tramo('figura_demanda'):
+            fig_demanda = graficas.figura_sitio('demanda', sitio_seleccionado, df_historico, pozo_actual)
+        with medicion.tramo('plotly_chart_demanda'):
+            st.plotly_chart(fig_demanda, use_container_width=True)
     except Exception as e:
         st.warning(f"No se pudieron mostrar los datos de demanda: {str(e)}")
 
     # Análisis de factor de potencia
+    with medicion.tramo('formatear_factor_potencia'):
+        texto_factor_potencia = analisis.formatear_factor_potencia(resultado_sitio)
     st.markdown(
         f"""
         <div class="analysis-box">
-            {analizar_factor_potencia(df_historico, factor_potencia)}
+            {texto_factor_potencia}
         </div>
         """,
         unsafe_allow_html=True
     )
 
+    # Tamaño del banco de capacitores del sitio para cada FP objetivo (peor de los meses recientes)
+    try:
+        with medicion.tramo('capacitores_sitio'):
+            arreglos_capacitores = capacitores.arreglos_compartidos()
+            bancos = []
+            for objetivo in capacitores.OBJETIVOS_FP:
+                kvar = capacitores.detalle_sitio(arreglos_capacitores, sitio_seleccionado, objetivo)['kVAR necesarios'].max()
+                if kvar > 0:
+                    bancos.append(f"{np.ceil(kvar / capacitores.PASO_KVAR) * capacitores.PASO_KVAR:.0f} kVAR para FP {objetivo:.0f}%")
+        if bancos:
+            st.caption(f"Banco de capacitores sugerido: {', '.join(bancos)} "
+                       f"(peor de los últimos {capacitores.MESES_RECIENTES} meses)")
+    except Exception as e:
+        st.warning(f"No se pudo dimensionar el banco de capacitores: {str(e)}")
+
     # Análisis de factor de carga
+    with medicion.tramo('formatear_factor_carga'):
+        texto_factor_carga = analisis.formatear_factor_carga(resultado_sitio)
     st.markdown(
         f"""
         <div class="analysis-box">
-            {analizar_factor_carga(df_historico, factor_carga)}
+            {texto_factor_carga}
         </div>
         """,
         unsafe_allow_html=True
     )
 
-with tab2:
+@st.fragment
+@medido('vista_historico')
+def vista_historico():
     st.markdown(f"<h2 style='color: #2E86C1;'>Análisis Histórico - {sitio_seleccionado}</h2>", unsafe_allow_html=True)
 
     if len(df_historico) > 1:
+        # Rango de periodos y agrupación de las gráficas (mensual, trimestral o anual)
+        col_rango, col_frecuencia = st.columns([3, 2])
+        with col_rango:
+            desde, hasta = st.select_slider(
+                "Rango de periodos:",
+                options=list(df_historico.index),
+                value=(df_historico.index[0], df_historico.index[-1]),
+                format_func=periodos.etiqueta
+            )
+        with col_frecuencia:
+            opcion_frecuencia = st.radio("Agrupar por:", ["Automático"] + list(periodos.FRECUENCIAS.values()), horizontal=True)
+
+        if opcion_frecuencia == "Automático":
+            frecuencia = None
+        else:
+            frecuencia = {v: k for k, v in periodos.FRECUENCIAS.items()}[opcion_frecuencia]
+        # (la misma variante con que graficas.precalentar deja las figuras en caché)
+        df_grafica, variante = graficas.vista_historial(df_historico, desde, hasta, frecuencia)
+        frecuencia = variante[-1]
+
         # Evolución del consumo mensual
         st.markdown(f"<h3 style='color: #2E86C1;'>Evolución del Consumo Total - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
-        fig_evolucion = px.line(
-            df_historico,
-            x='Mes',
-            y='TOTAL KWh (suma b,i,p)',
-            markers=True,
-            title="",
-            labels={"TOTAL KWh (suma b,i,p)": "Consumo Total (KWh)", "Mes": "Mes"}
-        )
-        fig_evolucion.update_traces(line_color='#2E86C1', marker=dict(color='#1A5276', size=8))
-        fig_evolucion.update_layout(
-            plot_bgcolor="white",
-            xaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            margin=dict(l=20, r=20, t=30, b=20)
-        )
-        st.plotly_chart(fig_evolucion, use_container_width=True)
+        # Pronóstico del mes siguiente (tabla de toda la flota), solo en la vista mensual hasta el último mes
+        pronostico = None
+        if frecuencia == 'M' and hasta == df_historico.index[-1]:
+            try:
+                with medicion.tramo('pronostico_sitio'):
+                    pronostico = pronosticos.pronostico_sitio(sitio_seleccionado)
+            except Exception as e:
+                st.warning(f"No se pudo calcular el pronóstico: {str(e)}")
+        with medicion.tramo('figura_evolucion'):
+            fig_evolucion = graficas.figura_sitio('evolucion', sitio_seleccionado, df_grafica, pozo_actual, variante, pronostico)
+        with medicion.tramo('plotly_chart_evolucion'):
+            st.plotly_chart(fig_evolucion, use_container_width=True)
+        if pronostico is not None:
+            rango_kwh = (f" (entre {pronostico['inferior_KWh']:,.0f} y {pronostico['superior_KWh']:,.0f})"
+                         if pd.notna(pronostico['superior_KWh']) else "")
+            st.caption(f"Pronóstico para {periodos.etiqueta_codigo(pronostico['codigo_periodo'])}: "
+                       f"{pronostico['pronostico_KWh']:,.0f} KWh{rango_kwh} y ${pronostico['pronostico_Recibo']:,.2f} "
+                       f"de recibo (modelo: {pronostico['modelo']}, {pronostico['meses']} meses)")
 
         # Análisis de tendencias históricas
+        with medicion.tramo('formatear_tendencias'):
+            texto_tendencias = analisis.formatear_tendencias(resultado_sitio)
         st.markdown(
             f"""
             <div class="analysis-box">
-                {analizar_tendencias(df_historico)}
+                {texto_tendencias}
             </div>
             """,
             unsafe_allow_html=True
@@ -669,79 +465,26 @@ with tab2:
 
         # Evolución del factor de potencia
         st.markdown(f"<h3 style='color: #2E86C1;'>Evolución del Factor de Potencia - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
-        fig_fp = px.line(
-            df_historico,
-            x='Mes',
-            y='Factor de potencia',
-            markers=True,
-            title="",
-            labels={"Factor de potencia": "Factor de Potencia (%)", "Mes": "Mes"}
-        )
-        fig_fp.add_hline(y=90, line_dash="dash", line_color="red", annotation_text="Límite recomendado")
-        fig_fp.update_traces(line_color='#E74C3C', marker=dict(color='#C0392B', size=8))
-        fig_fp.update_layout(
-            plot_bgcolor="white",
-            xaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            margin=dict(l=20, r=20, t=30, b=20)
-        )
-        st.plotly_chart(fig_fp, use_container_width=True)
+        with medicion.tramo('figura_fp'):
+            fig_fp = graficas.figura_sitio('fp', sitio_seleccionado, df_grafica, pozo_actual, variante)
+        with medicion.tramo('plotly_chart_fp'):
+            st.plotly_chart(fig_fp, use_container_width=True)
 
         # Evolución del factor de carga
         st.markdown(f"<h3 style='color: #2E86C1;'>Evolución del Factor de Carga - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
-        fig_fc = px.line(
-            df_historico,
-            x='Mes',
-            y='Factor de carga',
-            markers=True,
-            title="",
-            labels={"Factor de carga": "Factor de Carga (%)", "Mes": "Mes"}
-        )
-        fig_fc.add_hline(y=20, line_dash="dash", line_color="orange", annotation_text="Límite mínimo recomendado")
-        fig_fc.update_traces(line_color='#F39C12', marker=dict(color='#D35400', size=8))
-        fig_fc.update_layout(
-            plot_bgcolor="white",
-            xaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            margin=dict(l=20, r=20, t=30, b=20)
-        )
-        st.plotly_chart(fig_fc, use_container_width=True)
+        with medicion.tramo('figura_fc'):
+            fig_fc = graficas.figura_sitio('fc', sitio_seleccionado, df_grafica, pozo_actual, variante)
+        with medicion.tramo('plotly_chart_fc'):
+            st.plotly_chart(fig_fc, use_container_width=True)
 
         # Mapa de calor de consumo por tipo
         st.markdown(f"<h3 style='color: #2E86C1;'>Distribución del Consumo por Tipo (Histórico) - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
 
-        # Preparar datos para el heatmap
-        heatmap_data = []
-        for _, row in df_historico.iterrows():
-            total = row['TOTAL KWh (suma b,i,p)']
-            if total > 0:
-                heatmap_data.append({
-                    'Mes': row['Mes'],
-                    'Consumo Base %': (row['Consumo base'] / total) * 100,
-                    'Consumo Intermedio %': (row['Consumo inter'] / total) * 100,
-                    'Consumo Punta %': (row['Consumo punta'] / total) * 100
-                })
-
-        if heatmap_data:
-            df_heatmap = pd.DataFrame(heatmap_data)
-            df_heatmap = df_heatmap.set_index('Mes')
-
-            fig_heatmap = go.Figure(data=go.Heatmap(
-                z=df_heatmap[['Consumo Base %', 'Consumo Intermedio %', 'Consumo Punta %']].values.T,
-                x=df_heatmap.index,
-                y=['Consumo Base', 'Consumo Intermedio', 'Consumo Punta'],
-                colorscale='Blues',
-                zmin=0,
-                zmax=100
-            ))
-            fig_heatmap.update_layout(
-                title='',
-                xaxis_title='Mes',
-                yaxis_title='Tipo de Consumo',
-                plot_bgcolor='white',
-                margin=dict(l=20, r=20, t=30, b=20)
-            )
-            st.plotly_chart(fig_heatmap, use_container_width=True)
+        with medicion.tramo('figura_heatmap'):
+            fig_heatmap = graficas.figura_sitio('heatmap', sitio_seleccionado, df_grafica, pozo_actual, variante)
+        if fig_heatmap is not None:
+            with medicion.tramo('plotly_chart_heatmap'):
+                st.plotly_chart(fig_heatmap, use_container_width=True)
 
             # Análisis del mapa de calor
             st.markdown(
@@ -759,17 +502,15 @@ with tab2:
     else:
         st.warning("No hay suficientes datos históricos para mostrar el análisis.")
 
-with tab3:
+@st.fragment
+@medido('vista_economica')
+def vista_economica():
     st.markdown(f"<h2 style='color: #2E86C1;'>Información Económica - {sitio_seleccionado}</h2>", unsafe_allow_html=True)
     try:
-        # Asegúrate de que las columnas numéricas sean convertidas correctamente
-        columnas_economicas = ['SUBTOTAL', 'IVA 8%', 'DAP', 'Cargos y depósitos', 'Créditos y redondeos', 'TOTAL RECIBO']
-        for col in columnas_economicas:
-            if col in pozo_actual.columns:
-                pozo_actual[col] = pd.to_numeric(pozo_actual[col], errors='coerce').fillna(0)
-            else:
+        # Las columnas económicas ya vienen tipadas por el esquema; solo avisar de las que faltaban en el archivo
+        for col in reporte_actual.columnas_faltantes():
+            if col in datos.COLUMNAS_ECONOMICAS:
                 st.warning(f"Columna '{col}' no encontrada en el archivo. Se usará 0 como valor predeterminado.")
-                pozo_actual[col] = 0
 
         subtotal = float(pozo_actual["SUBTOTAL"].iloc[0])
         iva = float(pozo_actual["IVA 8%"].iloc[0])
@@ -821,32 +562,10 @@ with tab3:
 
         # Desglose de costos
         st.markdown(f"<h3 style='color: #2E86C1;'>Desglose de Costos - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
-        desglose_costos = {
-            "Concepto": ["Subtotal", "IVA 8%", "DAP", "Cargos y Depósitos", "Créditos y Redondeos"],
-            "Monto": [
-                subtotal,
-                iva,
-                dap,
-                cargos_depositos,
-                creditos_redondeos
-            ]
-        }
-        fig_desglose = px.bar(
-            desglose_costos,
-            x="Concepto",
-            y="Monto",
-            title="",
-            labels={"Concepto": "Concepto", "Monto": "Monto ($)"},
-            color="Concepto",
-            color_discrete_sequence=["#2E86C1", "#1A5276", "#0A3D62", "#5D6D7E", "#7B7D7D"]
-        )
-        fig_desglose.update_layout(
-            plot_bgcolor="white",
-            xaxis=dict(showgrid=False),
-            yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
-            margin=dict(l=20, r=20, t=30, b=20)
-        )
-        st.plotly_chart(fig_desglose, use_container_width=True)
+        with medicion.tramo('figura_desglose'):
+            fig_desglose = graficas.figura_sitio('desglose', sitio_seleccionado, df_historico, pozo_actual)
+        with medicion.tramo('plotly_chart_desglose'):
+            st.plotly_chart(fig_desglose, use_container_width=True)
 
         # Tabla con datos económicos detallados
         st.markdown(f"<h2 style='color: #2E86C1;'>Datos Económicos Detallados - {sitio_seleccionado}</h2>", unsafe_allow_html=True)
@@ -864,3 +583,555 @@ with tab3:
     except Exception as e:
         st.error(f"Error al procesar datos económicos: {str(e)}")
 
+    # Simulador de tarifa GDMTH: los sliders solo vuelven a ejecutar este fragmento y cada
+    # combinación de cuotas queda memorizada para toda la flota
+    @st.fragment
+    @medido('mostrar_simulador_tarifa')
+    def mostrar_simulador_tarifa():
+        st.markdown(f"<h3 style='color: #2E86C1;'>Simulador de Tarifa GDMTH - {sitio_seleccionado}</h3>", unsafe_allow_html=True)
+        with st.expander("Cuotas de la tarifa"):
+            col1, col2, col3 = st.columns(3)
+            tarifa = {}
+            for i, (clave, titulo, paso) in enumerate([
+                ('energia_base', "Energía base ($/kWh)", 0.01),
+                ('energia_intermedia', "Energía intermedia ($/kWh)", 0.01),
+                ('energia_punta', "Energía punta ($/kWh)", 0.01),
+                ('capacidad', "Capacidad ($/kW punta)", 1.0),
+                ('distribucion', "Distribución ($/kW máx.)", 1.0),
+                ('cargo_fijo', "Cargo fijo ($/mes)", 10.0),
+            ]):
+                with (col1, col2, col3)[i % 3]:
+                    tarifa[clave] = st.number_input(titulo, min_value=0.0, value=float(tarifas.TARIFA_GDMTH[clave]), step=paso)
+        fraccion = st.slider("Consumo de punta movido a horario base (%):", 0, 100, 20, step=5) / 100
+
+        with medicion.tramo('simulador_tarifa'):
+            simulacion = tarifas.simulador_compartido().sitio(sitio_seleccionado, tarifa)
+            claves_flota, _, simulacion_flota = tarifas.simulador_compartido().simular(tarifa)
+        if simulacion is None:
+            st.info("No hay datos del mes actual de este sitio en la flota.")
+            return
+        i = tarifas.FRACCIONES.index(round(fraccion, 2))
+
+        col1, col2, col3 = st.columns(3)
+        for columna, titulo, valor in [
+            (col1, "Costo Simulado Actual", f"${simulacion['total'][0]:,.2f}"),
+            (col2, f"Costo con {fraccion:.0%} Movido", f"${simulacion['total'][i]:,.2f}"),
+            (col3, "Ahorro Mensual", f"${simulacion['ahorro'][i]:,.2f}"),
+        ]:
+            with columna:
+                st.markdown(
+                    f"""
+                    <div class="metric-card">
+                        <div class="metric-title">{titulo}</div>
+                        <div class="metric-value">{valor}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+        st.plotly_chart(graficas.figura_escenarios_tarifa(tarifas.FRACCIONES, simulacion['total'], fraccion), use_container_width=True)
+        st.caption(f"Subtotal del recibo: ${float(pozo_actual['SUBTOTAL'].iloc[0]):,.2f} (referencia para ajustar las cuotas). "
+                   f"Ajuste por factor de potencia: ${simulacion['ajuste_fp'][i]:,.2f}. "
+                   f"Con el mismo escenario, la flota ({len(claves_flota)} sitios) ahorraría "
+                   f"${simulacion_flota['ahorro'][:, i].sum():,.2f} al mes.")
+
+    try:
+        mostrar_simulador_tarifa()
+    except Exception as e:
+        st.error(f"Error en el simulador de tarifa: {str(e)}")
+
+
+@st.fragment
+@medido('vista_flota')
+def vista_flota():
+    st.markdown("<h2 style='color: #2E86C1;'>Resumen de la Flota - Mes Actual</h2>", unsafe_allow_html=True)
+    try:
+        # Todos los sitios a la vez sobre el DataFrame combinado (sin recorrer archivos)
+        with medicion.tramo('carga_flota'):
+            flota_actual = datos.cargar_flota('pozo')
+            flota_historial = datos.cargar_flota('historial')
+        with medicion.tramo('resumen_flota'):
+            resumen = analisis.resumen_flota(flota_actual)
+            totales = analisis.totales_flota(resumen)
+
+        col1, col2, col3, col4 = st.columns(4)
+        tarjetas = [
+            (col1, "Consumo Total Flota", f"{totales['consumo_total']:,.0f} KWh"),
+            (col2, "Costo Total Flota", f"${totales['total_recibo']:,.2f}"),
+            (col3, "Costo por kWh", f"${totales['costo_kwh']:.4f}"),
+            (col4, "FP Ponderado", f"{totales['factor_potencia']:.2f}%"),
+        ]
+        for columna, titulo, valor in tarjetas:
+            with columna:
+                st.markdown(
+                    f"""
+                    <div class="metric-card">
+                        <div class="metric-title">{titulo}</div>
+                        <div class="metric-value">{valor}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+
+        st.markdown(f"<h3 style='color: #2E86C1;'>Indicadores por Sitio ({totales['sitios']} sitios)</h3>", unsafe_allow_html=True)
+        st.dataframe(
+            resumen,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Consumo Total (KWh)": st.column_config.NumberColumn(format="localized"),
+                "Factor de Potencia (%)": st.column_config.NumberColumn(format="%.2f"),
+                "Factor de Carga (%)": st.column_config.NumberColumn(format="%.2f"),
+                "Total Recibo ($)": st.column_config.NumberColumn(format="dollar"),
+                "Costo por kWh ($)": st.column_config.NumberColumn(format="$%.4f"),
+            }
+        )
+
+        # Alertas de todos los sitios desde el motor de análisis por lotes
+        st.markdown("<h3 style='color: #2E86C1;'>Alertas de la Flota</h3>", unsafe_allow_html=True)
+        with medicion.tramo('analizar_flota'):
+            resultados = analisis.analizar_flota(flota_historial, flota_actual)
+        filtros = {
+            "Todas las alertas": resultados['nivel_alerta'] > 0,
+            "Factor de potencia bajo (< 90%)": resultados['nivel_fp'] == 'bajo',
+            "Alto consumo (> 10% sobre el promedio)": resultados['nivel_consumo'] == 'alto',
+            "Factor de carga muy bajo (< 20%)": resultados['nivel_fc'] == 'muy_bajo',
+            "Tendencia alcista de consumo": resultados['tendencia_consumo'] == 'alcista',
+        }
+        filtro = st.selectbox("Mostrar sitios con:", list(filtros))
+        alertas = resultados[filtros[filtro] & (resultados['meses'] >= 2)].sort_values(['nivel_alerta', 'meses_bajo_90'], ascending=False)
+        st.dataframe(
+            pd.DataFrame({
+                "Alerta": alertas['nivel_alerta'].map(analisis.NIVELES_ALERTA),
+                "Consumo": alertas['nivel_consumo'],
+                "Consumo Promedio (KWh)": alertas['consumo_promedio'],
+                "Variación Mensual (%)": alertas['promedio_variacion'],
+                "FP": alertas['nivel_fp'],
+                "Meses FP < 90": alertas['meses_bajo_90'],
+                "FC": alertas['nivel_fc'],
+                "Meses FC < 20": alertas['meses_bajo_20'],
+                "Tendencia": alertas['tendencia_consumo'],
+            }),
+            use_container_width=True,
+            column_config={
+                "Consumo Promedio (KWh)": st.column_config.NumberColumn(format="localized"),
+                "Variación Mensual (%)": st.column_config.NumberColumn(format="%.1f"),
+            }
+        )
+        st.caption(f"{len(alertas)} de {len(resultados)} sitios")
+    except Exception as e:
+        st.error(f"Error al calcular el resumen de la flota: {str(e)}")
+
+    # Pronóstico del mes siguiente para todos los sitios (para presupuesto)
+    st.markdown("<h3 style='color: #2E86C1;'>Pronóstico del Mes Siguiente</h3>", unsafe_allow_html=True)
+    try:
+        with medicion.tramo('pronosticos_flota'):
+            tabla_pronosticos = pronosticos.pronosticos_compartidos()
+        col1, col2 = st.columns(2)
+        for columna, titulo, valor in [
+            (col1, "Consumo Pronosticado", f"{tabla_pronosticos['pronostico_KWh'].sum():,.0f} KWh"),
+            (col2, "Costo Pronosticado", f"${tabla_pronosticos['pronostico_Recibo'].sum():,.2f}"),
+        ]:
+            with columna:
+                st.markdown(
+                    f"""
+                    <div class="metric-card">
+                        <div class="metric-title">{titulo}</div>
+                        <div class="metric-value">{valor}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+        st.dataframe(
+            pd.DataFrame({
+                "Sitio": tabla_pronosticos['Sitio'],
+                "Periodo": [periodos.etiqueta_codigo(c) for c in tabla_pronosticos['codigo_periodo']],
+                "Último (KWh)": tabla_pronosticos['ultimo_KWh'],
+                "Pronóstico (KWh)": tabla_pronosticos['pronostico_KWh'],
+                "Mínimo (KWh)": tabla_pronosticos['inferior_KWh'],
+                "Máximo (KWh)": tabla_pronosticos['superior_KWh'],
+                "Pronóstico Recibo ($)": tabla_pronosticos['pronostico_Recibo'],
+                "Modelo": tabla_pronosticos['modelo'],
+            }),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Último (KWh)": st.column_config.NumberColumn(format="localized"),
+                "Pronóstico (KWh)": st.column_config.NumberColumn(format="%.0f"),
+                "Mínimo (KWh)": st.column_config.NumberColumn(format="%.0f"),
+                "Máximo (KWh)": st.column_config.NumberColumn(format="%.0f"),
+                "Pronóstico Recibo ($)": st.column_config.NumberColumn(format="dollar"),
+            }
+        )
+    except Exception as e:
+        st.error(f"Error al calcular los pronósticos de la flota: {str(e)}")
+
+    # Anomalías de toda la flota (mediana/MAD móvil sobre KWh, KVARH, demanda y recibo)
+    st.markdown("<h3 style='color: #2E86C1;'>Anomalías de la Flota</h3>", unsafe_allow_html=True)
+    try:
+        solo_ultimo_mes = st.checkbox("Solo el último mes de cada sitio", value=True)
+        with medicion.tramo('anomalias_flota'):
+            lista_anomalias = anomalias.motor_compartido().anomalias(solo_ultimo_mes)
+        st.dataframe(
+            pd.DataFrame({
+                "Sitio": lista_anomalias['Sitio'],
+                "Periodo": [periodos.etiqueta_codigo(c) for c in lista_anomalias['codigo_periodo']],
+                "Series anómalas": [anomalias.describir(f) for _, f in lista_anomalias.iterrows()],
+                "z máximo": lista_anomalias['z_max'],
+            }),
+            hide_index=True,
+            use_container_width=True,
+            column_config={"z máximo": st.column_config.NumberColumn(format="%.1f")}
+        )
+        st.caption(f"{lista_anomalias['archivo'].nunique()} sitios con anomalías (|z| > {anomalias.UMBRAL_Z}, "
+                   f"ventana de {anomalias.VENTANA} meses previos, mínimo {anomalias.MIN_PERIODOS})")
+    except Exception as e:
+        st.error(f"Error al calcular las anomalías de la flota: {str(e)}")
+
+    # Consultas de la flota por periodo sobre la base SQLite (solo con DASHBOARD_BACKEND=sqlite)
+    base_recibos = basedatos.base_compartida()
+    if base_recibos is not None:
+        st.markdown("<h3 style='color: #2E86C1;'>Consulta por Periodo</h3>", unsafe_allow_html=True)
+        try:
+            primero, ultimo = base_recibos.periodos()
+            if primero is not None:
+                col_patron, col_rango, col_fp = st.columns([2, 3, 1])
+                with col_patron:
+                    patron = st.text_input("Sitios (p. ej. ACM, ZARA):", "")
+                with col_rango:
+                    opciones = list(pd.period_range(primero, ultimo, freq='M'))
+                    consulta_desde, consulta_hasta = st.select_slider(
+                        "Periodo:", options=opciones, value=(opciones[0], opciones[-1]), format_func=periodos.etiqueta)
+                with col_fp:
+                    fp_maximo = st.number_input("FP menor a:", min_value=0.0, max_value=100.0, value=100.0, step=1.0)
+                with medicion.tramo('consulta_sqlite'):
+                    resumen_periodo = base_recibos.resumen_periodo(
+                        consulta_desde, consulta_hasta, patron_sitio=f"%{patron.strip()}%" if patron.strip() else None)
+                resumen_periodo = resumen_periodo[resumen_periodo['Factor de Potencia (%)'].fillna(0) < fp_maximo]
+                st.dataframe(
+                    resumen_periodo,
+                    hide_index=True,
+                    use_container_width=True,
+                    column_config={
+                        "Consumo Total (KWh)": st.column_config.NumberColumn(format="localized"),
+                        "Total Recibo ($)": st.column_config.NumberColumn(format="dollar"),
+                        "Factor de Potencia (%)": st.column_config.NumberColumn(format="%.2f"),
+                    }
+                )
+                st.caption(f"{len(resumen_periodo)} sitios entre {periodos.etiqueta(consulta_desde)} y {periodos.etiqueta(consulta_hasta)}")
+        except Exception as e:
+            st.error(f"Error al consultar la base de recibos: {str(e)}")
+
+    # Bancos de capacitores de toda la flota: cambiar el FP objetivo solo vuelve a ejecutar este
+    # fragmento, sobre los arreglos por recibo ya preparados
+    @st.fragment
+    @medido('mostrar_capacitores')
+    def mostrar_capacitores():
+        st.markdown("<h3 style='color: #2E86C1;'>Bancos de Capacitores</h3>", unsafe_allow_html=True)
+        objetivo = st.radio("FP objetivo:", capacitores.OBJETIVOS_FP, index=0, horizontal=True,
+                            format_func=lambda fp: f"{fp:.0f}%", key='fp_objetivo_capacitores')
+        with medicion.tramo('capacitores_flota'):
+            tabla_capacitores = capacitores.tabla_flota(capacitores.arreglos_compartidos(), objetivo)
+        col1, col2, col3 = st.columns(3)
+        for columna, titulo, valor in [
+            (col1, "Sitios por Corregir", f"{len(tabla_capacitores)}"),
+            (col2, "kVAR por Instalar", f"{tabla_capacitores['Banco sugerido (kVAR)'].sum():,.0f}"),
+            (col3, "Ahorro Anual Estimado", f"${tabla_capacitores['Ahorro anual ($)'].sum():,.2f}"),
+        ]:
+            with columna:
+                st.markdown(
+                    f"""
+                    <div class="metric-card">
+                        <div class="metric-title">{titulo}</div>
+                        <div class="metric-value">{valor}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+        st.dataframe(
+            tabla_capacitores.drop(columns=['archivo']),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "FP último": st.column_config.NumberColumn(format="%.2f"),
+                "FP mínimo": st.column_config.NumberColumn(format="%.2f"),
+                "kVAR necesarios": st.column_config.NumberColumn(format="%.1f"),
+                "Banco sugerido (kVAR)": st.column_config.NumberColumn(format="%.0f"),
+                "Ahorro mensual ($)": st.column_config.NumberColumn(format="dollar"),
+                "Ahorro anual ($)": st.column_config.NumberColumn(format="dollar"),
+            }
+        )
+        st.caption(f"kVAR = demanda máxima × (tan φ del mes − tan φ objetivo), con el peor de los últimos "
+                   f"{capacitores.MESES_RECIENTES} meses; el ahorro es el recargo evitado más la bonificación "
+                   f"ganada, sobre el subtotal del recibo")
+
+    try:
+        mostrar_capacitores()
+    except Exception as e:
+        st.error(f"Error al dimensionar los bancos de capacitores: {str(e)}")
+
+    # Resumen por grupo (zonas y rebombeos) desde los agregados grupo × mes y sitio × mes ya
+    # calculados: cambiar de periodo o bajar a los sitios de un grupo no vuelve a sumar el historial
+    @st.fragment
+    @medido('mostrar_grupos')
+    def mostrar_grupos():
+        st.markdown("<h3 style='color: #2E86C1;'>Resumen por Grupo</h3>", unsafe_allow_html=True)
+        with medicion.tramo('agregados_grupos'):
+            agregados = grupos.agregados_compartidos()
+        codigos = list(agregados['grupo'].xs(grupos.FLOTA, level='Grupo').index)
+        if not codigos:
+            st.info("No hay historial para agrupar.")
+            return
+        col_periodo, col_grupo = st.columns(2)
+        with col_periodo:
+            codigo = st.selectbox("Periodo:", codigos[::-1], format_func=periodos.etiqueta_codigo, key='periodo_grupos')
+        formato = {
+            "Consumo Total (KWh)": st.column_config.NumberColumn(format="localized"),
+            "Demanda Máxima (KW)": st.column_config.NumberColumn(format="localized"),
+            "Factor de Potencia (%)": st.column_config.NumberColumn(format="%.2f"),
+            "Total Recibo ($)": st.column_config.NumberColumn(format="dollar"),
+        }
+        tabla_grupos = grupos.resumen_grupos(codigo, agregados)
+        st.dataframe(tabla_grupos.reset_index(), hide_index=True, use_container_width=True, column_config=formato)
+        st.caption("FP ponderado por la demanda máxima de cada sitio en el mes")
+
+        with col_grupo:
+            grupo = st.selectbox("Detalle del grupo:", list(tabla_grupos.index), key='detalle_grupo')
+        serie = grupos.serie_grupo(grupo, agregados)
+        st.plotly_chart(
+            graficas.figura_comparacion(serie[['Consumo Total (KWh)']].set_axis([grupo], axis=1), "Consumo Total (KWh)"),
+            use_container_width=True
+        )
+        detalle = grupos.sitios_grupo(grupo, codigo, agregados)
+        st.dataframe(detalle.drop(columns=['Grupo', 'Sitios']), hide_index=True, use_container_width=True, column_config=formato)
+        st.caption(f"{len(detalle)} sitios de {grupo} con recibo en {periodos.etiqueta_codigo(codigo)}")
+
+    try:
+        mostrar_grupos()
+    except Exception as e:
+        st.error(f"Error al calcular los agregados por grupo: {str(e)}")
+
+    # Diferencias entre dos periodos del historial o contra el mes actual de otra carpeta de datos
+    @st.fragment
+    @medido('mostrar_diferencias')
+    def mostrar_diferencias():
+        st.markdown("<h3 style='color: #2E86C1;'>Diferencias entre Cortes</h3>", unsafe_allow_html=True)
+        col_modo, col_clave = st.columns([3, 1])
+        with col_modo:
+            modo = st.radio("Comparar:", ["Dos periodos", "Otra carpeta de datos"], horizontal=True, key='modo_diferencias')
+        with col_clave:
+            clave = st.radio("Unir por:", list(diferencias.CLAVES), horizontal=True, key='clave_diferencias')
+
+        if modo == "Dos periodos":
+            codigos = diferencias.periodos_historial()
+            if len(codigos) < 2:
+                st.info("Se necesitan al menos dos periodos en el historial.")
+                return
+            col_antes, col_despues = st.columns(2)
+            with col_antes:
+                codigo_antes = st.selectbox("Periodo inicial:", codigos, index=len(codigos) - 2,
+                                            format_func=periodos.etiqueta_codigo, key='periodo_antes')
+            with col_despues:
+                codigo_despues = st.selectbox("Periodo final:", codigos, index=len(codigos) - 1,
+                                              format_func=periodos.etiqueta_codigo, key='periodo_despues')
+            with medicion.tramo('diferencias'):
+                resultado = diferencias.comparar_periodos(codigo_antes, codigo_despues, clave)
+        else:
+            carpeta = st.text_input("Carpeta de datos anterior (p. ej. una copia de output/ del ciclo pasado):", "",
+                                    key='carpeta_diferencias',
+                                    help=f"Dentro de {diferencias.RAIZ_INSTANTANEAS}; las rutas relativas parten de ahí.").strip()
+            if not carpeta:
+                st.info("Indica la carpeta con los pozo_*.csv del ciclo anterior para compararla con output/.")
+                return
+            try:
+                with medicion.tramo('diferencias'):
+                    resultado = diferencias.comparar_instantaneas(carpeta, clave=clave)
+            except (OSError, ValueError) as e:
+                st.warning(str(e))
+                return
+
+        conteo = resultado['estado'].value_counts()
+        columnas_estado = st.columns(4)
+        for columna, titulo, estado in zip(columnas_estado, ["Sitios Nuevos", "Sitios Faltantes", "Con Cambios", "Sin Cambios"],
+                                           [diferencias.NUEVO, diferencias.FALTANTE, diferencias.CAMBIADO, diferencias.IGUAL]):
+            with columna:
+                st.markdown(
+                    f"""
+                    <div class="metric-card">
+                        <div class="metric-title">{titulo}</div>
+                        <div class="metric-value">{int(conteo.get(estado, 0))}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
+
+        if len(resultado['duplicados']):
+            st.caption("Claves con recibo complementario en un corte, unido con el principal en la comparación: "
+                       + ", ".join(f"{c} ({n} filas)" for c, n in resultado['duplicados'].items()))
+
+        estados = st.multiselect("Mostrar sitios:", [diferencias.NUEVO, diferencias.FALTANTE, diferencias.CAMBIADO, diferencias.IGUAL],
+                                 default=[diferencias.NUEVO, diferencias.FALTANTE, diferencias.CAMBIADO], key='estados_diferencias')
+        tabla_sitios = diferencias.resumen_sitios(resultado)
+        tabla_sitios = tabla_sitios[tabla_sitios['Estado'].isin(estados)]
+        st.dataframe(
+            tabla_sitios,
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Δ TOTAL KWh (suma b,i,p)": st.column_config.NumberColumn("Δ Consumo (KWh)", format="%+.0f"),
+                "Δ Demanda punta": st.column_config.NumberColumn("Δ Demanda punta (KW)", format="%+.0f"),
+                "Δ Factor de potencia": st.column_config.NumberColumn(format="%+.2f"),
+                "Δ Factor de carga": st.column_config.NumberColumn(format="%+.2f"),
+                "Δ TOTAL RECIBO": st.column_config.NumberColumn("Δ Total Recibo ($)", format="%+.2f"),
+            }
+        )
+        with st.expander("Diferencia de cada columna por sitio"):
+            st.dataframe(resultado['diferencia'].loc[tabla_sitios[clave]], use_container_width=True)
+
+        st.markdown("**Totales de la flota por columna**")
+        st.dataframe(
+            diferencias.resumen_columnas(resultado),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "Antes": st.column_config.NumberColumn(format="localized"),
+                "Después": st.column_config.NumberColumn(format="localized"),
+                "Diferencia": st.column_config.NumberColumn(format="%+.2f"),
+            }
+        )
+        st.caption("Factor de potencia y de carga: promedio de los sitios; el resto, suma de la flota")
+
+    try:
+        mostrar_diferencias()
+    except Exception as e:
+        st.error(f"Error al comparar los cortes de la flota: {str(e)}")
+
+    # Ranking de sitios: al cambiar k o la métrica solo se vuelve a ejecutar este fragmento
+    @st.fragment
+    @medido('mostrar_ranking')
+    def mostrar_ranking():
+        st.markdown("<h3 style='color: #2E86C1;'>Ranking de Sitios</h3>", unsafe_allow_html=True)
+        col_metrica, col_k = st.columns([3, 1])
+        with col_metrica:
+            metrica = st.selectbox("Métrica:", list(ranking.METRICAS), format_func=lambda m: ranking.METRICAS[m][0])
+        with col_k:
+            k = st.number_input("k:", min_value=1, max_value=100, value=10, step=1)
+
+        with medicion.tramo('ranking'):
+            indicadores = ranking.indicadores_compartidos()
+            peores, mejores = ranking.ranking(indicadores, metrica, int(k))
+
+        columnas = ['Sitio', ranking.METRICAS[metrica][1], 'Costo por kWh ($)', 'Factor de Potencia (%)',
+                    'Crecimiento KWh (%)', 'Consumo en Punta (%)', 'Periodo']
+        columnas = list(dict.fromkeys(columnas))
+        formato = {
+            "Costo por kWh ($)": st.column_config.NumberColumn(format="$%.4f"),
+            "Factor de Potencia (%)": st.column_config.NumberColumn(format="%.2f"),
+            "Crecimiento KWh (%)": st.column_config.NumberColumn(format="%+.1f"),
+            "Consumo en Punta (%)": st.column_config.NumberColumn(format="%.1f"),
+            "Periodo": st.column_config.TextColumn("Crecimiento entre"),
+        }
+        col_peores, col_mejores = st.columns(2)
+        with col_peores:
+            st.markdown(f"**Prioridad de visita ({len(peores)})**")
+            st.dataframe(peores[columnas], hide_index=True, use_container_width=True, column_config=formato)
+            if metrica == 'fp_bajo_90':
+                fp = indicadores['Factor de Potencia (%)']
+                st.caption(f"{int(((fp > 0) & (fp < 90)).sum())} sitios con factor de potencia menor a 90%")
+        with col_mejores:
+            st.markdown(f"**Mejores ({len(mejores)})**")
+            st.dataframe(mejores[columnas], hide_index=True, use_container_width=True, column_config=formato)
+
+    try:
+        mostrar_ranking()
+    except Exception as e:
+        st.error(f"Error al calcular el ranking de sitios: {str(e)}")
+
+@st.fragment
+@medido('vista_comparacion')
+def vista_comparacion():
+    st.markdown("<h2 style='color: #2E86C1;'>Comparación de Sitios</h2>", unsafe_allow_html=True)
+
+    # Sitios sueltos y grupos completos; las series salen de las matrices de la flota ya calculadas
+    sitios_con_datos = catalogo_sitios.sitios()
+    por_grupo = grupos.sitios_por_grupo(sitios_con_datos)
+    col_grupos, col_sitios = st.columns([2, 3])
+    with col_grupos:
+        grupos_elegidos = st.multiselect("Grupos:", list(por_grupo),
+                                         format_func=lambda g: f"{g} ({len(por_grupo[g])} sitios)")
+    with col_sitios:
+        sitios_elegidos = st.multiselect("Sitios:", sitios_con_datos,
+                                         default=[sitio_seleccionado] if sitio_seleccionado in sitios_con_datos else [])
+    seleccion = list(dict.fromkeys(sitios_elegidos + [s for g in grupos_elegidos for s in por_grupo[g]]))
+    if not seleccion:
+        st.info("Selecciona sitios o grupos para comparar.")
+        return
+
+    if len(seleccion) > graficas.UMBRAL_WEBGL:
+        st.caption(f"{len(seleccion)} sitios: las gráficas se dibujan con WebGL.")
+    try:
+        for clave, (etiqueta, _) in comparacion.METRICAS.items():
+            st.markdown(f"<h3 style='color: #2E86C1;'>{etiqueta}</h3>", unsafe_allow_html=True)
+            with medicion.tramo(f'comparacion_{clave}'):
+                tabla = comparacion.comparar(seleccion, clave)
+            if tabla.empty:
+                st.warning("Los sitios seleccionados no tienen historial.")
+                continue
+            with medicion.tramo(f'figura_comparacion_{clave}'):
+                fig = graficas.figura_comparacion(tabla, etiqueta, graficas.REFERENCIAS_COMPARACION.get(clave))
+            st.plotly_chart(fig, use_container_width=True)
+    except Exception as e:
+        st.error(f"Error al comparar los sitios: {str(e)}")
+
+vistas = {
+    f"Resumen Actual - {sitio_seleccionado}": vista_resumen,
+    f"Análisis Histórico - {sitio_seleccionado}": vista_historico,
+    f"Información Económica - {sitio_seleccionado}": vista_economica,
+    "Flota": vista_flota,
+    "Comparación": vista_comparacion,
+}
+if NAVEGACION == 'pestanas':
+    for pestana, vista in zip(st.tabs(list(vistas)), vistas.values()):
+        with pestana:
+            vista()
+else:
+    # La selección se guarda por posición para conservar la vista al cambiar de sitio
+    indice_vista = st.segmented_control(
+        "Vista:", range(len(vistas)), format_func=lambda i: list(vistas)[i],
+        default=0, key='vista', label_visibility='collapsed'
+    )
+    with medicion.tramo('vista'):
+        list(vistas.values())[indice_vista if indice_vista is not None else 0]()
+
+# Registro de tiempos de la corrida y panel de rendimiento (solo administración, ?admin=<token>)
+registro_tiempos = medicion.terminar(sesion=sesion, sitio=sitio_seleccionado)
+if admin:
+    perfil = medicion.reporte_perfil()
+    if perfil:
+        st.session_state['perfil_corrida'] = perfil
+
+    with st.sidebar.expander(f"Rendimiento ({registro_tiempos['total'] * 1000:.0f} ms esta corrida)"):
+        st.markdown("**Esta corrida**")
+        st.dataframe(
+            pd.DataFrame({"Tramo": [n for n, _ in medicion.tramos], "ms": [t * 1000 for _, t in medicion.tramos]}),
+            hide_index=True,
+            use_container_width=True,
+            column_config={"ms": st.column_config.NumberColumn(format="%.1f")}
+        )
+
+        st.markdown("**Todas las sesiones (log)**")
+        st.dataframe(
+            instrumentacion.percentiles(instrumentacion.leer_log()),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "p50 (ms)": st.column_config.NumberColumn(format="%.1f"),
+                "p95 (ms)": st.column_config.NumberColumn(format="%.1f"),
+            }
+        )
+
+        if st.button("Perfilar la siguiente corrida (cProfile)"):
+            st.session_state['perfilar_corrida'] = True
+            st.rerun()
+        if 'perfil_corrida' in st.session_state:
+            st.code(st.session_state['perfil_corrida'], language=None)
+
@@ -0,0 +1,236 @@
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import esquema
+
+
+# Carpeta donde el proceso de recibos deja los CSV por sitio (se puede apuntar a
+# otra, p. ej. una flota sintética, con la variable de entorno DASHBOARD_DATOS)
+DIRECTORIO_SALIDA = os.environ.get('DASHBOARD_DATOS') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'output')
+
+# Columnas numéricas del historial y del mes actual
+COLUMNAS_NUMERICAS = ['KWH', 'KVARH', 'Consumo base', 'Consumo inter', 'Consumo punta',
+                      'TOTAL KWh (suma b,i,p)', 'Demanda Base', 'Demanda intermedia',
+                      'Demanda punta', 'Factor de potencia', 'Factor de carga', 'Carga contratada (KW)']
+
+COLUMNAS_ECONOMICAS = ['SUBTOTAL', 'IVA 8%', 'DAP', 'Cargos y depósitos', 'Créditos y redondeos', 'TOTAL RECIBO']
+
+COLUMNAS_NUMERICAS_ACTUAL = COLUMNAS_NUMERICAS + COLUMNAS_ECONOMICAS
+
+# Lista de sitios de interés (pozos y rebombeos)
+SITIOS_INTERES = [
+    '1-RR', '4', '5', '5-R_CH', '6', '7-RR', '9-R', '11-R', '12', '14-R', '15-R', '16-R', '17-R', '23-R',
+    '24-R', '28', '33-R', '38', '42-RR', '45', '46-R', '47-R', '48-R', '50-R', '52-R', '54-R', '55-R',
+    '56-R', '58', '60', '61-R', '62-R', '63-R', '64', '66-R', '67-R', '68-R', '69-R', '70-R', '71-R',
+    '72-R', '73-R', '75-R', '76', '78-R', '79-R', '80-B', '80-AR', '81-R', '84-R', '86-R', '87',
+    '88', '89-R', '89-RR', '91-R', '92-R', '93-R', '94-R', '95', '96', '97-R', '98-R', '99-R', '100',
+    '101', '103', '104', '106', '110', '111', '112', '113', '114', '115', '116', '117', '119', '120',
+    '121', '122', '123-R', '124', '129', '130', '132', '133-R', '134', '135-R', '136-R', '138',
+    '141', '142', '143', '144', '145', '146', '147', '148', '149', '150', '152-R', '156-R',
+    '157', '160', '161', '163', '164', '165', '166', '167-R', '168', '169', '170', '171', '172',
+    '173', '174', '176', '177', '178', '179', '180', '182', '183', '184-R', '185', '186', '187',
+    '188', '190', '191', '192', '193', '194', '195', '196', '197', '198', '199', '200', '201',
+    '202', '203', 'REB 60', 'REB 60-A', '204', '205', '206', '207', '208', '209', '210-R', '211',
+    '212', '212-R', '213', '214', '215', '216', '217', '218', '219', '220-R', '221', '222', '223',
+    '226', '229', '230', '231 (CEFERESO 9)', '232 (electrolux 1)', '233 (electrolux 2)', '234 (IVI 9)',
+    '235 (IVI 10)', '236 (IVI 8)', '237', '238', '239 (IVI 12)', '240 (IVI 13)', '244', '245', '246 BODEGA POZO 19',
+    'Pozo Loma Blanca', '1 ACM', '2 ACM', '3 ACM', '5 ACM', '6 ACM', '7 ACM', '9 ACM', '10 ACM', '11 ACM',
+    '12 ACM', '13 ACM', '14 ACM', '15 ACM', '16 ACM', '17 ACM', '18 ACM', '19 ACM', '21 ACM', '22 ACM',
+    '23 ACM', '24 ACM', '25 ACM', '26 ACM', '27 ACM', '247', '250', '251', '252', '253', '255', '259',
+    '262', '263', '269', '6 Anapra', '2 Samalayuca', '3 Samalayuca', '3-ZARA-R', '4-ZARA', '5-ZARA(140)',
+    '6-ZARA(151)', '7-ZARA(158)', '8-ZARA'
+]
+
+MESES = ['Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 'Julio', 'Agosto',
+         'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+# Límite de memoria del caché de sitios (en MB), configurable por variable de entorno
+LIMITE_CACHE_MB = float(os.environ.get('DASHBOARD_CACHE_MB', 256))
+
+
+def nombre_archivo(sitio):
+    return sitio.replace(' ', '_').replace('-', '_').replace('/', '_')
+
+
+def _archivo(sitio, directorio):
+    # En output/ la clave sale del catálogo; en otra carpeta (flota sintética) del nombre
+    if directorio is None:
+        import catalogo  # importación diferida: catalogo.py depende de este módulo
+        return catalogo.archivo_de(sitio)
+    return nombre_archivo(sitio)
+
+
+def ruta_historial(sitio, directorio=None):
+    return os.path.join(directorio or DIRECTORIO_SALIDA, f"historial_{_archivo(sitio, directorio)}.csv")
+
+
+def ruta_actual(sitio, directorio=None):
+    return os.path.join(directorio or DIRECTORIO_SALIDA, f"pozo_{_archivo(sitio, directorio)}.csv")
+
+
+def convertir_numericos(df, columnas):
+    # Conversión anterior al esquema (celdas inválidas a 0 sin reporte); se conserva para el benchmark
+    for col in columnas:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    return df
+
+
+def _leer_desde_flota(tabla, ruta):
+    # Usar el almacén consolidado (flota.npz) si existe y es más reciente que el CSV
+    import flota  # importación diferida: flota.py depende de este módulo
+
+    # (el almacén de la misma carpeta que el CSV, no siempre el de output/)
+    lector = flota.abrir_flota(os.path.join(os.path.dirname(os.path.abspath(ruta)), 'flota.npz'))
+    if lector is None or lector.mtime_ns < os.stat(ruta).st_mtime_ns:
+        return None
+    clave = flota.clave_archivo(ruta)
+    if not lector.contiene(tabla, clave):
+        return None
+    return lector.sitio(tabla, clave), lector.validacion(tabla, clave) or esquema.ReporteValidacion(ruta)
+
+
+def _leer_desde_bd(tabla, ruta):
+    # Usar la base SQLite (DASHBOARD_BACKEND=sqlite) si ya tiene el CSV con su versión actual
+    import basedatos  # importación diferida: basedatos.py depende de este módulo
+
+    base = basedatos.base_compartida()
+    if base is None or not base.al_dia(ruta):
+        return None
+    import flota
+
+    df = base.consultar(tabla, sitios=[flota.clave_archivo(ruta)]).reset_index(drop=True)
+    return df, base.validacion(ruta)
+
+
+def preparar_historial(df_historico, reporte=None):
+    # Índice mensual (Año, Mes) en orden cronológico
+    import periodos
+    return periodos.indexar(df_historico, reporte)
+
+
+def leer_historial(ruta):
+    # (historial, reporte de validación)
+    leido = _leer_desde_bd('historial', ruta) or _leer_desde_flota('historial', ruta)
+    if leido is None:
+        df_historico, reporte = esquema.leer_csv(ruta, esquema.VISTAS['historial'])
+    else:
+        df_historico, reporte = leido
+        df_historico = df_historico[[c for c in esquema.VISTAS['historial'] if c in df_historico.columns]]
+    return preparar_historial(df_historico, reporte), reporte
+
+
+def leer_actual(ruta):
+    # (mes actual, reporte de validación)
+    leido = _leer_desde_bd('pozo', ruta) or _leer_desde_flota('pozo', ruta)
+    if leido is None:
+        return esquema.leer_csv(ruta, esquema.VISTAS['actual'])
+    return leido
+
+
+class CacheSitios:
+    # Caché LRU de DataFrames ya convertidos, indexado por ruta y validado con
+    # la fecha de modificación del archivo. Si el proceso de recibos reescribe
+    # un CSV, la siguiente lectura detecta el cambio y lo vuelve a cargar.
+    # lector(ruta) regresa (df, reporte de validación); el reporte se guarda junto al df.
+
+    def __init__(self, limite_mb=LIMITE_CACHE_MB):
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        self.bytes_usados = 0
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, ruta, lector):
+        estado = os.stat(ruta)
+        version = (estado.st_mtime_ns, estado.st_size)
+
+        with self._lock:
+            entrada = self._entradas.get(ruta)
+            if entrada is not None and entrada[0] == version:
+                self._entradas.move_to_end(ruta)
+                return entrada[1].copy()
+
+        df, reporte = lector(ruta)
+        tamano = int(df.memory_usage(deep=True).sum())
+
+        with self._lock:
+            anterior = self._entradas.pop(ruta, None)
+            if anterior is not None:
+                self.bytes_usados -= anterior[2]
+            self._entradas[ruta] = (version, df, tamano, reporte)
+            self.bytes_usados += tamano
+
+            # Expulsar los sitios usados hace más tiempo hasta respetar el límite
+            while self.bytes_usados > self.limite_bytes and len(self._entradas) > 1:
+                _, (_, _, tamano_expulsado, _) = self._entradas.popitem(last=False)
+                self.bytes_usados -= tamano_expulsado
+
+        return df.copy()
+
+    def validacion(self, ruta):
+        # Reporte de la última lectura de la ruta (None si no está en el caché)
+        with self._lock:
+            entrada = self._entradas.get(ruta)
+            return entrada[3] if entrada is not None else None
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+            self.bytes_usados = 0
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+_cache = CacheSitios()
+
+
+def configurar_cache(limite_mb):
+    global _cache
+    _cache = CacheSitios(limite_mb)
+    return _cache
+
+
+def cargar_historial(sitio):
+    return _cache.obtener(ruta_historial(sitio), leer_historial)
+
+
+def cargar_actual(sitio):
+    return _cache.obtener(ruta_actual(sitio), leer_actual)
+
+
+def cargar_sitio(sitio):
+    return cargar_historial(sitio), cargar_actual(sitio)
+
+
+def validacion_sitio(sitio):
+    # Reportes de celdas convertidas a 0 al leer el historial y el mes actual del sitio
+    # (vacíos si no hubo ninguna), de la misma lectura que cargar_sitio
+    return tuple(_cache.validacion(ruta) or esquema.ReporteValidacion(ruta)
+                 for ruta in (ruta_historial(sitio), ruta_actual(sitio)))
+
+
+def version_sitio(sitio):
+    # Versión de los datos de un sitio: fecha de modificación y tamaño de sus dos archivos
+    version = []
+    for ruta in (ruta_historial(sitio), ruta_actual(sitio)):
+        try:
+            estado = os.stat(ruta)
+            version.append((estado.st_mtime_ns, estado.st_size))
+        except FileNotFoundError:
+            version.append(None)
+    return tuple(version)
+
+
+def cargar_flota(tabla):
+    # DataFrame combinado de todos los sitios ('historial' o 'pozo'), indexado por
+    # la clave de archivo. La ingesta incremental lo mantiene al día releyendo
+    # solo los CSV que cambiaron desde la última consulta.
+    import ingesta  # importación diferida: ingesta.py depende de este módulo
+
+    ingesta_flota = ingesta.ingesta_compartida()
+    ingesta_flota.actualizar()
+    return ingesta_flota.tabla(tabla)
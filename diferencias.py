@@ -0,0 +1,189 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import datos
+import ingesta
+import periodos
+
+
+# Diferencias entre dos cortes de la flota: dos periodos del historial o el mes actual
+# de dos carpetas de datos (p. ej. output/ antes y después de un ciclo de facturación).
+# Los dos cortes se indexan por Sitio (o RPU) y se alinean con un solo reindex sobre la
+# unión de claves; todas las diferencias salen de una resta de matrices.
+
+# Columnas comparadas, agrupadas para mostrarlas
+GRUPOS_COLUMNAS = {
+    'Consumo': ['KWH', 'KVARH', 'Consumo base', 'Consumo inter', 'Consumo punta', 'TOTAL KWh (suma b,i,p)'],
+    'Demanda': ['Demanda Base', 'Demanda intermedia', 'Demanda punta', 'Carga contratada (KW)'],
+    'Factores': ['Factor de potencia', 'Factor de carga'],
+    'Costos': datos.COLUMNAS_ECONOMICAS,
+}
+COLUMNAS = [col for columnas in GRUPOS_COLUMNAS.values() for col in columnas]
+
+CLAVES = {'Sitio': 'Sitio', 'RPU': 'RPU'}
+
+# Un recibo complementario del mismo servicio trae el RPU con sufijo: '599950800088(1)'
+_SUFIJO_MEDIDOR = r'\(\d+\)$'
+
+# Estado de cada sitio en la comparación
+NUEVO, FALTANTE, CAMBIADO, IGUAL = 'nuevo', 'faltante', 'cambiado', 'igual'
+
+# Diferencia mínima para contar una columna como cambiada (redondeos del recibo)
+TOLERANCIA = 1e-6
+
+# Las carpetas de otros cortes deben estar dentro de esta raíz (por defecto, la que
+# contiene output/); las rutas relativas se toman desde ella
+RAIZ_INSTANTANEAS = os.path.realpath(os.environ.get('DASHBOARD_INSTANTANEAS')
+                                     or os.path.dirname(os.path.abspath(datos.DIRECTORIO_SALIDA)))
+
+# Máximo de carpetas cuya ingesta se conserva en memoria (las menos usadas salen primero)
+MAXIMO_INSTANTANEAS = int(os.environ.get('DASHBOARD_INSTANTANEAS_MAXIMO', 4))
+
+
+def indexar_corte(df, clave='Sitio', columnas=COLUMNAS):
+    # Una fila por clave normalizada. Las filas que comparten clave (el recibo principal y el
+    # complementario) se unen con la regla de periodos.unir_repetidos: se suman los costos y
+    # de las lecturas, demandas y factores repetidos se toma el máximo; 'Filas' cuenta las
+    # filas unidas y la otra clave junta sus valores distintos ('599950800088, 599950800088(1)')
+    claves = df[CLAVES[clave]].astype(str).str.strip()
+    if clave == 'RPU':
+        claves = claves.str.replace(_SUFIJO_MEDIDOR, '', regex=True)
+    claves = pd.Index(claves.to_numpy(), name=clave)
+    columnas = [c for c in columnas if c in df.columns]
+    corte = periodos.unir_repetidos(df[columnas].astype(float).set_axis(claves), [claves])
+    otro = 'RPU' if clave == 'Sitio' else 'Sitio'
+    pares = pd.DataFrame({'clave': claves, 'otro': df[CLAVES[otro]].astype(str).str.strip().to_numpy()}).drop_duplicates()
+    identificador = {}
+    for c, valor in zip(pares['clave'], pares['otro']):
+        identificador[c] = f"{identificador[c]}, {valor}" if c in identificador else valor
+    corte[otro] = pd.Series(identificador)
+    corte['Filas'] = claves.value_counts(sort=False)
+    return corte
+
+
+def corte_periodo(df_historico, codigo):
+    # Filas del historial de la flota en el periodo (código Año * 12 + mes - 1)
+    return df_historico[periodos.codigo_periodo(df_historico) == codigo]
+
+
+def comparar(antes, despues, clave='Sitio', columnas=COLUMNAS):
+    # Alinea los dos cortes sobre la unión de claves y calcula antes, después, diferencia y
+    # cambio porcentual de cada columna; estado por sitio (nuevo, faltante, cambiado, igual)
+    antes = indexar_corte(antes, clave, columnas)
+    despues = indexar_corte(despues, clave, columnas)
+    columnas = [c for c in columnas if c in antes.columns or c in despues.columns]
+    indice = antes.index.union(despues.index, sort=False)
+
+    valores_antes = antes.reindex(index=indice, columns=columnas).to_numpy(dtype=float)
+    valores_despues = despues.reindex(index=indice, columns=columnas).to_numpy(dtype=float)
+    diferencia = valores_despues - valores_antes
+    with np.errstate(divide='ignore', invalid='ignore'):
+        porcentaje = np.where(valores_antes != 0, diferencia / np.abs(valores_antes) * 100, np.nan)
+    cambiadas = np.abs(np.nan_to_num(diferencia)) > TOLERANCIA
+
+    en_antes = indice.isin(antes.index)
+    en_despues = indice.isin(despues.index)
+    estado = np.where(~en_antes, NUEVO, np.where(~en_despues, FALTANTE,
+                                                   np.where(cambiadas.any(axis=1), CAMBIADO, IGUAL)))
+    otro = 'RPU' if clave == 'Sitio' else 'Sitio'
+    identificador = despues[otro].reindex(indice).fillna(antes[otro].reindex(indice))
+    filas = np.maximum(antes['Filas'].reindex(indice, fill_value=0), despues['Filas'].reindex(indice, fill_value=0))
+
+    marco = lambda valores: pd.DataFrame(valores, index=indice, columns=columnas)
+    return {
+        'estado': pd.Series(estado, index=indice, name='Estado'),
+        otro: identificador,
+        'antes': marco(valores_antes),
+        'despues': marco(valores_despues),
+        'diferencia': marco(diferencia),
+        'porcentaje': marco(porcentaje),
+        'columnas_cambiadas': pd.Series(cambiadas.sum(axis=1), index=indice, name='Columnas cambiadas'),
+        # Claves con varias filas en alguno de los cortes (unidas, no descartadas)
+        'duplicados': filas[filas > 1].rename('Filas'),
+    }
+
+
+def resumen_sitios(resultado, columnas=('TOTAL KWh (suma b,i,p)', 'Demanda punta', 'Factor de potencia',
+                                         'Factor de carga', 'TOTAL RECIBO')):
+    # Una fila por sitio: estado, columnas cambiadas y la diferencia de las columnas principales;
+    # primero los nuevos y faltantes, luego los cambios de recibo más grandes
+    diferencia = resultado['diferencia']
+    columnas = [c for c in columnas if c in diferencia.columns]
+    tabla = pd.concat([resultado['estado'], resultado['columnas_cambiadas'],
+                       diferencia[columnas].add_prefix('Δ ')], axis=1)
+    orden = tabla['Estado'].map({NUEVO: 0, FALTANTE: 1, CAMBIADO: 2, IGUAL: 3})
+    magnitud = diferencia['TOTAL RECIBO'].abs() if 'TOTAL RECIBO' in diferencia.columns else resultado['columnas_cambiadas']
+    tabla = tabla.assign(_orden=orden, _magnitud=magnitud.fillna(0))
+    tabla = tabla.sort_values(['_orden', '_magnitud'], ascending=[True, False], kind='stable')
+    return tabla.drop(columns=['_orden', '_magnitud']).rename_axis(resultado['estado'].index.name).reset_index()
+
+
+def resumen_columnas(resultado):
+    # Una fila por columna: total de la flota antes y después (promedio para FP y FC) con
+    # los sitios presentes en cada corte, diferencia y número de sitios en que cambió
+    antes, despues, diferencia = resultado['antes'], resultado['despues'], resultado['diferencia']
+    grupo = {col: nombre for nombre, cols in GRUPOS_COLUMNAS.items() for col in cols}
+    promedio = np.isin(diferencia.columns, GRUPOS_COLUMNAS['Factores'])
+    total_antes = np.where(promedio, antes.mean(), antes.sum())
+    total_despues = np.where(promedio, despues.mean(), despues.sum())
+    return pd.DataFrame({
+        'Grupo': [grupo.get(c, '') for c in diferencia.columns],
+        'Columna': diferencia.columns,
+        'Antes': total_antes,
+        'Después': total_despues,
+        'Diferencia': total_despues - total_antes,
+        'Sitios con cambio': (diferencia.abs() > TOLERANCIA).sum().to_numpy(),
+    })
+
+
+def periodos_historial():
+    # Códigos de los periodos con recibos en el historial de la flota, en orden
+    codigo = periodos.codigo_periodo(datos.cargar_flota('historial'))
+    return [int(c) for c in np.unique(codigo[~np.isnan(codigo)])]
+
+
+def comparar_periodos(codigo_antes, codigo_despues, clave='Sitio'):
+    historial = datos.cargar_flota('historial')
+    return comparar(corte_periodo(historial, codigo_antes), corte_periodo(historial, codigo_despues), clave)
+
+
+_instantaneas = OrderedDict()
+_lock = threading.Lock()
+
+
+def carpeta_instantanea(directorio):
+    # Ruta real de la carpeta; ValueError si queda fuera de RAIZ_INSTANTANEAS (output/
+    # siempre se permite)
+    ruta = os.path.realpath(os.path.join(RAIZ_INSTANTANEAS, directorio))
+    if ruta != os.path.realpath(datos.DIRECTORIO_SALIDA) and os.path.commonpath([ruta, RAIZ_INSTANTANEAS]) != RAIZ_INSTANTANEAS:
+        raise ValueError(f"La carpeta {directorio} está fuera de {RAIZ_INSTANTANEAS}")
+    return ruta
+
+
+def instantanea(directorio):
+    # Mes actual (tabla pozo) de otra carpeta de datos; su ingesta (sin manifiesto en
+    # disco) se conserva para que volver a compararla solo revise fechas de los CSV
+    directorio = carpeta_instantanea(directorio)
+    if not os.path.isdir(directorio):
+        raise FileNotFoundError(f"No existe la carpeta {directorio}")
+    if directorio == os.path.realpath(datos.DIRECTORIO_SALIDA):
+        ingesta_carpeta = ingesta.ingesta_compartida()
+    else:
+        with _lock:
+            ingesta_carpeta = _instantaneas.get(directorio)
+            if ingesta_carpeta is None:
+                ingesta_carpeta = _instantaneas[directorio] = ingesta.Ingesta(directorio, persistente=False)
+            _instantaneas.move_to_end(directorio)
+            while len(_instantaneas) > MAXIMO_INSTANTANEAS:
+                _instantaneas.popitem(last=False)
+    ingesta_carpeta.actualizar()
+    return ingesta_carpeta.tabla('pozo')
+
+
+def comparar_instantaneas(directorio_antes, directorio_despues=None, clave='Sitio'):
+    # Mes actual de directorio_antes contra el de directorio_despues (por defecto, output/)
+    return comparar(instantanea(directorio_antes), instantanea(directorio_despues or datos.DIRECTORIO_SALIDA), clave)
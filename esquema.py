@@ -0,0 +1,180 @@
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAY_PYARROW = True
+except ImportError:
+    HAY_PYARROW = False
+
+
+# Esquema declarado del formato de recibo (22 columnas) y lectura tipada de los
+# CSV. Cada celda que no se puede convertir (o que viene vacía) se toma como 0,
+# pero queda anotada en un reporte de validación en lugar de perderse.
+COLUMNAS_ECONOMICAS = ['SUBTOTAL', 'IVA 8%', 'DAP', 'Cargos y depósitos', 'Créditos y redondeos', 'TOTAL RECIBO']
+
+COLUMNAS_MEDICION = ['KWH', 'KVARH', 'Consumo base', 'Consumo inter', 'Consumo punta',
+                     'TOTAL KWh (suma b,i,p)', 'Demanda Base', 'Demanda intermedia',
+                     'Demanda punta', 'Factor de potencia', 'Factor de carga', 'Carga contratada (KW)']
+
+COLUMNAS_FACTORES = ['Factor de potencia', 'Factor de carga']
+
+# Energía y demanda (enteros en los recibos, exactos en float32 hasta ~16 millones) en float32;
+# montos y factores en float64, porque en float32 cambia el redondeo de centavos y décimas
+# (tipos como objetos dtype y no como texto: pandas resuelve cada nombre en cada lectura)
+CATEGORIA = pd.CategoricalDtype()
+ESQUEMA = {
+    'RPU': str,
+    'Sitio': CATEGORIA,
+    'Mes': CATEGORIA,
+    'Año': np.dtype('int64'),
+    **{col: np.dtype('float64') for col in COLUMNAS_ECONOMICAS},
+    **{col: np.dtype('float64') if col in COLUMNAS_FACTORES else np.dtype('float32') for col in COLUMNAS_MEDICION},
+}
+
+COLUMNAS = ['RPU', 'Sitio', 'Mes', 'Año'] + COLUMNAS_ECONOMICAS + COLUMNAS_MEDICION
+
+COLUMNAS_TEXTO = ['RPU', 'Sitio', 'Mes']
+COLUMNAS_CATEGORICAS = ['Sitio', 'Mes']
+COLUMNAS_NUMERICAS = [col for col in ESQUEMA if col not in COLUMNAS_TEXTO]
+
+# Al leer un archivo el texto queda como object: en un CSV de un sitio (pocas filas)
+# crear categorías o cadenas de pyarrow cuesta más que leer todo el archivo. Las
+# categorías se aplican con tipar() al combinar muchos sitios, donde sí ahorran memoria.
+_TIPOS_LECTURA = {col: object if col in COLUMNAS_TEXTO else tipo for col, tipo in ESQUEMA.items()}
+_TIPOS_TEXTO = {col: object for col in COLUMNAS_TEXTO}
+
+# Columnas que lee cada vista (None = todas)
+VISTAS = {
+    'historial': ['RPU', 'Sitio', 'Mes', 'Año', 'TOTAL RECIBO', 'KWH', 'KVARH', 'Consumo base', 'Consumo inter',
+                  'Consumo punta', 'TOTAL KWh (suma b,i,p)', 'Demanda Base', 'Demanda intermedia',
+                  'Demanda punta', 'Factor de potencia', 'Factor de carga', 'Carga contratada (KW)'],
+    'actual': None,
+    'catalogo': ['RPU', 'Sitio'],
+}
+
+# pyarrow solo compensa en archivos grandes; con los CSV de un sitio (unos KB) el motor C es más rápido
+MOTOR_CSV = os.environ.get('DASHBOARD_MOTOR_CSV', 'auto')
+UMBRAL_PYARROW_MB = float(os.environ.get('DASHBOARD_UMBRAL_PYARROW_MB', 16))
+
+
+class ReporteValidacion:
+    # Celdas convertidas a 0 al leer un archivo: (columna, línea del CSV, valor original, motivo)
+
+    def __init__(self, archivo=None, celdas=None):
+        self.archivo = archivo
+        self.celdas = celdas or []
+
+    def agregar(self, columna, lineas, valores, motivo):
+        self.celdas.extend({'columna': columna, 'linea': int(l), 'valor': v, 'motivo': motivo}
+                           for l, v in zip(lineas, valores))
+
+    def resumen(self):
+        # Número de celdas por columna y motivo
+        if not self.celdas:
+            return pd.DataFrame(columns=['columna', 'motivo', 'celdas'])
+        return (pd.DataFrame(self.celdas).groupby(['columna', 'motivo'], sort=False).size()
+                .rename('celdas').reset_index())
+
+    def columnas_faltantes(self):
+        return [c['columna'] for c in self.celdas if c['motivo'] == 'columna_faltante']
+
+    def __len__(self):
+        return len(self.celdas)
+
+    def __bool__(self):
+        return bool(self.celdas)
+
+    def __repr__(self):
+        return f"ReporteValidacion({os.path.basename(self.archivo or '')}: {len(self.celdas)} celdas)"
+
+
+def _motor(ruta):
+    if MOTOR_CSV != 'auto':
+        return MOTOR_CSV
+    if HAY_PYARROW and os.path.getsize(ruta) >= UMBRAL_PYARROW_MB * 1024 * 1024:
+        return 'pyarrow'
+    return 'c'
+
+
+def _a_numero(serie, columna, reporte):
+    # Convierte a número anotando en el reporte las celdas vacías o no numéricas (quedan en 0)
+    lineas = np.arange(len(serie)) + 2
+    if pd.api.types.is_numeric_dtype(serie):
+        vacias = serie.isna().to_numpy()
+        if vacias.any():
+            reporte.agregar(columna, lineas[vacias], [None] * int(vacias.sum()), 'vacio')
+        return serie.fillna(0)
+
+    numeros = pd.to_numeric(serie, errors='coerce')
+    fallidas = numeros.isna().to_numpy()
+    if fallidas.any():
+        originales = serie.to_numpy(dtype=object)[fallidas]
+        vacias = np.array([v is None or (isinstance(v, float) and np.isnan(v)) or str(v).strip() == ''
+                           for v in originales], dtype=bool)
+        if vacias.any():
+            reporte.agregar(columna, lineas[fallidas][vacias], [None] * int(vacias.sum()), 'vacio')
+        if (~vacias).any():
+            reporte.agregar(columna, lineas[fallidas][~vacias], [str(v) for v in originales[~vacias]], 'invalido')
+    return numeros.fillna(0)
+
+
+def tipar(df):
+    # Aplica los tipos del esquema a las columnas presentes de un DataFrame ya leído
+    # (p. ej. desde el almacén de la flota o tras concatenar varios sitios)
+    reporte = ReporteValidacion()
+    for col in df.columns:
+        if col in COLUMNAS_CATEGORICAS:
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif col in COLUMNAS_TEXTO:
+            if not pd.api.types.is_string_dtype(df[col]) and df[col].dtype != object:
+                df[col] = df[col].astype(str)
+        elif col in ESQUEMA and df[col].dtype != ESQUEMA[col]:
+            df[col] = _a_numero(df[col], col, reporte).astype(ESQUEMA[col])
+    return df
+
+
+def _leer(ruta, columnas, tipos):
+    motor = _motor(ruta)
+    if columnas is None:
+        usecols = None
+    elif motor == 'pyarrow':
+        # pyarrow necesita los nombres exactos; solo los que existen en el encabezado
+        with open(ruta, encoding='utf-8', newline='') as f:
+            encabezado = next(csv.reader(f), [])
+        usecols = [c for c in encabezado if c in columnas]
+    else:
+        usecols = lambda c: c in columnas
+    return pd.read_csv(ruta, usecols=usecols, engine=motor, dtype=tipos)
+
+
+def leer_csv(ruta, columnas=None):
+    # Lee un CSV de recibos con los tipos del esquema. columnas limita las columnas
+    # leídas; las que pide y no están en el archivo se crean en 0 y se reportan.
+    # Regresa (df, reporte); el reporte va aparte y no en df.attrs, que pandas copia a
+    # cada DataFrame derivado y Streamlit intenta serializar.
+    reporte = ReporteValidacion(ruta)
+    try:
+        # Camino rápido: el motor convierte directo a los tipos del esquema
+        df = _leer(ruta, columnas, _TIPOS_LECTURA)
+    except (ValueError, TypeError):
+        # Alguna celda no es numérica: leer con tipos inferidos y convertir columna por columna
+        df = _leer(ruta, columnas, _TIPOS_TEXTO)
+
+    for col in df.columns:
+        if col in COLUMNAS_NUMERICAS:
+            serie = df[col]
+            if serie.dtype != ESQUEMA[col] or (serie.dtype.kind == 'f' and np.isnan(serie.to_numpy()).any()):
+                df[col] = _a_numero(serie, col, reporte).astype(ESQUEMA[col])
+
+    faltantes = [c for c in (columnas if columnas is not None else COLUMNAS) if c not in df.columns]
+    for col in faltantes:
+        if col in COLUMNAS_NUMERICAS:
+            df[col] = np.zeros(len(df), dtype=ESQUEMA[col])
+            reporte.celdas.append({'columna': col, 'linea': None, 'valor': None, 'motivo': 'columna_faltante'})
+
+    return df, reporte
@@ -0,0 +1,91 @@
+# CSS para modo claro/oscuro (variables usadas también por el HTML de los análisis)
+CSS_DASHBOARD = """
+<style>
+    :root {
+        --text-color: #34495E;
+        --success-color: #27AE60;
+        --warning-color: #F39C12;
+        --alert-color: #E74C3C;
+        --background-color: #f8f9fa;
+        --card-background: #f0f2f6;
+    }
+
+    @media (prefers-color-scheme: dark) {
+        :root {
+            --text-color: #ecf0f1;
+            --success-color: #2ecc71;
+            --warning-color: #f1c40f;
+            --alert-color: #e74c3c;
+            --background-color: #2c3e50;
+            --card-background: #34495e;
+        }
+    }
+
+    .title {
+        text-align: center;
+        color: var(--text-color);
+        font-size: 2.5em;
+        margin-bottom: 20px;
+    }
+
+    .subtitle {
+        text-align: center;
+        color: var(--text-color);
+        font-size: 1.2em;
+        margin-bottom: 30px;
+    }
+
+    .metric-card {
+        background-color: var(--card-background);
+        padding: 15px;
+        border-radius: 10px;
+        text-align: center;
+        box-shadow: 0 4px 8px rgba(0,0,0,0.1);
+        margin-bottom: 20px;
+        color: var(--text-color);
+    }
+
+    .metric-title {
+        color: #2E86C1;
+        margin-bottom: 5px;
+        font-size: 1.1em;
+    }
+
+    .metric-value {
+        font-size: 1.8em;
+        font-weight: bold;
+        color: var(--text-color);
+    }
+
+    .positive {
+        color: var(--success-color);
+    }
+
+    .negative {
+        color: var(--alert-color);
+    }
+
+    .analysis-box {
+        background-color: var(--card-background);
+        border-left: 4px solid #2E86C1;
+        padding: 15px;
+        border-radius: 5px;
+        margin: 20px 0;
+        color: var(--text-color);
+    }
+
+    .analysis-title {
+        color: #2E86C1;
+        font-weight: bold;
+        margin-bottom: 10px;
+    }
+
+    .select-box {
+        background-color: var(--card-background);
+        padding: 10px;
+        border-radius: 5px;
+        margin-bottom: 20px;
+        color: var(--text-color);
+    }
+</style>
+"""
@@ -0,0 +1,229 @@
+import argparse
+import glob
+import json
+import os
+import struct
+import threading
+import time
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+import datos
+import esquema
+
+
+# Almacén consolidado de la flota: un solo .npz sin compresión con una columna
+# tipada por arreglo y un índice de desplazamientos por sitio. Al no estar
+# comprimido, cada columna se puede mapear en memoria directamente desde el zip.
+RUTA_FLOTA = os.path.join(datos.DIRECTORIO_SALIDA, 'flota.npz')
+
+TABLAS = {'historial': 'historial_', 'pozo': 'pozo_'}
+
+COLUMNAS_TEXTO = esquema.COLUMNAS_TEXTO
+
+# Archivos de salida que no corresponden a un sitio individual
+ARCHIVOS_EXCLUIDOS = {'historial_pozos_rebombeos.csv'}
+
+
+def archivos_tabla(tabla, directorio=None):
+    prefijo = TABLAS[tabla]
+    rutas = sorted(glob.glob(os.path.join(directorio or datos.DIRECTORIO_SALIDA, f"{prefijo}*.csv")))
+    return [r for r in rutas if os.path.basename(r) not in ARCHIVOS_EXCLUIDOS]
+
+
+def clave_archivo(ruta):
+    # historial_1_RR.csv -> 1_RR
+    return os.path.basename(ruta).split('_', 1)[1][:-len('.csv')]
+
+
+def leer_csv_tipado(ruta):
+    return esquema.leer_csv(ruta)[0]
+
+
+def _columna_a_arreglo(serie):
+    if (serie.name in COLUMNAS_TEXTO or serie.dtype == object or pd.api.types.is_string_dtype(serie)
+            or isinstance(serie.dtype, pd.CategoricalDtype)):
+        # Texto de ancho fijo para que la columna se pueda mapear en memoria
+        return np.asarray(serie.fillna('').astype(str).to_numpy(), dtype=str)
+    return serie.to_numpy()
+
+
+def construir_tabla(tabla, directorio=None):
+    claves = []
+    partes = []
+    validaciones = []
+    for ruta in archivos_tabla(tabla, directorio):
+        claves.append(clave_archivo(ruta))
+        df, reporte = esquema.leer_csv(ruta)
+        partes.append(df)
+        validaciones.append(json.dumps(reporte.celdas, ensure_ascii=False))
+
+    longitudes = np.array([len(p) for p in partes], dtype=np.int64)
+    inicio = np.concatenate([[0], np.cumsum(longitudes)]).astype(np.int64)
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+    arreglos = {
+        f"{tabla}/_sitios": np.asarray(claves, dtype=str),
+        f"{tabla}/_inicio": inicio,
+        f"{tabla}/_columnas": np.asarray(list(df.columns), dtype=str),
+        # Reporte de validación de cada archivo (JSON), para no perderlo al leer desde el almacén
+        f"{tabla}/_validacion": np.asarray(validaciones, dtype=str),
+    }
+    for col in df.columns:
+        arreglos[f"{tabla}/{col}"] = _columna_a_arreglo(df[col])
+    return arreglos, len(claves), len(df)
+
+
+def construir_flota(directorio=None, destino=None):
+    destino = destino or os.path.join(directorio or datos.DIRECTORIO_SALIDA, 'flota.npz')
+    arreglos = {}
+    resumen = {}
+    for tabla in TABLAS:
+        arreglos_tabla, n_sitios, n_filas = construir_tabla(tabla, directorio)
+        arreglos.update(arreglos_tabla)
+        resumen[tabla] = (n_sitios, n_filas)
+
+    # Agregados por grupo y por sitio (grupos.py), para no volver a sumar el historial al arrancar
+    import grupos
+
+    if 'historial/_sitios' in arreglos and len(arreglos['historial/_sitios']):
+        historial = pd.DataFrame({col: arreglos[f"historial/{col}"] for col in arreglos['historial/_columnas']})
+        historial.index = np.repeat(arreglos['historial/_sitios'], np.diff(arreglos['historial/_inicio']))
+        arreglos.update(grupos.a_arreglos(grupos.agregados_flota(esquema.tipar(historial))))
+
+    # Escribir a un temporal y reemplazar, para que los lectores nunca vean un archivo a medias
+    temporal = destino + '.tmp'
+    with open(temporal, 'wb') as f:
+        np.savez(f, **arreglos)
+    os.replace(temporal, destino)
+    return resumen
+
+
+def _mapear_miembro(ruta, info):
+    # Ubicar los datos del .npy dentro del zip: cabecera local + cabecera npy
+    with open(ruta, 'rb') as f:
+        f.seek(info.header_offset)
+        cabecera_local = f.read(30)
+        n_nombre, n_extra = struct.unpack('<HH', cabecera_local[26:30])
+        f.seek(info.header_offset + 30 + n_nombre + n_extra)
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            forma, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            forma, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        desplazamiento = f.tell()
+
+    if int(np.prod(forma)) == 0:
+        return np.empty(forma, dtype=dtype)
+    return np.memmap(ruta, dtype=dtype, mode='r', offset=desplazamiento, shape=forma,
+                     order='F' if fortran else 'C')
+
+
+class LectorFlota:
+    # Lector del almacén consolidado. Las columnas quedan mapeadas en memoria y
+    # cada consulta por sitio es un corte [inicio, fin) sobre esos arreglos.
+
+    def __init__(self, ruta=RUTA_FLOTA):
+        self.ruta = ruta
+        self.mtime_ns = os.stat(ruta).st_mtime_ns
+        miembros = {}
+        with zipfile.ZipFile(ruta) as zf:
+            for info in zf.infolist():
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"El almacén {ruta} está comprimido y no se puede mapear en memoria")
+                miembros[info.filename[:-len('.npy')]] = _mapear_miembro(ruta, info)
+
+        self._miembros = miembros
+        self._tablas = {}
+        for tabla in TABLAS:
+            if f"{tabla}/_sitios" not in miembros:
+                continue
+            columnas = [str(c) for c in miembros[f"{tabla}/_columnas"]]
+            self._tablas[tabla] = {
+                'indice': {str(s): i for i, s in enumerate(miembros[f"{tabla}/_sitios"])},
+                'inicio': np.asarray(miembros[f"{tabla}/_inicio"]),
+                'columnas': columnas,
+                'arreglos': {col: miembros[f"{tabla}/{col}"] for col in columnas},
+                'validacion': miembros.get(f"{tabla}/_validacion"),
+            }
+
+    def tablas(self):
+        return list(self._tablas)
+
+    def arreglos(self, prefijo):
+        # Otros arreglos guardados en el almacén ({nombre sin prefijo: arreglo})
+        return {nombre[len(prefijo):]: arreglo for nombre, arreglo in self._miembros.items() if nombre.startswith(prefijo)}
+
+    def sitios(self, tabla):
+        return list(self._tablas[tabla]['indice'])
+
+    def contiene(self, tabla, sitio):
+        return tabla in self._tablas and datos.nombre_archivo(sitio) in self._tablas[tabla]['indice']
+
+    def rango(self, tabla, sitio):
+        t = self._tablas[tabla]
+        i = t['indice'][datos.nombre_archivo(sitio)]
+        return int(t['inicio'][i]), int(t['inicio'][i + 1])
+
+    def _marco(self, tabla, corte):
+        t = self._tablas[tabla]
+        return pd.DataFrame({col: np.array(t['arreglos'][col][corte]) for col in t['columnas']})
+
+    def sitio(self, tabla, sitio):
+        inicio, fin = self.rango(tabla, sitio)
+        return self._marco(tabla, slice(inicio, fin))
+
+    def varios(self, tabla, sitios):
+        indices = [np.arange(*self.rango(tabla, s)) for s in sitios if self.contiene(tabla, s)]
+        filas = np.concatenate(indices) if indices else np.array([], dtype=np.int64)
+        return self._marco(tabla, filas)
+
+    def tabla(self, tabla):
+        return self._marco(tabla, slice(None))
+
+    def validacion(self, tabla, sitio):
+        # Reporte de validación guardado al construir el almacén (None si es un almacén anterior)
+        t = self._tablas[tabla]
+        if t['validacion'] is None:
+            return None
+        i = t['indice'][datos.nombre_archivo(sitio)]
+        return esquema.ReporteValidacion(sitio, json.loads(str(t['validacion'][i])))
+
+    def archivos(self, tabla):
+        # Clave de archivo de cada fila de la tabla completa
+        t = self._tablas[tabla]
+        claves = np.asarray(list(t['indice']), dtype=str)
+        return np.repeat(claves, np.diff(t['inicio']))
+
+
+_lector = None
+_lock = threading.Lock()
+
+
+def abrir_flota(ruta=RUTA_FLOTA):
+    # Devuelve el lector compartido, reabriéndolo si el almacén se reconstruyó.
+    # Regresa None si todavía no se ha construido el almacén.
+    global _lector
+    try:
+        mtime_ns = os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if _lector is None or _lector.ruta != ruta or _lector.mtime_ns != mtime_ns:
+            _lector = LectorFlota(ruta)
+        return _lector
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compila los CSV de output/ en un almacén columnar único (flota.npz).")
+    parser.add_argument('--directorio', default=datos.DIRECTORIO_SALIDA, help="Carpeta con los historial_*.csv y pozo_*.csv")
+    parser.add_argument('--destino', default=None, help="Ruta del .npz a generar (por defecto <directorio>/flota.npz)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resumen = construir_flota(args.directorio, args.destino)
+    for tabla, (n_sitios, n_filas) in resumen.items():
+        print(f"{tabla}: {n_sitios} sitios, {n_filas} filas")
+    print(f"Almacén generado en {time.perf_counter() - inicio:.2f} s")
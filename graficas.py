@@ -0,0 +1,448 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+import datos
+import periodos
+
+
+# Construcción de las gráficas del dashboard. No dependen de Streamlit para
+# poder reutilizarlas en los reportes generados por línea de comandos.
+
+def figura_consumo(consumo_base, consumo_inter, consumo_punta):
+    consumo_total = consumo_base + consumo_inter + consumo_punta
+    consumos = {
+        "Tipo": ["Base", "Intermedio", "Punta"],
+        "KWh": [consumo_base, consumo_inter, consumo_punta],
+        "Porcentaje": [
+            (consumo_base / consumo_total) * 100 if consumo_total > 0 else 0,
+            (consumo_inter / consumo_total) * 100 if consumo_total > 0 else 0,
+            (consumo_punta / consumo_total) * 100 if consumo_total > 0 else 0
+        ]
+    }
+
+    fig_consumo = px.bar(
+        consumos,
+        x="Tipo",
+        y="KWh",
+        text=[f"{p:.1f}%" for p in consumos["Porcentaje"]],
+        title="",
+        labels={"Tipo": "Tipo de Consumo", "KWh": "KWh"},
+        color="Tipo",
+        color_discrete_sequence=["#2E86C1", "#1A5276", "#0A3D62"]
+    )
+    fig_consumo.update_traces(textposition='outside')
+    fig_consumo.update_layout(
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        margin=dict(l=20, r=20, t=30, b=20),
+        uniformtext_minsize=12,
+        uniformtext_mode='hide'
+    )
+    return fig_consumo
+
+
+def figura_demanda(demanda_base, demanda_inter, demanda_punta):
+    demanda_total = demanda_base + demanda_inter + demanda_punta
+    demandas = {
+        "Tipo": ["Base", "Intermedia", "Punta"],
+        "KW": [demanda_base, demanda_inter, demanda_punta],
+        "Porcentaje": [
+            (demanda_base / demanda_total) * 100 if demanda_total > 0 else 0,
+            (demanda_inter / demanda_total) * 100 if demanda_total > 0 else 0,
+            (demanda_punta / demanda_total) * 100 if demanda_total > 0 else 0
+        ]
+    }
+
+    fig_demanda = px.bar(
+        demandas,
+        x="Tipo",
+        y="KW",
+        text=[f"{p:.1f}%" for p in demandas["Porcentaje"]],
+        title="",
+        labels={"Tipo": "Tipo de Demanda", "KW": "KW"},
+        color="Tipo",
+        color_discrete_sequence=["#2E86C1", "#1A5276", "#0A3D62"]
+    )
+    fig_demanda.update_traces(textposition='outside')
+    fig_demanda.update_layout(
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        margin=dict(l=20, r=20, t=30, b=20),
+        uniformtext_minsize=12,
+        uniformtext_mode='hide'
+    )
+    return fig_demanda
+
+
+def figura_evolucion(df_historico, pronostico=None):
+    fig_evolucion = px.line(
+        df_historico,
+        x='Etiqueta',
+        y='TOTAL KWh (suma b,i,p)',
+        markers=True,
+        title="",
+        labels={"TOTAL KWh (suma b,i,p)": "Consumo Total (KWh)", "Etiqueta": "Periodo"}
+    )
+    fig_evolucion.update_traces(line_color='#2E86C1', marker=dict(color='#1A5276', size=8))
+    fig_evolucion.update_layout(
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    if pronostico is not None:
+        _agregar_pronostico(fig_evolucion, df_historico, pronostico)
+    return fig_evolucion
+
+
+def _agregar_pronostico(fig, df_historico, pronostico):
+    # Banda del pronóstico del mes siguiente (fila de pronosticos.pronosticar), unida al último mes real
+    import periodos
+
+    ultimo_x = df_historico['Etiqueta'].iloc[-1]
+    ultimo_y = float(df_historico['TOTAL KWh (suma b,i,p)'].iloc[-1])
+    siguiente_x = periodos.etiqueta_codigo(pronostico['codigo_periodo'])
+    x = [ultimo_x, siguiente_x]
+    if pd.notna(pronostico['superior_KWh']):
+        fig.add_trace(go.Scatter(
+            x=x + x[::-1],
+            y=[ultimo_y, pronostico['superior_KWh'], pronostico['inferior_KWh'], ultimo_y],
+            fill='toself', fillcolor='rgba(46, 134, 193, 0.15)', line=dict(width=0),
+            hoverinfo='skip', name="Rango del pronóstico", showlegend=False
+        ))
+    fig.add_trace(go.Scatter(
+        x=x, y=[ultimo_y, pronostico['pronostico_KWh']],
+        mode='lines+markers', line=dict(color='#2E86C1', dash='dash'),
+        marker=dict(color=['#1A5276', 'white'], size=8, line=dict(color='#1A5276', width=2)),
+        name="Pronóstico", showlegend=False,
+        hovertemplate="Pronóstico %{x}: %{y:,.0f} KWh<extra></extra>"
+    ))
+
+
+def figura_fp(df_historico):
+    fig_fp = px.line(
+        df_historico,
+        x='Etiqueta',
+        y='Factor de potencia',
+        markers=True,
+        title="",
+        labels={"Factor de potencia": "Factor de Potencia (%)", "Etiqueta": "Periodo"}
+    )
+    fig_fp.add_hline(y=90, line_dash="dash", line_color="red", annotation_text="Límite recomendado")
+    fig_fp.update_traces(line_color='#E74C3C', marker=dict(color='#C0392B', size=8))
+    fig_fp.update_layout(
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig_fp
+
+
+def figura_fc(df_historico):
+    fig_fc = px.line(
+        df_historico,
+        x='Etiqueta',
+        y='Factor de carga',
+        markers=True,
+        title="",
+        labels={"Factor de carga": "Factor de Carga (%)", "Etiqueta": "Periodo"}
+    )
+    fig_fc.add_hline(y=20, line_dash="dash", line_color="orange", annotation_text="Límite mínimo recomendado")
+    fig_fc.update_traces(line_color='#F39C12', marker=dict(color='#D35400', size=8))
+    fig_fc.update_layout(
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig_fc
+
+
+def figura_heatmap(df_historico):
+    # Preparar datos para el heatmap (None si ningún mes tiene consumo)
+    heatmap_data = []
+    for _, row in df_historico.iterrows():
+        total = row['TOTAL KWh (suma b,i,p)']
+        if total > 0:
+            heatmap_data.append({
+                'Periodo': row['Etiqueta'],
+                'Consumo Base %': (row['Consumo base'] / total) * 100,
+                'Consumo Intermedio %': (row['Consumo inter'] / total) * 100,
+                'Consumo Punta %': (row['Consumo punta'] / total) * 100
+            })
+
+    if not heatmap_data:
+        return None
+
+    df_heatmap = pd.DataFrame(heatmap_data)
+    df_heatmap = df_heatmap.set_index('Periodo')
+
+    fig_heatmap = go.Figure(data=go.Heatmap(
+        z=df_heatmap[['Consumo Base %', 'Consumo Intermedio %', 'Consumo Punta %']].values.T,
+        x=df_heatmap.index,
+        y=['Consumo Base', 'Consumo Intermedio', 'Consumo Punta'],
+        colorscale='Blues',
+        zmin=0,
+        zmax=100
+    ))
+    fig_heatmap.update_layout(
+        title='',
+        xaxis_title='Periodo',
+        yaxis_title='Tipo de Consumo',
+        plot_bgcolor='white',
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig_heatmap
+
+
+def figura_desglose(subtotal, iva, dap, cargos_depositos, creditos_redondeos):
+    desglose_costos = {
+        "Concepto": ["Subtotal", "IVA 8%", "DAP", "Cargos y Depósitos", "Créditos y Redondeos"],
+        "Monto": [
+            subtotal,
+            iva,
+            dap,
+            cargos_depositos,
+            creditos_redondeos
+        ]
+    }
+    fig_desglose = px.bar(
+        desglose_costos,
+        x="Concepto",
+        y="Monto",
+        title="",
+        labels={"Concepto": "Concepto", "Monto": "Monto ($)"},
+        color="Concepto",
+        color_discrete_sequence=["#2E86C1", "#1A5276", "#0A3D62", "#5D6D7E", "#7B7D7D"]
+    )
+    fig_desglose.update_layout(
+        plot_bgcolor="white",
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=True, gridcolor="#f0f0f0"),
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig_desglose
+
+
+def figura_escenarios_tarifa(fracciones, total, seleccion=None):
+    # Costo simulado del mes contra la fracción de punta movida a base
+    porcentajes = [f * 100 for f in fracciones]
+    fig = go.Figure(go.Scatter(
+        x=porcentajes, y=total, mode='lines+markers',
+        line=dict(color='#2E86C1'), marker=dict(color='#1A5276', size=6),
+        hovertemplate="%{x:.0f}% movido: $%{y:,.2f}<extra></extra>"
+    ))
+    if seleccion is not None:
+        i = min(range(len(fracciones)), key=lambda j: abs(fracciones[j] - seleccion))
+        fig.add_trace(go.Scatter(x=[porcentajes[i]], y=[total[i]], mode='markers',
+                                 marker=dict(color='#E74C3C', size=12), hoverinfo='skip'))
+    fig.update_layout(
+        plot_bgcolor="white",
+        showlegend=False,
+        xaxis=dict(title="Consumo de punta movido a base (%)", showgrid=True, gridcolor="#f0f0f0"),
+        yaxis=dict(title="Costo simulado ($)", showgrid=True, gridcolor="#f0f0f0"),
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig
+
+
+def figura_telemetria(series, titulos):
+    # Una fila por canal con eje de tiempo compartido; series = {canal: (tiempos epoch, valores)}
+    from plotly.subplots import make_subplots
+
+    fig = make_subplots(rows=len(series), cols=1, shared_xaxes=True, vertical_spacing=0.04)
+    for fila, (canal, (tiempos, valores)) in enumerate(series.items(), start=1):
+        fig.add_trace(go.Scattergl(
+            x=pd.to_datetime(tiempos, unit='s', utc=True).tz_convert(datetime.now().astimezone().tzinfo),
+            y=valores, mode='lines', line=dict(color='#2E86C1', width=1), name=titulos.get(canal, canal)
+        ), row=fila, col=1)
+        fig.update_yaxes(title_text=titulos.get(canal, canal), showgrid=True, gridcolor="#f0f0f0", row=fila, col=1)
+    fig.update_xaxes(showgrid=True, gridcolor="#f0f0f0")
+    fig.update_layout(
+        plot_bgcolor="white",
+        showlegend=False,
+        height=140 * len(series) + 60,
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig
+
+
+# A partir de cuántas series la comparación se dibuja con WebGL (Scattergl): con
+# decenas de líneas SVG el navegador se vuelve lento al mover el cursor o hacer zoom
+UMBRAL_WEBGL = int(os.environ.get('DASHBOARD_UMBRAL_WEBGL', 20))
+
+# Línea de referencia de cada métrica de comparación: (valor, color, texto)
+REFERENCIAS_COMPARACION = {
+    'fp': (90, "red", "Límite recomendado"),
+    'fc': (20, "orange", "Límite mínimo recomendado"),
+}
+
+
+def figura_comparacion(tabla, titulo_y, referencia=None, umbral_webgl=UMBRAL_WEBGL):
+    # Una línea por sitio (columnas de comparacion.comparar) sobre ejes compartidos
+    webgl = len(tabla.columns) > umbral_webgl
+    traza = go.Scattergl if webgl else go.Scatter
+    # Con muchas series los marcadores solo estorban
+    modo = 'lines' if webgl else 'lines+markers'
+    x = list(tabla.index)
+    fig = go.Figure([
+        traza(x=x, y=tabla[sitio].to_numpy(), mode=modo, name=str(sitio), line=dict(width=1.5 if webgl else 2),
+              hovertemplate=f"{sitio}<br>%{{x}}: %{{y:,.2f}}<extra></extra>")
+        for sitio in tabla.columns
+    ])
+    if referencia is not None:
+        valor, color, texto = referencia
+        fig.add_hline(y=valor, line_dash="dash", line_color=color, annotation_text=texto)
+    fig.update_layout(
+        plot_bgcolor="white",
+        xaxis=dict(title="Periodo", showgrid=True, gridcolor="#f0f0f0", categoryorder='array', categoryarray=x),
+        yaxis=dict(title=titulo_y, showgrid=True, gridcolor="#f0f0f0"),
+        showlegend=len(tabla.columns) <= 2 * umbral_webgl,
+        margin=dict(l=20, r=20, t=30, b=20)
+    )
+    return fig
+
+
+# Gráficas de un sitio a partir de sus DataFrames (historial y mes actual)
+def _valores(pozo_actual, columnas):
+    return [float(pozo_actual[col].iloc[0]) if col in pozo_actual.columns else 0.0 for col in columnas]
+
+
+FIGURAS_SITIO = {
+    'consumo': lambda h, a: figura_consumo(*_valores(a, ['Consumo base', 'Consumo inter', 'Consumo punta'])),
+    'demanda': lambda h, a: figura_demanda(*_valores(a, ['Demanda Base', 'Demanda intermedia', 'Demanda punta'])),
+    'evolucion': lambda h, a: figura_evolucion(h) if len(h) > 1 else None,
+    'fp': lambda h, a: figura_fp(h) if len(h) > 1 else None,
+    'fc': lambda h, a: figura_fc(h) if len(h) > 1 else None,
+    'heatmap': lambda h, a: figura_heatmap(h) if len(h) > 1 else None,
+    'desglose': lambda h, a: figura_desglose(*_valores(a, ['SUBTOTAL', 'IVA 8%', 'DAP', 'Cargos y depósitos', 'Créditos y redondeos'])),
+}
+
+# Máximo de figuras en caché (7 por sitio), configurable por variable de entorno
+LIMITE_CACHE_FIGURAS = int(os.environ.get('DASHBOARD_CACHE_FIGURAS', 2000))
+
+
+class CacheFiguras:
+    # Caché LRU de figuras (go.Figure), indexado por (figura, sitio) y validado con la
+    # versión de los datos del sitio. Un acierto devuelve la misma figura, compartida
+    # entre sesiones: no se modifica después de construirla. (Devolver un dict o una
+    # copia obliga a plotly a validarla otra vez, más lento que construirla de nuevo.)
+
+    def __init__(self, limite=LIMITE_CACHE_FIGURAS):
+        self.limite = limite
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave, version, constructor):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == version:
+                self._entradas.move_to_end(clave)
+                return entrada[1]
+
+        fig = constructor()
+        with self._lock:
+            self._entradas[clave] = (version, fig)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.limite:
+                self._entradas.popitem(last=False)
+        return fig
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+_cache_figuras = CacheFiguras()
+
+
+def figura_sitio(nombre, sitio, df_historico, pozo_actual, variante=None, pronostico=None):
+    # Figura del sitio desde el caché; se reconstruye solo si cambiaron sus datos.
+    # variante distingue el mismo historial recortado o agregado de otra forma
+    # (p. ej. (desde, hasta, frecuencia)); df_historico ya debe venir así.
+    # pronostico (solo para 'evolucion') agrega la banda del mes siguiente.
+    version = datos.version_sitio(sitio)
+    if nombre == 'evolucion' and pronostico is not None:
+        return _cache_figuras.obtener((nombre, sitio, variante, 'pronostico'), version,
+                                      lambda: figura_evolucion(df_historico, pronostico))
+    return _cache_figuras.obtener((nombre, sitio, variante), version,
+                                  lambda: FIGURAS_SITIO[nombre](df_historico, pozo_actual))
+
+
+# Figuras de la vista histórica: se grafican con el historial recortado y agregado
+FIGURAS_HISTORICO = ('evolucion', 'fp', 'fc', 'heatmap')
+
+
+def vista_historial(df_historico, desde=None, hasta=None, frecuencia=None):
+    # Historial como lo grafica la vista histórica y la variante con que se guardan sus
+    # figuras; sin rango, todo el historial; sin frecuencia, la automática para el rango
+    desde = df_historico.index[0] if desde is None else desde
+    hasta = df_historico.index[-1] if hasta is None else hasta
+    df_rango = periodos.rango(df_historico, desde, hasta)
+    frecuencia = frecuencia or periodos.frecuencia_automatica(len(df_rango))
+    return periodos.agregar(df_rango, frecuencia), (str(desde), str(hasta), frecuencia)
+
+
+def precalentar(sitios=None):
+    # Construye de antemano todas las figuras de los sitios indicados (por defecto, todos),
+    # las históricas con el rango, la agrupación y el pronóstico que el dashboard muestra
+    # al abrir el sitio
+    import catalogo
+    import pronosticos
+
+    n = 0
+    for sitio in sitios if sitios is not None else catalogo.obtener_catalogo().sitios():
+        try:
+            df_historico, pozo_actual = datos.cargar_sitio(sitio)
+        except FileNotFoundError:
+            continue
+        for nombre in FIGURAS_SITIO:
+            if nombre not in FIGURAS_HISTORICO:
+                figura_sitio(nombre, sitio, df_historico, pozo_actual)
+        if len(df_historico) > 1:
+            df_grafica, variante = vista_historial(df_historico)
+            pronostico = None
+            if variante[-1] == 'M':
+                try:
+                    pronostico = pronosticos.pronostico_sitio(sitio)
+                except Exception:
+                    pass
+            for nombre in FIGURAS_HISTORICO:
+                figura_sitio(nombre, sitio, df_grafica, pozo_actual, variante,
+                             pronostico if nombre == 'evolucion' else None)
+        n += 1
+    return n
+
+
+_precalentamiento_activo = False
+_lock_precalentamiento = threading.Lock()
+
+
+def activar_precalentamiento():
+    # Precalienta todas las figuras en segundo plano y, después, las de los sitios
+    # que la ingesta reporte como nuevos o modificados
+    global _precalentamiento_activo
+    import catalogo
+    import ingesta
+
+    with _lock_precalentamiento:
+        if _precalentamiento_activo:
+            return
+        _precalentamiento_activo = True
+
+    def al_cambiar(cambios):
+        catalogo_sitios = catalogo.obtener_catalogo()
+        entradas = [catalogo_sitios.entrada(clave) for clave in cambios.sitios()]
+        sitios = [e['sitio'] for e in entradas if e is not None]
+        threading.Thread(target=precalentar, args=(sitios,), daemon=True).start()
+
+    ingesta.ingesta_compartida().suscribir(al_cambiar)
+    threading.Thread(target=precalentar, daemon=True).start()
@@ -0,0 +1,189 @@
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+import datos
+import flota
+import ingesta
+import periodos
+
+
+# Grupos de sitios a partir de su nombre en el catálogo: zonas (ACM, ZARA, Samalayuca,
+# Anapra, REB), los rebombeos ("-R"/"-RR") y el resto de los pozos. La jerarquía es
+# flota > grupo > sitio, con agregados mensuales precalculados en cada nivel.
+ZONAS = ['ACM', 'ZARA', 'Samalayuca', 'Anapra', 'REB']
+REBOMBEOS = 'Rebombeos'
+POZOS = 'Pozos'
+GRUPOS = ZONAS + [REBOMBEOS, POZOS]
+FLOTA = 'Flota'
+
+_PATRONES_ZONA = [(zona, re.compile(rf"\b{zona}\b", re.IGNORECASE)) for zona in ZONAS]
+# '9-R', '89-RR', '5-R_CH' (no '80-AR')
+_PATRON_REBOMBEO = re.compile(r"-R{1,2}(?![A-Za-z])")
+
+
+def grupo_sitio(nombre):
+    # La zona tiene prioridad: '3-ZARA-R' queda en ZARA
+    nombre = str(nombre)
+    for zona, patron in _PATRONES_ZONA:
+        if patron.search(nombre):
+            return zona
+    if _PATRON_REBOMBEO.search(nombre):
+        return REBOMBEOS
+    return POZOS
+
+
+def sitios_por_grupo(sitios):
+    # {grupo: [sitios]} en el orden de GRUPOS y de la lista; solo grupos con sitios
+    grupos = {grupo: [] for grupo in GRUPOS}
+    for sitio in sitios:
+        grupos[grupo_sitio(sitio)].append(sitio)
+    return {grupo: lista for grupo, lista in grupos.items() if lista}
+
+
+# Agregados por mes: consumo y costo se suman, la demanda es la máxima de los tres
+# periodos tarifarios y el FP se pondera por esa demanda
+COLUMNAS_AGREGADO = ['Sitios', 'Consumo Total (KWh)', 'Demanda Máxima (KW)', 'Factor de Potencia (%)', 'Total Recibo ($)']
+COLUMNAS_DEMANDA = ['Demanda Base', 'Demanda intermedia', 'Demanda punta']
+
+# Prefijo de los agregados dentro de flota.npz y versión de su cálculo (los de otra
+# versión se ignoran y se recalculan)
+PREFIJO_ALMACEN = 'agregados/'
+VERSION_AGREGADOS = 2
+
+
+def _sumar(sitios, claves):
+    fp = sitios['Factor de Potencia (%)']
+    peso = sitios['Demanda Máxima (KW)'].where(fp.notna(), 0.0).fillna(0.0)
+    # claves: columnas de sitios o niveles de su índice ('codigo')
+    tabla = sitios[['Grupo', 'Sitios', 'Consumo Total (KWh)', 'Demanda Máxima (KW)', 'Total Recibo ($)']].assign(
+        _ponderado=(fp * peso).fillna(0.0), _peso=peso, _fp=fp)
+    g = tabla.groupby(claves, sort=True)
+    suma = g[['Sitios', 'Consumo Total (KWh)', 'Demanda Máxima (KW)', 'Total Recibo ($)', '_ponderado', '_peso']].sum()
+    # Sin demanda registrada, el promedio simple del FP
+    suma['Factor de Potencia (%)'] = (suma['_ponderado'] / suma['_peso'].where(suma['_peso'] > 0)).fillna(g['_fp'].mean())
+    return suma[COLUMNAS_AGREGADO]
+
+
+def agregados_flota(df_historico):
+    # {'sitio': (archivo, codigo) -> agregados, 'grupo': (Grupo, codigo) -> agregados};
+    # la tabla de grupos incluye la flota completa como grupo FLOTA
+    codigo = periodos.codigo_periodo(df_historico)
+    validos = ~np.isnan(codigo)
+    # Un mes repetido en un archivo (recibo complementario) se une con el principal
+    h = periodos.unir_repetidos(df_historico[validos], [df_historico.index[validos].astype(str), codigo[validos]])
+    codigo = periodos.codigo_periodo(h)
+    sitios = pd.DataFrame({
+        'archivo': h.index.astype(str).to_numpy(),
+        'codigo': codigo.astype(np.int64),
+        'Sitio': h['Sitio'].astype(str).to_numpy(),
+        'Sitios': np.ones(len(h), dtype=np.int64),
+        'Consumo Total (KWh)': h['TOTAL KWh (suma b,i,p)'].to_numpy(dtype=float),
+        'Demanda Máxima (KW)': h[COLUMNAS_DEMANDA].max(axis=1).to_numpy(dtype=float),
+        'Factor de Potencia (%)': h['Factor de potencia'].to_numpy(dtype=float),
+        'Total Recibo ($)': h['TOTAL RECIBO'].to_numpy(dtype=float),
+    })
+    # El nombre es el primero del archivo
+    sitios['Sitio'] = sitios.groupby('archivo')['Sitio'].transform('first')
+    nombres = sitios['Sitio'].unique()
+    sitios['Grupo'] = sitios['Sitio'].map(dict(zip(nombres, map(grupo_sitio, nombres))))
+    sitios = sitios.set_index(['archivo', 'codigo']).sort_index()
+
+    por_grupo = _sumar(sitios, ['Grupo', 'codigo'])
+    total = _sumar(sitios, 'codigo')
+    total.index = pd.MultiIndex.from_product([[FLOTA], total.index], names=['Grupo', 'codigo'])
+    return {'sitio': sitios[['Sitio', 'Grupo'] + COLUMNAS_AGREGADO], 'grupo': pd.concat([total, por_grupo])}
+
+
+def a_arreglos(agregados):
+    # Columnas para guardar en flota.npz (texto de ancho fijo, como las tablas del almacén)
+    arreglos = {f"{PREFIJO_ALMACEN}_grupos": np.asarray(GRUPOS, dtype=str),
+                f"{PREFIJO_ALMACEN}_version": np.asarray(VERSION_AGREGADOS)}
+    for nivel, tabla in agregados.items():
+        plano = tabla.reset_index()
+        arreglos[f"{PREFIJO_ALMACEN}{nivel}/_columnas"] = np.asarray(list(plano.columns), dtype=str)
+        arreglos[f"{PREFIJO_ALMACEN}{nivel}/_indice"] = np.asarray(list(tabla.index.names), dtype=str)
+        for col in plano.columns:
+            valores = plano[col].to_numpy()
+            arreglos[f"{PREFIJO_ALMACEN}{nivel}/{col}"] = valores.astype(str) if valores.dtype == object else valores
+    return arreglos
+
+
+def desde_arreglos(arreglos):
+    agregados = {}
+    for nivel in ('sitio', 'grupo'):
+        columnas = [str(c) for c in arreglos[f"{nivel}/_columnas"]]
+        plano = pd.DataFrame({col: np.array(arreglos[f"{nivel}/{col}"]) for col in columnas})
+        agregados[nivel] = plano.set_index([str(c) for c in arreglos[f"{nivel}/_indice"]])
+    return agregados
+
+
+def _agregados_almacen(ingesta_flota, historial):
+    # Agregados guardados en flota.npz, solo si el almacén es posterior a todos los
+    # historiales, tiene los mismos sitios y se construyó con los mismos grupos y cálculo
+    lector = flota.abrir_flota(os.path.join(ingesta_flota.directorio, 'flota.npz'))
+    if lector is None or 'historial' not in lector.tablas():
+        return None
+    arreglos = lector.arreglos(PREFIJO_ALMACEN)
+    if '_grupos' not in arreglos or [str(g) for g in arreglos['_grupos']] != GRUPOS:
+        return None
+    if '_version' not in arreglos or int(arreglos['_version']) != VERSION_AGREGADOS:
+        return None
+    prefijo = flota.TABLAS['historial']
+    fechas = [e['mtime_ns'] for nombre, e in ingesta_flota.manifiesto.items() if nombre.startswith(prefijo)]
+    if not fechas or max(fechas) > lector.mtime_ns:
+        return None
+    if set(lector.sitios('historial')) != set(historial.index.unique().astype(str)):
+        return None
+    return desde_arreglos(arreglos)
+
+
+_agregados = (None, None)
+_lock = threading.Lock()
+
+
+def agregados_compartidos():
+    # Agregados de la flota: del almacén si está al día, si no calculados; una vez por versión de la ingesta
+    global _agregados
+
+    historial = datos.cargar_flota('historial')
+    ingesta_flota = ingesta.ingesta_compartida()
+    version = ingesta_flota.version
+    with _lock:
+        if _agregados[0] == version:
+            return _agregados[1]
+    agregados = _agregados_almacen(ingesta_flota, historial)
+    if agregados is None:
+        agregados = agregados_flota(historial)
+    with _lock:
+        _agregados = (version, agregados)
+    return agregados
+
+
+def resumen_grupos(codigo, agregados=None):
+    # Una fila por grupo (y la flota) en el mes indicado
+    agregados = agregados or agregados_compartidos()
+    tabla = agregados['grupo'].xs(codigo, level='codigo')
+    orden = [g for g in [FLOTA] + GRUPOS if g in tabla.index]
+    return tabla.loc[orden]
+
+
+def serie_grupo(grupo, agregados=None):
+    # Agregados mensuales del grupo (o de FLOTA), con la etiqueta del periodo como índice
+    agregados = agregados or agregados_compartidos()
+    tabla = agregados['grupo'].xs(grupo, level='Grupo')
+    tabla.index = [periodos.etiqueta_codigo(c) for c in tabla.index]
+    tabla.index.name = 'Periodo'
+    return tabla
+
+
+def sitios_grupo(grupo, codigo, agregados=None):
+    # Sitios del grupo en el mes indicado (todos con FLOTA), desde los agregados por sitio
+    agregados = agregados or agregados_compartidos()
+    tabla = agregados['sitio'].xs(codigo, level='codigo')
+    if grupo != FLOTA:
+        tabla = tabla[tabla['Grupo'] == grupo]
+    return tabla.sort_values('Consumo Total (KWh)', ascending=False)
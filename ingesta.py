@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import datos
+import esquema
+import flota
+
+
+# Manifiesto con tamaño, fecha de modificación y hash de cada CSV ingerido.
+# Se guarda junto a los datos para que un proceso nuevo no tenga que volver a
+# calcular el hash de los archivos que no han cambiado.
+NOMBRE_MANIFIESTO = 'manifiesto_ingesta.json'
+
+
+def hash_archivo(ruta):
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 16), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class CambiosIngesta:
+    # Resultado de una actualización: claves de archivo nuevas, modificadas y eliminadas por tabla
+
+    def __init__(self):
+        self.nuevos = {tabla: [] for tabla in flota.TABLAS}
+        self.modificados = {tabla: [] for tabla in flota.TABLAS}
+        self.eliminados = {tabla: [] for tabla in flota.TABLAS}
+
+    def sitios(self, tabla=None):
+        tablas = [tabla] if tabla else list(flota.TABLAS)
+        return sorted({clave for t in tablas
+                       for clave in self.nuevos[t] + self.modificados[t] + self.eliminados[t]})
+
+    def __bool__(self):
+        return bool(self.sitios())
+
+    def __repr__(self):
+        partes = [f"{tabla}: +{len(self.nuevos[tabla])} ~{len(self.modificados[tabla])} -{len(self.eliminados[tabla])}"
+                  for tabla in flota.TABLAS]
+        return f"CambiosIngesta({', '.join(partes)})"
+
+
+class Ingesta:
+    # Mantiene en memoria el conjunto combinado de la flota (un DataFrame por tabla,
+    # indexado por la clave de archivo) y lo parcha en cada actualización volviendo
+    # a leer solo los CSV nuevos o modificados según el manifiesto.
+
+    def __init__(self, directorio=None, ruta_manifiesto=None, persistente=True):
+        # persistente=False: el manifiesto solo vive en memoria (p. ej. carpetas de solo consulta)
+        self.directorio = directorio or datos.DIRECTORIO_SALIDA
+        self.ruta_manifiesto = ruta_manifiesto or os.path.join(self.directorio, NOMBRE_MANIFIESTO)
+        self.persistente = persistente
+        self.manifiesto = self._leer_manifiesto()
+        self.tablas = {}
+        # Se incrementa cada vez que cambia algún dato; sirve como versión para cachés derivados
+        self.version = 0
+        self._suscriptores = []
+        self._lock = threading.Lock()
+
+    def suscribir(self, funcion):
+        # funcion(cambios) se llama después de cada actualización que trae cambios
+        if funcion not in self._suscriptores:
+            self._suscriptores.append(funcion)
+
+    def _leer_manifiesto(self):
+        if not self.persistente:
+            return {}
+        try:
+            with open(self.ruta_manifiesto, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _guardar_manifiesto(self):
+        temporal = self.ruta_manifiesto + '.tmp'
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(self.manifiesto, f, indent=1, sort_keys=True)
+            os.replace(temporal, self.ruta_manifiesto)
+        except OSError:
+            # Sin permisos de escritura el manifiesto solo vive en memoria
+            pass
+
+    def _entrada(self, ruta, estado):
+        nombre = os.path.basename(ruta)
+        anterior = self.manifiesto.get(nombre)
+        if anterior and anterior['tamano'] == estado.st_size and anterior['mtime_ns'] == estado.st_mtime_ns:
+            return anterior, False
+        entrada = {'tamano': estado.st_size, 'mtime_ns': estado.st_mtime_ns, 'hash': hash_archivo(ruta)}
+        # Un archivo reescrito con el mismo contenido no cuenta como cambio
+        return entrada, anterior is None or anterior['hash'] != entrada['hash']
+
+    def _carga_inicial(self, tabla, rutas):
+        lector = flota.abrir_flota(os.path.join(self.directorio, 'flota.npz'))
+        claves = {flota.clave_archivo(r) for r in rutas}
+        if (lector is not None and tabla in lector.tablas() and set(lector.sitios(tabla)) == claves
+                and all(os.stat(r).st_mtime_ns <= lector.mtime_ns for r in rutas)):
+            df = esquema.tipar(lector.tabla(tabla))
+            df.index = pd.Index(lector.archivos(tabla), name='archivo')
+            return df
+        return self._leer(rutas)
+
+    def _leer(self, rutas):
+        if not rutas:
+            return pd.DataFrame()
+        partes = []
+        for ruta in rutas:
+            df = flota.leer_csv_tipado(ruta)
+            df.index = pd.Index(np.repeat(flota.clave_archivo(ruta), len(df)), name='archivo')
+            partes.append(df)
+        return esquema.tipar(pd.concat(partes))
+
+    def actualizar(self):
+        cambios = CambiosIngesta()
+        error = None
+        with self._lock:
+            carga_inicial = False
+            try:
+                for tabla in flota.TABLAS:
+                    rutas = flota.archivos_tabla(tabla, self.directorio)
+                    por_leer, entradas, nuevos, modificados = [], {}, [], []
+                    for ruta in rutas:
+                        nombre = os.path.basename(ruta)
+                        try:
+                            estado = os.stat(ruta)
+                        except FileNotFoundError:
+                            continue
+                        entrada, cambio = self._entrada(ruta, estado)
+                        if cambio:
+                            (modificados if nombre in self.manifiesto else nuevos).append(flota.clave_archivo(ruta))
+                            por_leer.append(ruta)
+                        entradas[nombre] = entrada
+
+                    presentes = {os.path.basename(r) for r in rutas}
+                    quitados = [n for n in self.manifiesto if n.startswith(flota.TABLAS[tabla]) and n not in presentes]
+                    eliminados = [flota.clave_archivo(n) for n in quitados]
+
+                    if tabla not in self.tablas:
+                        self.tablas[tabla] = self._carga_inicial(tabla, rutas)
+                        carga_inicial = True
+                    elif por_leer or eliminados:
+                        self._parchar(tabla, por_leer, eliminados)
+
+                    # El manifiesto solo registra los archivos una vez que la tabla ya los incluye;
+                    # si la lectura falla se vuelven a intentar en la siguiente actualización
+                    self.manifiesto.update(entradas)
+                    for nombre in quitados:
+                        del self.manifiesto[nombre]
+                    cambios.nuevos[tabla] += nuevos
+                    cambios.modificados[tabla] += modificados
+                    cambios.eliminados[tabla] += eliminados
+            except Exception as e:
+                error = e
+
+            if cambios and self.persistente:
+                self._guardar_manifiesto()
+            if cambios or carga_inicial:
+                self.version += 1
+
+        if cambios:
+            for funcion in list(self._suscriptores):
+                funcion(cambios)
+        if error is not None:
+            raise error
+        return cambios
+
+    def _parchar(self, tabla, rutas, eliminados):
+        # Quitar las filas de los archivos cambiados y agregar las nuevas, sin releer el resto
+        quitar = set(eliminados) | {flota.clave_archivo(r) for r in rutas}
+        actual = self.tablas[tabla]
+        if len(actual):
+            actual = actual[~actual.index.isin(quitar)]
+        nuevos = self._leer(rutas)
+        df = pd.concat([actual, nuevos]) if len(nuevos) else actual
+        self.tablas[tabla] = esquema.tipar(df.sort_index(kind='stable'))
+
+    def tabla(self, tabla):
+        return self.tablas[tabla]
+
+
+_ingesta = None
+_lock_ingesta = threading.Lock()
+
+
+def ingesta_compartida():
+    # Una sola ingesta por proceso, compartida por todas las sesiones del dashboard
+    global _ingesta
+    with _lock_ingesta:
+        if _ingesta is None:
+            _ingesta = Ingesta()
+        return _ingesta
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Actualiza el manifiesto de ingesta y reporta los CSV nuevos, modificados o eliminados.")
+    parser.add_argument('--directorio', default=datos.DIRECTORIO_SALIDA, help="Carpeta con los historial_*.csv y pozo_*.csv")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    cambios = Ingesta(args.directorio).actualizar()
+    for tabla in flota.TABLAS:
+        print(f"{tabla}: {len(cambios.nuevos[tabla])} nuevos, {len(cambios.modificados[tabla])} modificados, "
+              f"{len(cambios.eliminados[tabla])} eliminados")
+    print(f"Ingesta en {time.perf_counter() - inicio:.2f} s")
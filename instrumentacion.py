@@ -0,0 +1,130 @@
+import cProfile
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# Tiempos por corrida del dashboard: tramos con nombre (carga, análisis, cada
+# gráfica...), un perfil opcional con cProfile y un log JSONL rotativo del que
+# salen los percentiles por etapa entre sesiones.
+DIRECTORIO_LOGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs')
+RUTA_LOG = os.environ.get('DASHBOARD_LOG_TIEMPOS') or os.path.join(DIRECTORIO_LOGS, 'tiempos.jsonl')
+
+# Tamaño máximo de cada archivo del log (en MB) y número de archivos rotados que se conservan
+LIMITE_LOG_MB = float(os.environ.get('DASHBOARD_LOG_MB', 5))
+ARCHIVOS_LOG = 3
+
+_logger = None
+_lock = threading.Lock()
+
+
+def _obtener_logger(ruta=RUTA_LOG):
+    global _logger
+    with _lock:
+        if _logger is None:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            manejador = logging.handlers.RotatingFileHandler(ruta, maxBytes=int(LIMITE_LOG_MB * 1024 * 1024),
+                                                             backupCount=ARCHIVOS_LOG, encoding='utf-8')
+            manejador.setFormatter(logging.Formatter('%(message)s'))
+            _logger = logging.getLogger('dashboard.tiempos')
+            _logger.setLevel(logging.INFO)
+            _logger.propagate = False
+            _logger.addHandler(manejador)
+        return _logger
+
+
+class Medicion:
+    # Tramos de una corrida del script; si perfilar es True, también corre cProfile
+
+    def __init__(self, perfilar=False):
+        self.tramos = []
+        self.inicio = time.perf_counter()
+        self.terminada = False
+        self.perfil = cProfile.Profile() if perfilar else None
+        if self.perfil is not None:
+            self.perfil.enable()
+
+    @contextmanager
+    def tramo(self, nombre):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.tramos.append((nombre, time.perf_counter() - inicio))
+
+    def total(self):
+        return time.perf_counter() - self.inicio
+
+    def terminar(self, **contexto):
+        # Detiene el perfil, escribe la corrida en el log y devuelve el registro
+        if self.perfil is not None:
+            self.perfil.disable()
+        self.terminada = True
+        registro = {'fecha': datetime.now().isoformat(timespec='seconds'), **contexto,
+                    'total': round(self.total(), 6),
+                    'tramos': {nombre: round(segundos, 6) for nombre, segundos in self.tramos}}
+        try:
+            _obtener_logger().info(json.dumps(registro, ensure_ascii=False))
+        except OSError:
+            pass
+        return registro
+
+    def reporte_perfil(self, lineas=40, orden='cumulative'):
+        if self.perfil is None:
+            return None
+        salida = io.StringIO()
+        pstats.Stats(self.perfil, stream=salida).sort_stats(orden).print_stats(lineas)
+        return salida.getvalue()
+
+
+def leer_log(ruta=RUTA_LOG):
+    # Registros del log actual y de los rotados (del más antiguo al más reciente)
+    registros = []
+    for i in range(ARCHIVOS_LOG, -1, -1):
+        archivo = f"{ruta}.{i}" if i else ruta
+        try:
+            with open(archivo, encoding='utf-8') as f:
+                for linea in f:
+                    try:
+                        registros.append(json.loads(linea))
+                    except ValueError:
+                        continue
+        except FileNotFoundError:
+            continue
+    return registros
+
+
+def percentiles(registros):
+    # p50/p95 por etapa (y del total de la corrida) a partir de los registros del log; las
+    # corridas de un solo fragmento tienen su propio total
+    valores = {'total': []}
+    for r in registros:
+        total = f"total ({r['fragmento']})" if r.get('fragmento') else 'total'
+        valores.setdefault(total, []).append(r.get('total', np.nan))
+        for nombre, segundos in r.get('tramos', {}).items():
+            valores.setdefault(nombre, []).append(segundos)
+
+    filas = []
+    for nombre, v in valores.items():
+        v = np.asarray(v, dtype=float)
+        v = v[~np.isnan(v)]
+        if len(v):
+            filas.append({'Etapa': nombre, 'Corridas': len(v),
+                          'p50 (ms)': np.percentile(v, 50) * 1000, 'p95 (ms)': np.percentile(v, 95) * 1000})
+    return pd.DataFrame(filas, columns=['Etapa', 'Corridas', 'p50 (ms)', 'p95 (ms)'])
+
+
+def es_admin(parametros):
+    # Acceso al panel: ?admin=<token> con DASHBOARD_ADMIN_TOKEN definido en el servidor
+    token = os.environ.get('DASHBOARD_ADMIN_TOKEN')
+    return bool(token) and parametros.get('admin') == token
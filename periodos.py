@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+
+import datos
+
+
+# Índice mensual (Año, Mes) del historial y agregación por trimestre o año para
+# que las gráficas sigan siendo ligeras con muchos años de recibos.
+FRECUENCIAS = {'M': 'Mensual', 'Q': 'Trimestral', 'Y': 'Anual'}
+
+_NUMERO_MES = {mes: n for n, mes in enumerate(datos.MESES, start=1)}
+
+COLUMNAS_SUMA = ['KWH', 'KVARH', 'Consumo base', 'Consumo inter', 'Consumo punta',
+                 'TOTAL KWh (suma b,i,p)'] + datos.COLUMNAS_ECONOMICAS
+COLUMNAS_MAXIMO = ['Demanda Base', 'Demanda intermedia', 'Demanda punta', 'Carga contratada (KW)']
+
+
+def indexar(df_historico, reporte=None):
+    # Índice PeriodIndex mensual a partir de Año y Mes, ordenado; descarta filas sin mes o año
+    # válidos y, con reporte (esquema.ReporteValidacion), las anota en él
+    mes = df_historico['Mes'].astype(str).str.strip().map(_NUMERO_MES)
+    anio = pd.to_numeric(df_historico['Año'], errors='coerce') if 'Año' in df_historico.columns else pd.Series(np.nan, index=df_historico.index)
+    validos = mes.notna() & anio.notna() & (anio > 0)
+    if reporte is not None and not validos.all():
+        invalidos = ~validos.to_numpy()
+        reporte.agregar('Mes', np.flatnonzero(invalidos) + 2,
+                        (df_historico['Mes'].astype(str) + ' ' + df_historico['Año'].astype(str)).to_numpy()[invalidos],
+                        'periodo_invalido')
+    df = df_historico[validos].copy()
+    df.index = pd.PeriodIndex.from_fields(year=anio[validos].astype(int).to_numpy(),
+                                          month=mes[validos].astype(int).to_numpy(), freq='M')
+    df.index.name = 'Periodo'
+    df = df.sort_index(kind='stable')
+    df['Etiqueta'] = etiquetas(df.index)
+    return df
+
+
+def codigo_periodo(df):
+    # Meses desde el año 0 (Año * 12 + mes - 1) para ordenar y comparar periodos con
+    # aritmética entera; NaN si el mes o el año no son válidos
+    mes = df['Mes'].astype(str).str.strip().map(_NUMERO_MES).to_numpy(dtype=float)
+    anio = pd.to_numeric(df['Año'], errors='coerce').to_numpy(dtype=float)
+    return np.where(anio > 0, anio * 12 + mes - 1, np.nan)
+
+
+def unir_repetidos(df, claves):
+    # Un recibo por clave (p. ej. archivo y código de periodo). Un mes repetido es un
+    # recibo complementario (RPU '…(1)') que repite lecturas, demandas y factores del
+    # principal y trae sus propios cargos: se suman los importes, del resto de las
+    # columnas numéricas se toma el máximo y el texto (Sitio, RPU) del primer renglón.
+    # claves: lista de arreglos alineados con las filas de df.
+    claves = pd.MultiIndex.from_arrays([np.asarray(c) for c in claves])
+    repetido = claves.duplicated(keep=False)
+    if not repetido.any():
+        return df
+    posiciones = np.flatnonzero(repetido)
+    grupos, _ = pd.factorize(claves[repetido])
+    primera = posiciones[np.unique(grupos, return_index=True)[1]]
+
+    numericas = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    suma = [c for c in numericas if c in datos.COLUMNAS_ECONOMICAS]
+    maximo = [c for c in numericas if c not in suma]
+    g = df.iloc[posiciones][numericas].groupby(grupos, sort=True)
+
+    conservar = ~repetido
+    conservar[primera] = True
+    filas = np.flatnonzero(conservar)
+    resultado = df.iloc[filas].copy()
+    unidas = np.searchsorted(filas, primera)
+    for columnas, valores in ((suma, g[suma].sum(min_count=1)), (maximo, g[maximo].max())):
+        for col in columnas:
+            resultado.iloc[unidas, resultado.columns.get_loc(col)] = valores[col].to_numpy()
+    return resultado
+
+
+def etiqueta_codigo(codigo):
+    return f"{datos.MESES[int(codigo) % 12]} {int(codigo) // 12}"
+
+
+def etiquetas(indice):
+    freq = indice.freqstr[0] if len(indice) else 'M'
+    if freq == 'Q':
+        return [f"T{p.quarter} {p.year}" for p in indice]
+    if freq == 'Y':
+        return [str(p.year) for p in indice]
+    return [f"{datos.MESES[p.month - 1]} {p.year}" for p in indice]
+
+
+def etiqueta(periodo):
+    return etiquetas(pd.PeriodIndex([periodo]))[0]
+
+
+def rango(df_historico, desde=None, hasta=None):
+    # Corte por rango de periodos (búsqueda binaria sobre el índice ordenado)
+    return df_historico.loc[desde:hasta]
+
+
+def frecuencia_automatica(n_meses, max_puntos=36):
+    if n_meses <= max_puntos:
+        return 'M'
+    if n_meses <= max_puntos * 3:
+        return 'Q'
+    return 'Y'
+
+
+def agregar(df_historico, frecuencia='M'):
+    # Agrega el historial mensual por trimestre ('Q') o año ('Y'): energía y costos
+    # se suman, demandas al máximo, FP ponderado por consumo y FC promedio
+    if frecuencia == 'M' or df_historico.empty:
+        return df_historico
+
+    grupos = df_historico.index.asfreq(frecuencia)
+    columnas_suma = [c for c in COLUMNAS_SUMA if c in df_historico.columns]
+    columnas_maximo = [c for c in COLUMNAS_MAXIMO if c in df_historico.columns]
+    g = df_historico.groupby(grupos, sort=True)
+
+    agregado = pd.concat([
+        g[columnas_suma].sum(),
+        g[columnas_maximo].max(),
+        g[['Sitio', 'RPU', 'Año']].first() if 'RPU' in df_historico.columns else g[['Sitio', 'Año']].first(),
+    ], axis=1)
+
+    kwh = df_historico['TOTAL KWh (suma b,i,p)']
+    ponderado = (df_historico['Factor de potencia'] * kwh).groupby(grupos, sort=True).sum()
+    peso = kwh.groupby(grupos, sort=True).sum()
+    promedio_fp = g['Factor de potencia'].mean()
+    agregado['Factor de potencia'] = (ponderado / peso.where(peso > 0)).fillna(promedio_fp)
+    agregado['Factor de carga'] = g['Factor de carga'].mean()
+
+    agregado.index.name = 'Periodo'
+    agregado['Mes'] = etiquetas(agregado.index)
+    agregado['Etiqueta'] = agregado['Mes']
+    return agregado
@@ -0,0 +1,141 @@
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import catalogo
+import datos
+import ingesta
+import periodos
+
+
+# Pronóstico del mes siguiente de consumo y costo para todos los sitios a la vez.
+# Cada sitio se ajusta con mínimos cuadrados sobre su historial (nivel + tendencia
+# lineal y, con dos años o más de datos, un término estacional de 12 meses); las
+# ecuaciones normales de todos los sitios se apilan y se resuelven en un solo
+# paso con NumPy. Los resultados se guardan por versión de los datos.
+SERIES = {
+    'KWh': 'TOTAL KWh (suma b,i,p)',
+    'Recibo': 'TOTAL RECIBO',
+}
+
+# Meses mínimos para usar tendencia y para agregar el término estacional
+MIN_TENDENCIA = 3
+MIN_ESTACIONAL = 24
+
+# Ancho de la banda: ±Z desviaciones estándar del error de predicción (≈ 90%)
+Z_BANDA = 1.645
+
+MODELOS = {1: 'promedio', 2: 'tendencia', 4: 'estacional'}
+
+
+def _diseno(codigos, referencia):
+    # Columnas: nivel, meses respecto al periodo de referencia, seno y coseno del mes del año
+    angulo = 2 * np.pi * (codigos % 12) / 12
+    return np.stack([np.ones_like(codigos), codigos - referencia, np.sin(angulo), np.cos(angulo)], axis=-1)
+
+
+def _ajustar(X, Y, pesos, x0, n_parametros):
+    # Mínimos cuadrados ponderados apilados: X (sitios, meses, p), Y y pesos (sitios, meses).
+    # Devuelve la predicción en x0 (sitios, p) y la varianza de su error.
+    X, x0 = X[..., :n_parametros], x0[:, :n_parametros]
+    Xw = X * pesos[..., None]
+    XtX = np.einsum('smp,smq->spq', Xw, X)
+    Xty = np.einsum('smp,sm->sp', Xw, np.nan_to_num(Y))
+    inversa = np.linalg.pinv(XtX)
+    beta = np.einsum('spq,sq->sp', inversa, Xty)
+    prediccion = np.einsum('sp,sp->s', x0, beta)
+
+    residuos = np.where(pesos > 0, np.nan_to_num(Y) - np.einsum('smp,sp->sm', X, beta), 0)
+    libres = pesos.sum(axis=1) - n_parametros
+    with np.errstate(divide='ignore', invalid='ignore'):
+        varianza = np.where(libres > 0, (residuos ** 2).sum(axis=1) / libres, np.nan)
+    apalancamiento = np.einsum('sp,spq,sq->s', x0, inversa, x0)
+    return prediccion, varianza * (1 + apalancamiento)
+
+
+def pronosticar(df_historial):
+    # Una fila por sitio con el pronóstico del mes siguiente a su último periodo y la
+    # banda inferior/superior de cada serie. df_historial puede traer toda la flota.
+    if 'archivo' in (df_historial.index.names or []):
+        claves = df_historial.index.get_level_values('archivo').astype(str).to_numpy()
+    else:
+        claves = np.array([datos.nombre_archivo(str(s)) for s in df_historial['Sitio'].astype(str)])
+    codigo = periodos.codigo_periodo(df_historial)
+    validos = ~np.isnan(codigo)
+    df, claves, codigo = df_historial[validos], claves[validos], codigo[validos]
+
+    codigos_sitio, sitios = pd.factorize(claves, sort=True)
+    orden = np.lexsort((codigo, codigos_sitio))
+    codigos_sitio, codigo, df = codigos_sitio[orden], codigo[orden], df.iloc[orden]
+    n = np.bincount(codigos_sitio, minlength=len(sitios))
+    inicio = np.concatenate([[0], np.cumsum(n)[:-1]])
+    posiciones = np.arange(len(df)) - inicio[codigos_sitio]
+    n_sitios, n_meses = len(sitios), int(n.max()) if len(n) else 0
+
+    # Matrices (sitios, meses) rellenas con NaN; el peso 0 marca los huecos
+    matriz_codigos = np.full((n_sitios, n_meses), np.nan)
+    matriz_codigos[codigos_sitio, posiciones] = codigo
+    pesos = (~np.isnan(matriz_codigos)).astype(float)
+    ultimo = codigo[inicio + n - 1] if n_sitios else np.array([])
+    siguiente = ultimo + 1
+    X = _diseno(np.nan_to_num(matriz_codigos), ultimo[:, None])
+    x0 = _diseno(siguiente, ultimo)
+
+    # Modelo por sitio según los meses disponibles
+    parametros = np.where(n >= MIN_ESTACIONAL, 4, np.where(n >= MIN_TENDENCIA, 2, 1))
+
+    resultado = {
+        'archivo': np.asarray(sitios),
+        'Sitio': df['Sitio'].astype(str).to_numpy()[inicio] if n_sitios else np.array([], dtype=object),
+        'meses': n,
+        'modelo': [MODELOS[p] for p in parametros],
+        'codigo_periodo': siguiente.astype(np.int64),
+    }
+    for nombre, columna in SERIES.items():
+        Y = np.full((n_sitios, n_meses), np.nan)
+        if columna in df.columns:
+            Y[codigos_sitio, posiciones] = df[columna].to_numpy(dtype=float)
+        prediccion = np.full(n_sitios, np.nan)
+        varianza = np.full(n_sitios, np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            for p in MODELOS:
+                grupo = parametros == p
+                if grupo.any():
+                    prediccion[grupo], varianza[grupo] = _ajustar(X[grupo], Y[grupo], pesos[grupo], x0[grupo], p)
+        # Consumo y costo no pueden ser negativos
+        prediccion = np.maximum(prediccion, 0)
+        margen = Z_BANDA * np.sqrt(varianza)
+        resultado[f"ultimo_{nombre}"] = Y[np.arange(n_sitios), n - 1] if n_sitios else np.array([])
+        resultado[f"pronostico_{nombre}"] = prediccion
+        resultado[f"inferior_{nombre}"] = np.maximum(prediccion - margen, 0)
+        resultado[f"superior_{nombre}"] = prediccion + margen
+    return pd.DataFrame(resultado)
+
+
+_pronosticos = (None, None)
+_lock = threading.Lock()
+
+
+def pronosticos_compartidos():
+    # Pronósticos de la flota, recalculados solo cuando la ingesta trae cambios
+    global _pronosticos
+
+    historial = datos.cargar_flota('historial')
+    version = ingesta.ingesta_compartida().version
+    with _lock:
+        if _pronosticos[0] == version:
+            return _pronosticos[1]
+    tabla = pronosticar(historial)
+    with _lock:
+        _pronosticos = (version, tabla)
+    return tabla
+
+
+def pronostico_sitio(sitio):
+    # Fila del sitio en la tabla de la flota, o None si no tiene historial
+    tabla = pronosticos_compartidos()
+    filas = tabla[tabla['archivo'] == catalogo.archivo_de(sitio)]
+    return filas.iloc[0] if len(filas) else None
@@ -0,0 +1,93 @@
+import threading
+
+import numpy as np
+
+import analisis
+import datos
+import ingesta
+
+
+# Ranking de sitios de la flota (los k peores y los k mejores) por costo por kWh,
+# factor de potencia bajo 90%, crecimiento mensual del consumo y participación
+# de punta. Los indicadores se calculan una vez por versión de los datos; cambiar
+# k o la métrica solo hace una selección parcial con argpartition.
+
+# clave -> (etiqueta, columna, True si un valor mayor es peor)
+METRICAS = {
+    'costo_kwh': ("Costo por kWh", 'Costo por kWh ($)', True),
+    'fp_bajo_90': ("Factor de potencia < 90%", 'Factor de Potencia (%)', False),
+    'crecimiento_kwh': ("Crecimiento mensual del consumo", 'Crecimiento KWh (%)', True),
+    'participacion_punta': ("Participación de punta", 'Consumo en Punta (%)', True),
+}
+
+
+def indicadores_flota(df_historico, df_actual):
+    # Una fila por sitio con los indicadores de todas las métricas
+    resumen = analisis.resumen_flota(df_actual)
+    actual = df_actual.drop_duplicates('Sitio', keep='first')
+    consumo = resumen['Consumo Total (KWh)'].to_numpy(dtype=float)
+    punta = actual['Consumo punta'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        participacion_punta = np.where(consumo > 0, punta / consumo * 100, np.nan)
+
+    # Crecimiento del último mes con datos respecto al anterior, por sitio
+    m = analisis.metricas_historial(df_historico).reindex(resumen['Sitio'].astype(str).to_numpy())
+    periodo = np.where(m['meses'].fillna(0).to_numpy() > 1, m['mes_anterior'].astype(str) + ' → ' + m['mes_final'].astype(str), '')
+
+    return resumen.assign(**{
+        'Consumo en Punta (%)': participacion_punta,
+        'Crecimiento KWh (%)': m['crecimiento_mensual'].to_numpy(dtype=float),
+        'Periodo': periodo,
+    })
+
+
+def seleccionar(valores, k, mayores=True):
+    # Índices de los k valores mayores (o menores), ordenados, sin ordenar todo el
+    # arreglo: argpartition es O(n) y solo se ordenan los k elegidos. Ignora NaN.
+    validos = np.flatnonzero(~np.isnan(valores))
+    k = min(k, len(validos))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    v = valores[validos] if not mayores else -valores[validos]
+    if k < len(v):
+        elegidos = np.argpartition(v, k - 1)[:k]
+    else:
+        elegidos = np.arange(len(v))
+    elegidos = elegidos[np.argsort(v[elegidos], kind='stable')]
+    return validos[elegidos]
+
+
+def ranking(indicadores, metrica, k):
+    # (peores, mejores) según la métrica. Para el factor de potencia, los peores son
+    # solo los sitios bajo 90% (los expuestos a recargo).
+    _, columna, mayor_es_peor = METRICAS[metrica]
+    valores = indicadores[columna].to_numpy(dtype=float)
+    if metrica == 'fp_bajo_90':
+        # FP en 0 significa recibo sin lectura de reactivos, no un factor de potencia real
+        valores = np.where(valores > 0, valores, np.nan)
+        candidatos = np.where(valores < 90, valores, np.nan)
+        peores = seleccionar(candidatos, k, mayores=False)
+    else:
+        peores = seleccionar(valores, k, mayores=mayor_es_peor)
+    mejores = seleccionar(valores, k, mayores=not mayor_es_peor)
+    return indicadores.iloc[peores], indicadores.iloc[mejores]
+
+
+_indicadores = (None, None)
+_lock = threading.Lock()
+
+
+def indicadores_compartidos():
+    # Indicadores de la flota, recalculados solo cuando la ingesta trae cambios
+    global _indicadores
+
+    historial = datos.cargar_flota('historial')
+    actual = datos.cargar_flota('pozo')
+    version = ingesta.ingesta_compartida().version
+    with _lock:
+        if _indicadores[0] == version:
+            return _indicadores[1]
+    indicadores = indicadores_flota(historial, actual)
+    with _lock:
+        _indicadores = (version, indicadores)
+    return indicadores
@@ -0,0 +1,183 @@
+import argparse
+import html
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import plotly
+import plotly.offline
+
+import analisis
+import catalogo
+import datos
+import estilos
+import graficas
+import periodos
+
+
+# Generación de reportes HTML por sitio sin levantar Streamlit. Reutiliza el
+# motor de análisis y las mismas gráficas del dashboard, y reparte los sitios
+# entre varios procesos.
+DIRECTORIO_REPORTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reportes')
+
+MODOS_PLOTLYJS = ('inline', 'cdn', 'directorio')
+
+_plotlyjs = None
+
+
+def _script_plotly(modo):
+    # inline: reporte autocontenido; cdn: referencia en línea; directorio: un solo plotly.min.js junto a los reportes
+    global _plotlyjs
+    if modo == 'inline':
+        if _plotlyjs is None:
+            _plotlyjs = plotly.offline.get_plotlyjs()
+        return f"<script type='text/javascript'>{_plotlyjs}</script>"
+    if modo == 'cdn':
+        return f"<script src='https://cdn.plot.ly/plotly-{plotly.__version__}.min.js'></script>"
+    return "<script src='plotly.min.js'></script>"
+
+
+def _tarjeta(titulo, valor):
+    return f"""
+    <div class="metric-card">
+        <div class="metric-title">{titulo}</div>
+        <div class="metric-value">{valor}</div>
+    </div>
+    """
+
+
+def _seccion(titulo, *contenido):
+    return f"<h3 style='color: #2E86C1;'>{html.escape(titulo)}</h3>\n" + "\n".join(c for c in contenido if c)
+
+
+def _analisis(contenido):
+    return f"<div class=\"analysis-box\">{contenido}</div>"
+
+
+def _figura(fig):
+    return fig.to_html(full_html=False, include_plotlyjs=False) if fig is not None else ""
+
+
+def html_reporte(sitio, df_historico, pozo_actual, modo_plotlyjs='inline'):
+    actual = pozo_actual.iloc[0]
+    consumo_base = float(actual['Consumo base'])
+    consumo_inter = float(actual['Consumo inter'])
+    consumo_punta = float(actual['Consumo punta'])
+    consumo_total = consumo_base + consumo_inter + consumo_punta
+    factor_potencia = float(actual['Factor de potencia'])
+    factor_carga = float(actual['Factor de carga'])
+
+    economicos = {col: float(actual[col]) if col in pozo_actual.columns else 0.0 for col in datos.COLUMNAS_ECONOMICAS}
+    subtotal = economicos['SUBTOTAL']
+    total_recibo = (subtotal + economicos['IVA 8%'] + economicos['DAP'] +
+                    economicos['Cargos y depósitos'] + economicos['Créditos y redondeos'])
+    costo_kwh = total_recibo / consumo_total if consumo_total > 0 else None
+
+    resultado = analisis.analizar_sitio(df_historico, consumo_total, factor_potencia, factor_carga)
+
+    secciones = [
+        "<div style='display: grid; grid-template-columns: repeat(3, 1fr); gap: 15px;'>"
+        + _tarjeta("Consumo Total", f"{consumo_total:,.0f} KWh")
+        + _tarjeta("Factor de Potencia", f"{factor_potencia:.2f}%")
+        + _tarjeta("Factor de Carga", f"{factor_carga:.2f}%")
+        + _tarjeta("Costo Total", f"${total_recibo:,.2f}")
+        + _tarjeta("Subtotal", f"${subtotal:,.2f}")
+        + _tarjeta("Costo por kWh", f"${costo_kwh:.4f}" if costo_kwh is not None else "N/D")
+        + "</div>",
+        _analisis(analisis.formatear_consumo(resultado)),
+        _seccion("Distribución del Consumo",
+                 _figura(graficas.figura_consumo(consumo_base, consumo_inter, consumo_punta)),
+                 _analisis(analisis.analizar_distribucion_consumo(consumo_base, consumo_inter, consumo_punta))),
+        _seccion("Distribución de la Demanda",
+                 _figura(graficas.figura_demanda(float(actual['Demanda Base']), float(actual['Demanda intermedia']),
+                                                 float(actual['Demanda punta'])))),
+        _analisis(analisis.formatear_factor_potencia(resultado)),
+        _analisis(analisis.formatear_factor_carga(resultado)),
+    ]
+
+    if len(df_historico) > 1:
+        # Series largas se agrupan por trimestre o año para no inflar el reporte
+        df_grafica = periodos.agregar(df_historico, periodos.frecuencia_automatica(len(df_historico)))
+        secciones += [
+            _seccion("Evolución del Consumo Total", _figura(graficas.figura_evolucion(df_grafica))),
+            _analisis(analisis.formatear_tendencias(resultado)),
+            _seccion("Evolución del Factor de Potencia", _figura(graficas.figura_fp(df_grafica))),
+            _seccion("Evolución del Factor de Carga", _figura(graficas.figura_fc(df_grafica))),
+            _seccion("Distribución del Consumo por Tipo (Histórico)", _figura(graficas.figura_heatmap(df_grafica))),
+        ]
+
+    secciones.append(_seccion("Desglose de Costos", _figura(graficas.figura_desglose(
+        subtotal, economicos['IVA 8%'], economicos['DAP'],
+        economicos['Cargos y depósitos'], economicos['Créditos y redondeos']))))
+
+    titulo = html.escape(f"Reporte de Eficiencia Energética - {sitio}")
+    return f"""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>{titulo}</title>
+{estilos.CSS_DASHBOARD}
+<style>body {{ font-family: Arial, sans-serif; max-width: 1100px; margin: 0 auto; padding: 20px; }}</style>
+{_script_plotly(modo_plotlyjs)}
+</head>
+<body>
+<div class="title">{titulo}</div>
+<div class="subtitle">Generado el {datetime.now():%Y-%m-%d %H:%M}</div>
+{chr(10).join(secciones)}
+</body>
+</html>
+"""
+
+
+def generar_reporte(sitio, destino, modo_plotlyjs='inline'):
+    inicio = time.perf_counter()
+    df_historico, pozo_actual = datos.cargar_sitio(sitio)
+    contenido = html_reporte(sitio, df_historico, pozo_actual, modo_plotlyjs)
+    ruta = os.path.join(destino, f"reporte_{datos.nombre_archivo(sitio)}.html")
+    with open(ruta, 'w', encoding='utf-8') as f:
+        f.write(contenido)
+    return ruta, time.perf_counter() - inicio
+
+
+def generar_reportes(sitios, destino=DIRECTORIO_REPORTES, procesos=None, modo_plotlyjs='inline'):
+    os.makedirs(destino, exist_ok=True)
+    if modo_plotlyjs == 'directorio':
+        with open(os.path.join(destino, 'plotly.min.js'), 'w', encoding='utf-8') as f:
+            f.write(plotly.offline.get_plotlyjs())
+
+    inicio = time.perf_counter()
+    generados, omitidos, errores = [], [], []
+    ancho = len(str(len(sitios)))
+    with ProcessPoolExecutor(max_workers=procesos) as ejecutor:
+        futuros = {ejecutor.submit(generar_reporte, sitio, destino, modo_plotlyjs): sitio for sitio in sitios}
+        for n, futuro in enumerate(as_completed(futuros), start=1):
+            sitio = futuros[futuro]
+            try:
+                ruta, segundos = futuro.result()
+                generados.append(ruta)
+                print(f"[{n:>{ancho}}/{len(sitios)}] {sitio}: {os.path.basename(ruta)} ({segundos:.2f} s)", flush=True)
+            except FileNotFoundError:
+                omitidos.append(sitio)
+                print(f"[{n:>{ancho}}/{len(sitios)}] {sitio}: sin datos en output/, se omite", flush=True)
+            except Exception as e:
+                errores.append((sitio, e))
+                print(f"[{n:>{ancho}}/{len(sitios)}] {sitio}: ERROR {e}", flush=True)
+
+    total = time.perf_counter() - inicio
+    print(f"{len(generados)} reportes en {total:.1f} s ({len(omitidos)} omitidos, {len(errores)} con error) -> {destino}")
+    return generados, omitidos, errores
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera un reporte HTML de eficiencia energética por sitio.")
+    parser.add_argument('sitios', nargs='*', help="Sitios a reportar (por defecto todos los sitios del catálogo con datos)")
+    parser.add_argument('--destino', default=DIRECTORIO_REPORTES, help="Carpeta donde se escriben los reportes")
+    parser.add_argument('--procesos', type=int, default=None, help="Número de procesos (por defecto, uno por núcleo)")
+    parser.add_argument('--plotlyjs', choices=MODOS_PLOTLYJS, default='inline',
+                        help="inline: reportes autocontenidos; cdn: plotly.js desde CDN; directorio: un plotly.min.js compartido")
+    args = parser.parse_args()
+
+    _, _, errores = generar_reportes(args.sitios or catalogo.obtener_catalogo().sitios(), args.destino, args.procesos, args.plotlyjs)
+    sys.exit(1 if errores else 0)
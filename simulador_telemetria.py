@@ -0,0 +1,157 @@
+import argparse
+import csv
+import io
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import telemetria
+
+
+# Servidor local que imita la telemetría de los pozos para pruebas: /sitios (lista
+# JSON), /sitio/<nombre> (última lectura en JSON) y /datos_pozos.csv (todas las
+# lecturas, el archivo que consulta statics/tanque.js). Los valores siguen una
+# caminata aleatoria por sitio; se puede agregar latencia y una tasa de errores,
+# mandar los cuerpos por partes (Transfer-Encoding: chunked) y hacer que algunos
+# sitios respondan mal (DEFECTOS) para probar el cliente.
+
+# (valor inicial, paso máximo, mínimo, máximo) de cada campo
+RANGOS = {
+    'Gasto_Instantaneo': (3.0, 0.2, 0.0, 6.0),
+    'Presion_Instantanea': (1.5, 0.1, 0.0, 3.0),
+    'Nivel_1': (2.5, 0.1, 0.0, 5.0),
+}
+
+# Respuestas defectuosas por sitio: 'lento' tarda RETRASO_LENTO segundos, 'estado' manda
+# una línea de estado sin código y 'vacio' cierra la conexión sin responder
+DEFECTOS = ('lento', 'estado', 'vacio')
+RETRASO_LENTO = 5.0
+
+# Tamaño de cada parte de un cuerpo con Transfer-Encoding: chunked
+TAMANO_PARTE = 16
+
+
+class EstadoSimulado:
+    # Lecturas actuales de cada sitio; cada consulta avanza la caminata aleatoria
+
+    def __init__(self, sitios, semilla=0):
+        self.sitios = list(sitios)
+        self._aleatorio = random.Random(semilla)
+        self._valores = {s: {c: r[0] * self._aleatorio.uniform(0.7, 1.3) for c, r in RANGOS.items()} for s in self.sitios}
+        self._lock = threading.Lock()
+
+    def lectura(self, sitio):
+        with self._lock:
+            valores = self._valores[sitio]
+            for campo, (_, paso, minimo, maximo) in RANGOS.items():
+                valores[campo] = min(max(valores[campo] + self._aleatorio.uniform(-paso, paso), minimo), maximo)
+            return {'nombre_sitio': sitio, **{c: round(v, 3) for c, v in valores.items()},
+                    'fecha': datetime.now().isoformat(timespec='seconds')}
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _responder(self, estado, cuerpo, tipo='application/json'):
+        datos = cuerpo.encode('utf-8')
+        self.send_response(estado)
+        self.send_header('Content-Type', f"{tipo}; charset=utf-8")
+        if not self.server.chunked:
+            self.send_header('Content-Length', str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+            return
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for i in range(0, len(datos), TAMANO_PARTE):
+            parte = datos[i:i + TAMANO_PARTE]
+            self.wfile.write(f"{len(parte):x}\r\n".encode('ascii') + parte + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _defectuosa(self, defecto):
+        if defecto == 'lento':
+            time.sleep(RETRASO_LENTO)
+            return False
+        self.close_connection = True
+        if defecto == 'estado':
+            self.wfile.write(b'HTTP/1.1\r\nContent-Length: 2\r\n\r\n{}')
+        return True
+
+    def do_GET(self):
+        servidor = self.server
+        if servidor.latencia:
+            time.sleep(servidor.latencia)
+        if servidor.tasa_error and random.random() < servidor.tasa_error:
+            return self._responder(503, json.dumps({'error': 'no disponible'}))
+
+        ruta = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        estado = servidor.estado
+        if ruta == telemetria.RUTA_SITIOS:
+            return self._responder(200, json.dumps(estado.sitios, ensure_ascii=False))
+        if ruta.startswith('/sitio/'):
+            sitio = ruta[len('/sitio/'):]
+            if sitio not in estado._valores:
+                return self._responder(404, json.dumps({'error': f"sitio {sitio} no encontrado"}))
+            if sitio in servidor.defectos and self._defectuosa(servidor.defectos[sitio]):
+                return
+            return self._responder(200, json.dumps(estado.lectura(sitio), ensure_ascii=False))
+        if ruta == '/datos_pozos.csv':
+            salida = io.StringIO()
+            escritor = csv.DictWriter(salida, ['nombre_sitio'] + telemetria.CAMPOS + ['fecha'], lineterminator='\n')
+            escritor.writeheader()
+            escritor.writerows(estado.lectura(s) for s in estado.sitios)
+            return self._responder(200, salida.getvalue(), 'text/csv')
+        return self._responder(404, json.dumps({'error': 'ruta no encontrada'}))
+
+    def log_message(self, formato, *args):
+        pass
+
+
+def crear_servidor(sitios, puerto=0, latencia=0.0, tasa_error=0.0, host='127.0.0.1', semilla=0,
+                   chunked=False, defectos=None):
+    # defectos: {sitio: uno de DEFECTOS}
+    servidor = ThreadingHTTPServer((host, puerto), _Manejador)
+    servidor.daemon_threads = True
+    servidor.estado = EstadoSimulado(sitios, semilla)
+    servidor.latencia = latencia
+    servidor.tasa_error = tasa_error
+    servidor.chunked = chunked
+    servidor.defectos = dict(defectos or {})
+    return servidor
+
+
+def iniciar_en_hilo(sitios, puerto=0, latencia=0.0, tasa_error=0.0, chunked=False, defectos=None):
+    # Servidor en un hilo de fondo (puerto 0 = uno libre); regresa (servidor, url)
+    servidor = crear_servidor(sitios, puerto, latencia, tasa_error, chunked=chunked, defectos=defectos)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    host, puerto = servidor.server_address[:2]
+    return servidor, f"http://{host}:{puerto}"
+
+
+def sitios_catalogo():
+    import catalogo
+
+    return catalogo.obtener_catalogo().sitios()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Servidor local de telemetría simulada para pruebas.")
+    parser.add_argument('--puerto', type=int, default=8765)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--sitios', type=int, default=None, help="Número de sitios sintéticos (por defecto, los del catálogo)")
+    parser.add_argument('--latencia', type=float, default=0.0, help="Segundos de espera por petición")
+    parser.add_argument('--tasa-error', type=float, default=0.0, help="Fracción de peticiones que responden 503")
+    parser.add_argument('--chunked', action='store_true', help="Mandar los cuerpos con Transfer-Encoding: chunked")
+    args = parser.parse_args()
+
+    sitios = [f"p{i}" for i in range(1, args.sitios + 1)] if args.sitios else sitios_catalogo()
+    servidor = crear_servidor(sitios, args.puerto, args.latencia, args.tasa_error, args.host, chunked=args.chunked)
+    print(f"Telemetría simulada de {len(sitios)} sitios en http://{args.host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,84 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import datos
+
+
+# Generador de una flota sintética con el mismo esquema de 22 columnas que los
+# historial_*.csv y pozo_*.csv reales, para medir el dashboard con más sitios y
+# más meses de los que hay hoy en output/.
+COLUMNAS = ['RPU', 'Sitio', 'Mes', 'Año', 'SUBTOTAL', 'IVA 8%', 'DAP', 'Cargos y depósitos',
+            'Créditos y redondeos', 'TOTAL RECIBO', 'KWH', 'KVARH', 'Consumo base', 'Consumo inter',
+            'Consumo punta', 'TOTAL KWh (suma b,i,p)', 'Demanda Base', 'Demanda intermedia',
+            'Demanda punta', 'Factor de potencia', 'Factor de carga', 'Carga contratada (KW)']
+
+
+def nombre_sitio(i):
+    return f"SINT-{i:04d}"
+
+
+def generar_flota(destino, sitios=100, meses=24, anio_final=2025, semilla=0):
+    # Escribe historial_<sitio>.csv (meses recibos) y pozo_<sitio>.csv (el último recibo) por sitio
+    rng = np.random.default_rng(semilla)
+    os.makedirs(destino, exist_ok=True)
+
+    # Periodos: los últimos `meses` meses que terminan en diciembre de anio_final
+    periodos = pd.period_range(end=pd.Period(f"{anio_final}-12", freq='M'), periods=meses, freq='M')
+    nombres_mes = np.array([datos.MESES[p.month - 1] for p in periodos])
+    anios = np.array([p.year for p in periodos])
+
+    # Parámetros por sitio y variación mes a mes (sitios en filas, meses en columnas)
+    consumo_medio = rng.lognormal(mean=10.3, sigma=0.8, size=(sitios, 1))
+    estacional = 1 + 0.15 * np.sin(2 * np.pi * (periodos.month.to_numpy() - 4) / 12)
+    kwh = np.round(consumo_medio * estacional * rng.normal(1, 0.08, size=(sitios, meses)).clip(0.5))
+
+    reparto = rng.dirichlet([3, 5, 1], size=(sitios, meses))
+    base = np.round(kwh * reparto[..., 0])
+    punta = np.round(kwh * reparto[..., 2])
+    inter = kwh - base - punta
+
+    fp = np.round(np.clip(rng.normal(rng.uniform(84, 98, size=(sitios, 1)), 1.5, size=(sitios, meses)), 60, 100), 2)
+    kvarh = np.round(kwh * np.tan(np.arccos(fp / 100)))
+    carga = np.round(rng.uniform(30, 400, size=(sitios, 1)))
+    demanda = np.round(carga * rng.uniform(0.6, 0.95, size=(sitios, meses)))
+    fc = np.round(np.clip(kwh / (np.maximum(demanda, 1) * 730) * 100, 0, 100), 2)
+
+    subtotal = np.round(kwh * rng.uniform(2.0, 2.6, size=(sitios, 1)), 2)
+    iva = np.round(subtotal * 0.08, 4)
+    dap = np.round(rng.choice([0.0, 1150.0], size=(sitios, 1)) * np.ones((1, meses)), 2)
+    creditos = np.round(rng.uniform(-0.5, 0.5, size=(sitios, meses)), 4)
+    total = np.round(subtotal + iva + dap + creditos)
+
+    rpus = rng.integers(10 ** 11, 10 ** 12, size=sitios)
+    for i in range(sitios):
+        sitio = nombre_sitio(i + 1)
+        df = pd.DataFrame({
+            'RPU': str(rpus[i]), 'Sitio': sitio, 'Mes': nombres_mes, 'Año': anios,
+            'SUBTOTAL': subtotal[i], 'IVA 8%': iva[i], 'DAP': dap[i], 'Cargos y depósitos': 0.0,
+            'Créditos y redondeos': creditos[i], 'TOTAL RECIBO': total[i], 'KWH': kwh[i], 'KVARH': kvarh[i],
+            'Consumo base': base[i], 'Consumo inter': inter[i], 'Consumo punta': punta[i],
+            'TOTAL KWh (suma b,i,p)': kwh[i], 'Demanda Base': demanda[i], 'Demanda intermedia': demanda[i],
+            'Demanda punta': demanda[i], 'Factor de potencia': fp[i], 'Factor de carga': fc[i],
+            'Carga contratada (KW)': carga[i, 0],
+        }, columns=COLUMNAS)
+        df.to_csv(datos.ruta_historial(sitio, destino), index=False)
+        df.iloc[[-1]].to_csv(datos.ruta_actual(sitio, destino), index=False)
+
+    return [nombre_sitio(i + 1) for i in range(sitios)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera una flota sintética de historial_*.csv y pozo_*.csv.")
+    parser.add_argument('destino', help="Carpeta donde se escriben los CSV")
+    parser.add_argument('--sitios', type=int, default=100)
+    parser.add_argument('--meses', type=int, default=24)
+    parser.add_argument('--semilla', type=int, default=0)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    generar_flota(args.destino, args.sitios, args.meses, semilla=args.semilla)
+    print(f"{args.sitios} sitios × {args.meses} meses en {time.perf_counter() - inicio:.1f} s -> {args.destino}")
@@ -0,0 +1,136 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import catalogo
+import datos
+import ingesta
+
+
+# Simulador de la tarifa GDMTH (horaria en media tensión): costo del mes con los
+# consumos y demandas del recibo y con escenarios en los que una fracción del
+# consumo de punta se mueve a horario base. Todos los sitios y todos los
+# escenarios se calculan juntos como arreglos (sitios, escenarios).
+
+# Cuotas de referencia ($/kWh, $/kW, $/mes); se pueden cambiar desde el dashboard
+TARIFA_GDMTH = {
+    'energia_base': 1.15,
+    'energia_intermedia': 1.95,
+    'energia_punta': 2.35,
+    'capacidad': 380.0,      # sobre la demanda en punta
+    'distribucion': 110.0,   # sobre la demanda máxima del mes
+    'cargo_fijo': 550.0,
+}
+
+# Fracciones de la energía de punta movidas a base que se evalúan (0%, 5%, ..., 100%)
+FRACCIONES = tuple(np.round(np.linspace(0, 1, 21), 2))
+
+# Factor de potencia: recargo bajo 90% (hasta 120%) y bonificación desde 90% (hasta 2.5%)
+FP_REFERENCIA = 90.0
+RECARGO_MAXIMO = 1.2
+BONIFICACION_MAXIMA = 0.025
+
+LIMITE_CACHE_SIMULACIONES = 64
+
+
+def ajuste_factor_potencia(fp):
+    # Fracción que se suma (recargo, positiva) o resta (bonificación, negativa) al
+    # cargo de energía y demanda. FP en 0 = recibo sin lectura de reactivos: sin ajuste.
+    fp = np.asarray(fp, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        recargo = np.minimum(3 / 5 * (FP_REFERENCIA / fp - 1), RECARGO_MAXIMO)
+        bonificacion = np.minimum(1 / 4 * (1 - FP_REFERENCIA / fp), BONIFICACION_MAXIMA)
+    return np.where(fp <= 0, 0.0, np.where(fp < FP_REFERENCIA, recargo, -bonificacion))
+
+
+def simular(consumos, demandas, fp, tarifa=None, fracciones=FRACCIONES):
+    # consumos y demandas: (sitios, 3) en el orden base, intermedia, punta; fp: (sitios,).
+    # Regresa un dict de arreglos (sitios, escenarios) con cada componente del costo.
+    tarifa = {**TARIFA_GDMTH, **(tarifa or {})}
+    consumos = np.asarray(consumos, dtype=float)
+    demandas = np.asarray(demandas, dtype=float)
+    f = np.asarray(fracciones, dtype=float)[None, :]
+
+    base, inter, punta = (consumos[:, i, None] for i in range(3))
+    movido = punta * f
+    energia = (tarifa['energia_base'] * (base + movido) + tarifa['energia_intermedia'] * inter
+               + tarifa['energia_punta'] * (punta - movido))
+
+    # La demanda de punta baja en la misma proporción; la carga movida se supone con la
+    # misma potencia, así que la demanda en base queda en la mayor de las dos
+    d_base, d_inter, d_punta = (demandas[:, i, None] for i in range(3))
+    demanda_punta = d_punta * (1 - f)
+    demanda_base = np.where(f > 0, np.maximum(d_base, d_punta), d_base)
+    demanda_maxima = np.maximum(np.maximum(demanda_base, d_inter), demanda_punta)
+    capacidad = tarifa['capacidad'] * demanda_punta
+    distribucion = tarifa['distribucion'] * demanda_maxima
+
+    cargos = energia + capacidad + distribucion
+    ajuste_fp = cargos * ajuste_factor_potencia(fp)[:, None]
+    total = cargos + ajuste_fp + tarifa['cargo_fijo']
+    return {
+        'energia': energia,
+        'capacidad': capacidad,
+        'distribucion': distribucion,
+        'ajuste_fp': ajuste_fp,
+        'total': total,
+        'ahorro': total[:, :1] - total,
+    }
+
+
+def _arreglos(df_actual):
+    # Primera fila de cada sitio del DataFrame del mes actual
+    actual = df_actual[~df_actual.index.duplicated(keep='first')] if df_actual.index.name == 'archivo' else df_actual
+    consumos = actual[['Consumo base', 'Consumo inter', 'Consumo punta']].to_numpy(dtype=float)
+    demandas = actual[['Demanda Base', 'Demanda intermedia', 'Demanda punta']].to_numpy(dtype=float)
+    return actual, consumos, demandas, actual['Factor de potencia'].to_numpy(dtype=float)
+
+
+class SimuladorFlota:
+    # Resultados de la flota memorizados por (versión de los datos, tarifa, fracciones):
+    # mover un slider de escenario o volver a una tarifa ya usada no recalcula nada
+
+    def __init__(self, limite=LIMITE_CACHE_SIMULACIONES):
+        self.limite = limite
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def simular(self, tarifa=None, fracciones=FRACCIONES):
+        actual = datos.cargar_flota('pozo')
+        tarifa = {**TARIFA_GDMTH, **(tarifa or {})}
+        clave = (ingesta.ingesta_compartida().version, tuple(sorted(tarifa.items())), tuple(fracciones))
+        with self._lock:
+            if clave in self._entradas:
+                self._entradas.move_to_end(clave)
+                return self._entradas[clave]
+
+        actual, consumos, demandas, fp = _arreglos(actual)
+        resultado = (list(actual.index.astype(str)), actual['Sitio'].astype(str).to_numpy(),
+                     simular(consumos, demandas, fp, tarifa, fracciones))
+        with self._lock:
+            self._entradas[clave] = resultado
+            while len(self._entradas) > self.limite:
+                self._entradas.popitem(last=False)
+        return resultado
+
+    def sitio(self, sitio, tarifa=None, fracciones=FRACCIONES):
+        # Fila del sitio en la simulación de la flota: dict de arreglos (escenarios,)
+        claves, _, resultado = self.simular(tarifa, fracciones)
+        archivo = catalogo.archivo_de(sitio)
+        if archivo not in claves:
+            return None
+        i = claves.index(archivo)
+        return {nombre: valores[i] for nombre, valores in resultado.items()}
+
+
+_simulador = None
+_lock_simulador = threading.Lock()
+
+
+def simulador_compartido():
+    global _simulador
+    with _lock_simulador:
+        if _simulador is None:
+            _simulador = SimuladorFlota()
+        return _simulador
@@ -0,0 +1,274 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import ssl
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+import pandas as pd
+
+
+# Cliente de telemetría en vivo (gasto, presión y nivel de cada sitio, los mismos
+# campos que lee statics/tanque.js). Un solo hilo por proceso consulta todos los
+# sitios a la vez con asyncio sobre un pool de conexiones HTTP persistentes, y
+# deja las últimas lecturas en un caché que leen todas las sesiones de Streamlit.
+CAMPOS = ['Gasto_Instantaneo', 'Presion_Instantanea', 'Nivel_1']
+
+# Servidor de telemetría (sin URL no se activa el cliente). La ruta de cada sitio
+# lleva {sitio}; /sitios devuelve la lista de sitios si no se indican por entorno.
+URL_TELEMETRIA = os.environ.get('DASHBOARD_TELEMETRIA_URL')
+RUTA_SITIO = os.environ.get('DASHBOARD_TELEMETRIA_RUTA', '/sitio/{sitio}')
+RUTA_SITIOS = '/sitios'
+
+INTERVALO = float(os.environ.get('DASHBOARD_TELEMETRIA_INTERVALO', 5))
+CONEXIONES = int(os.environ.get('DASHBOARD_TELEMETRIA_CONEXIONES', 16))
+TIMEOUT = float(os.environ.get('DASHBOARD_TELEMETRIA_TIMEOUT', 3))
+
+# Reintentos de un sitio que falla: espera base * 2^fallos (con variación aleatoria), hasta el máximo
+BACKOFF_BASE = 1.0
+BACKOFF_MAXIMO = 120.0
+
+_logger = logging.getLogger('dashboard.telemetria')
+
+
+async def _leer_respuesta(reader):
+    # Respuesta HTTP/1.1: (estado, encabezados, cuerpo, cerrar conexión)
+    linea = await reader.readline()
+    if not linea:
+        raise ConnectionError("El servidor cerró la conexión")
+    # 'HTTP/1.1 200 OK'; una línea incompleta o sin código numérico no es una respuesta
+    partes = linea.split(b' ', 2)
+    if len(partes) < 2 or not partes[1].isdigit():
+        raise ValueError(f"Línea de estado no válida: {linea[:40]!r}")
+    estado = int(partes[1])
+    encabezados = {}
+    while True:
+        linea = await reader.readline()
+        if linea in (b'\r\n', b'\n', b''):
+            break
+        nombre, _, valor = linea.decode('latin-1').partition(':')
+        encabezados[nombre.strip().lower()] = valor.strip()
+
+    cerrar = encabezados.get('connection', '').lower() == 'close'
+    if 'content-length' in encabezados:
+        cuerpo = await reader.readexactly(int(encabezados['content-length']))
+    elif encabezados.get('transfer-encoding', '').lower() == 'chunked':
+        partes = []
+        while True:
+            tamano = int((await reader.readline()).split(b';')[0], 16)
+            if tamano == 0:
+                await reader.readline()
+                break
+            partes.append(await reader.readexactly(tamano))
+            await reader.readline()
+        cuerpo = b''.join(partes)
+    else:
+        cuerpo = await reader.read()
+        cerrar = True
+    return estado, encabezados, cuerpo, cerrar
+
+
+class PoolHTTP:
+    # Conexiones keep-alive a un solo servidor, con un máximo de peticiones simultáneas.
+    # El timeout cuenta desde que la petición obtiene conexión, no la espera en la cola.
+
+    def __init__(self, url_base, conexiones=CONEXIONES, timeout=TIMEOUT):
+        partes = urllib.parse.urlsplit(url_base)
+        self.ssl = ssl.create_default_context() if partes.scheme == 'https' else None
+        self.host = partes.hostname
+        self.puerto = partes.port or (443 if self.ssl else 80)
+        self.prefijo = partes.path.rstrip('/')
+        self.timeout = timeout
+        self.conexiones = conexiones
+        self._libres = []
+        self._semaforo = asyncio.Semaphore(conexiones)
+
+    async def _pedir(self, ruta):
+        for intento in range(2):
+            reutilizada = bool(self._libres)
+            if reutilizada:
+                reader, writer = self._libres.pop()
+            else:
+                reader, writer = await asyncio.open_connection(self.host, self.puerto, ssl=self.ssl)
+            try:
+                writer.write(f"GET {self.prefijo}{ruta} HTTP/1.1\r\nHost: {self.host}\r\n"
+                             f"Connection: keep-alive\r\n\r\n".encode('latin-1'))
+                await writer.drain()
+                estado, _, cuerpo, cerrar = await _leer_respuesta(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                writer.close()
+                # Una conexión inactiva del pool pudo haberla cerrado el servidor: reintentar con una nueva
+                if reutilizada and intento == 0:
+                    continue
+                raise
+            except BaseException:
+                writer.close()
+                raise
+            if cerrar:
+                writer.close()
+            else:
+                self._libres.append((reader, writer))
+            return estado, cuerpo
+
+    async def get(self, ruta):
+        async with self._semaforo:
+            return await asyncio.wait_for(self._pedir(ruta), self.timeout)
+
+    async def cerrar(self):
+        while self._libres:
+            _, writer = self._libres.pop()
+            writer.close()
+
+
+class ClienteTelemetria:
+    # Sondea todos los sitios en cada ciclo y guarda la última lectura de cada uno.
+    # Los sitios que fallan se saltan con espera exponencial hasta que respondan.
+
+    def __init__(self, url=URL_TELEMETRIA, sitios=None, intervalo=INTERVALO, conexiones=CONEXIONES,
+                 timeout=TIMEOUT, ruta_sitio=RUTA_SITIO):
+        self.url = url
+        self.sitios = list(sitios) if sitios else None
+        self.intervalo = intervalo
+        self.conexiones = conexiones
+        self.timeout = timeout
+        self.ruta_sitio = ruta_sitio
+        self.lecturas = {}
+        self.errores = {}
+        self.ciclos = 0
+        self.duracion_ciclo = None
+        self._fallos = {}
+        self._pool = None
+        self._suscriptores = []
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def suscribir(self, funcion):
+        # funcion(lecturas) se llama con las lecturas nuevas de cada ciclo ({sitio: lectura})
+        if funcion not in self._suscriptores:
+            self._suscriptores.append(funcion)
+
+    async def _json(self, ruta):
+        estado, cuerpo = await self._pool.get(ruta)
+        if estado != 200:
+            raise ConnectionError(f"HTTP {estado}")
+        return json.loads(cuerpo)
+
+    async def _sondear_sitio(self, sitio):
+        fallos, siguiente = self._fallos.get(sitio, (0, 0.0))
+        if time.monotonic() < siguiente:
+            return None
+        try:
+            lectura = await self._json(self.ruta_sitio.format(sitio=urllib.parse.quote(sitio, safe='')))
+            if not isinstance(lectura, dict):
+                raise ValueError(f"Respuesta no válida ({type(lectura).__name__})")
+        except (OSError, ConnectionError, ValueError, IndexError, asyncio.TimeoutError,
+                asyncio.IncompleteReadError) as e:
+            # asyncio.TimeoutError solo es un OSError (TimeoutError) desde Python 3.11
+            espera = min(BACKOFF_BASE * 2 ** fallos, BACKOFF_MAXIMO) * random.uniform(0.5, 1.0)
+            self._fallos[sitio] = (fallos + 1, time.monotonic() + espera)
+            self.errores[sitio] = str(e) or type(e).__name__
+            return None
+        self._fallos.pop(sitio, None)
+        self.errores.pop(sitio, None)
+        return lectura
+
+    async def sondear(self):
+        # Un ciclo: todos los sitios pendientes en paralelo. Regresa las lecturas nuevas.
+        if self._pool is None:
+            self._pool = PoolHTTP(self.url, self.conexiones, self.timeout)
+        inicio = time.perf_counter()
+        if self.sitios is None:
+            self.sitios = [str(s) for s in await self._json(RUTA_SITIOS)]
+        resultados = await asyncio.gather(*(self._sondear_sitio(s) for s in self.sitios))
+
+        recibido = time.time()
+        nuevas = {}
+        for sitio, lectura in zip(self.sitios, resultados):
+            if lectura is None:
+                continue
+            valores = {}
+            for campo in CAMPOS:
+                try:
+                    valores[campo] = float(lectura.get(campo))
+                except (TypeError, ValueError):
+                    valores[campo] = np.nan
+            valores['recibido'] = recibido
+            nuevas[sitio] = valores
+        with self._lock:
+            self.lecturas.update(nuevas)
+            self.ciclos += 1
+            self.duracion_ciclo = time.perf_counter() - inicio
+        # Un suscriptor con error no detiene el sondeo ni a los demás suscriptores
+        for funcion in list(self._suscriptores):
+            try:
+                funcion(nuevas)
+            except Exception:
+                _logger.exception("Error en un suscriptor de telemetría")
+        return nuevas
+
+    async def _ciclo(self):
+        try:
+            while not self._detener.is_set():
+                inicio = time.monotonic()
+                try:
+                    await self.sondear()
+                except (OSError, ConnectionError, ValueError, TypeError, asyncio.TimeoutError) as e:
+                    # Sin lista de sitios (servidor caído): se vuelve a intentar en el siguiente ciclo
+                    self.errores[RUTA_SITIOS] = str(e) or type(e).__name__
+                except Exception:
+                    # Cualquier otro error se registra y el hilo sigue sondeando
+                    _logger.exception("Error en el ciclo de telemetría")
+                await asyncio.sleep(max(0.0, self.intervalo - (time.monotonic() - inicio)))
+        finally:
+            if self._pool is not None:
+                await self._pool.cerrar()
+                self._pool = None
+
+    def iniciar(self):
+        # Corre el sondeo en un hilo de fondo con su propio event loop
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._detener.clear()
+            self._hilo = threading.Thread(target=lambda: asyncio.run(self._ciclo()), daemon=True)
+            self._hilo.start()
+
+    def detener(self, esperar=True):
+        self._detener.set()
+        if esperar and self._hilo is not None:
+            self._hilo.join(self.intervalo + self.timeout)
+
+    def lectura(self, sitio):
+        with self._lock:
+            return self.lecturas.get(str(sitio))
+
+    def tabla(self):
+        # Últimas lecturas de todos los sitios, con su antigüedad en segundos
+        with self._lock:
+            lecturas = dict(self.lecturas)
+        df = pd.DataFrame.from_dict(lecturas, orient='index', columns=CAMPOS + ['recibido'])
+        df.index.name = 'Sitio'
+        return df.assign(antiguedad=time.time() - df['recibido'])
+
+
+_cliente = None
+_lock_cliente = threading.Lock()
+
+
+def cliente_compartido():
+    # Cliente único del proceso, iniciado la primera vez; None si no hay URL configurada
+    global _cliente
+    if not URL_TELEMETRIA:
+        return None
+    with _lock_cliente:
+        if _cliente is None:
+            sitios = [s.strip() for s in os.environ.get('DASHBOARD_TELEMETRIA_SITIOS', '').split(',') if s.strip()]
+            _cliente = ClienteTelemetria(URL_TELEMETRIA, sitios or None)
+        # Vuelve a levantar el hilo si terminó
+        _cliente.iniciar()
+        return _cliente
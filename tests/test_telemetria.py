@@ -0,0 +1,124 @@
+import asyncio
+import math
+import unittest
+
+import simulador_telemetria
+import telemetria
+
+
+# Cliente de telemetría contra el servidor simulado: lecturas normales, cuerpos por
+# partes y sitios que responden tarde, con una línea de estado inválida o nada.
+SITIOS = ['p1', 'p2', 'p3']
+
+
+def sondear(cliente, ciclos=1):
+    # Ciclos de sondeo en un event loop propio; regresa las lecturas del último
+    async def correr():
+        try:
+            for _ in range(ciclos):
+                nuevas = await cliente.sondear()
+            return nuevas
+        finally:
+            await cliente._pool.cerrar()
+
+    return asyncio.run(correr())
+
+
+class PruebaCliente(unittest.TestCase):
+
+    def servidor(self, **opciones):
+        servidor, url = simulador_telemetria.iniciar_en_hilo(SITIOS, **opciones)
+        self.addCleanup(servidor.server_close)
+        self.addCleanup(servidor.shutdown)
+        return url
+
+    def cliente(self, url, **opciones):
+        return telemetria.ClienteTelemetria(url, timeout=opciones.pop('timeout', 1.0), **opciones)
+
+    def verificar_lectura(self, lectura):
+        self.assertEqual(set(lectura), set(telemetria.CAMPOS) | {'recibido'})
+        for campo in telemetria.CAMPOS:
+            self.assertFalse(math.isnan(lectura[campo]), campo)
+
+    def test_lee_todos_los_sitios(self):
+        cliente = self.cliente(self.servidor())
+        nuevas = sondear(cliente, ciclos=2)
+        self.assertEqual(cliente.sitios, SITIOS)
+        self.assertEqual(set(nuevas), set(SITIOS))
+        for lectura in nuevas.values():
+            self.verificar_lectura(lectura)
+        self.assertEqual(cliente.errores, {})
+        self.assertEqual(cliente.ciclos, 2)
+
+    def test_cuerpos_por_partes(self):
+        cliente = self.cliente(self.servidor(chunked=True))
+        nuevas = sondear(cliente, ciclos=2)
+        self.assertEqual(set(nuevas), set(SITIOS))
+        for lectura in nuevas.values():
+            self.verificar_lectura(lectura)
+        self.assertEqual(cliente.errores, {})
+
+    def test_timeout_no_detiene_el_ciclo(self):
+        url = self.servidor(defectos={'p2': 'lento'})
+        cliente = self.cliente(url, timeout=0.3)
+        nuevas = sondear(cliente)
+        self.assertEqual(set(nuevas), {'p1', 'p3'})
+        self.assertIn('p2', cliente.errores)
+        self.assertIn('p2', cliente._fallos)
+
+    def test_linea_de_estado_invalida(self):
+        cliente = self.cliente(self.servidor(defectos={'p1': 'estado'}))
+        nuevas = sondear(cliente)
+        self.assertEqual(set(nuevas), {'p2', 'p3'})
+        self.assertIn('Línea de estado no válida', cliente.errores['p1'])
+
+    def test_conexion_cerrada_sin_respuesta(self):
+        cliente = self.cliente(self.servidor(defectos={'p3': 'vacio'}))
+        nuevas = sondear(cliente)
+        self.assertEqual(set(nuevas), {'p1', 'p2'})
+        self.assertIn('p3', cliente.errores)
+
+    def test_sitio_con_falla_espera_antes_de_reintentar(self):
+        cliente = self.cliente(self.servidor(defectos={'p1': 'estado'}))
+        sondear(cliente, ciclos=2)
+        # El segundo ciclo salta p1 (espera exponencial) en lugar de volver a fallar
+        self.assertEqual(cliente._fallos['p1'][0], 1)
+
+
+class PruebaLeerRespuesta(unittest.TestCase):
+
+    def leer(self, datos):
+        async def correr():
+            lector = asyncio.StreamReader()
+            lector.feed_data(datos)
+            lector.feed_eof()
+            return await telemetria._leer_respuesta(lector)
+
+        return asyncio.run(correr())
+
+    def test_content_length(self):
+        estado, encabezados, cuerpo, cerrar = self.leer(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}')
+        self.assertEqual((estado, cuerpo, cerrar), (200, b'{}', False))
+        self.assertEqual(encabezados['content-length'], '2')
+
+    def test_chunked(self):
+        estado, _, cuerpo, _ = self.leer(b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                                         b'3\r\n{"a\r\n4;x=1\r\n": 1\r\n1\r\n}\r\n0\r\n\r\n')
+        self.assertEqual((estado, cuerpo), (200, b'{"a": 1}'))
+
+    def test_sin_longitud_lee_hasta_el_cierre(self):
+        estado, _, cuerpo, cerrar = self.leer(b'HTTP/1.0 503 No disponible\r\n\r\nfuera')
+        self.assertEqual((estado, cuerpo, cerrar), (503, b'fuera', True))
+
+    def test_lineas_de_estado_invalidas(self):
+        for linea in (b'HTTP/1.1\r\n', b'HTTP/1.1 OK\r\n', b'basura\r\n'):
+            with self.subTest(linea=linea), self.assertRaises(ValueError):
+                self.leer(linea + b'\r\n')
+
+    def test_conexion_cerrada(self):
+        with self.assertRaises(ConnectionError):
+            self.leer(b'')
+
+
+if __name__ == '__main__':
+    unittest.main()